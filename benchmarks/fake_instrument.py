@@ -0,0 +1,141 @@
+"""
+Stand in for an instrument's archive engine and block server serving synthetic pages.
+"""
+import json
+import random
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from external_webpage.instrument_information_collator import InstrumentInformationCollator
+
+# Name of the group on the config page containing all the blocks
+GROUP_NAME = "Blocks"
+
+# Timestamp given to every value
+TIMESTAMP = u"2017-10-19 09:04:16.141466495"
+
+
+def _create_channel(pv_name, value):
+    """
+    Args:
+        pv_name: name of the channel's pv
+        value: current value
+
+    Returns: a channel in the archive engine format
+
+    """
+    return {u"Channel": pv_name,
+            u"Connected": True,
+            u"Current Value": {u"Alarm": u"", u"Timestamp": TIMESTAMP, u"Units": u"mm", u"Value": value,
+                               u"Precision": 3},
+            u"Internal State": u"Connected"}
+
+
+class FakeInstrument(object):
+    """
+    The synthetic pages of an instrument. On each request for a page each of its channels' values changes with
+    probability change_rate.
+    """
+
+    def __init__(self, name, block_count, change_rate, extra_inst_pv_count=0):
+        """
+        Initialise.
+        Args:
+            name: name of the instrument
+            block_count: number of blocks, split evenly between the BLOCKS and DATAWEB groups
+            change_rate: probability of a value changing each time its page is requested
+            extra_inst_pv_count: number of channels in the INST group which are not shown on the info page
+        """
+        self.name = name
+        self.change_rate = change_rate
+        self._lock = threading.Lock()
+        prefix = u"IN:{}:".format(name)
+        block_names = [u"BLOCK_{}".format(index) for index in range(block_count)]
+        self._groups = {
+            u"BLOCKS": [_create_channel(prefix + u"CS:SB:" + block, u"0.000") for block in block_names[::2]],
+            u"DATAWEB": [_create_channel(prefix + u"CS:SB:" + block, u"0.000") for block in block_names[1::2]],
+            u"INST": [_create_channel(prefix + u"DAE:{}.VAL".format(pv), u"0")
+                      for pv in InstrumentInformationCollator.REQUIRED_PVS] +
+                     [_create_channel(prefix + u"DAE:EXTRA_{}.VAL".format(index), u"0")
+                      for index in range(extra_inst_pv_count)]}
+        self._config = json.dumps({
+            u"name": u"{}_config".format(name),
+            u"blocks": [{u"name": block, u"visible": True} for block in block_names],
+            u"groups": [{u"name": GROUP_NAME, u"blocks": block_names}]})
+
+    def group_page(self, group_name):
+        """
+        Args:
+            group_name: name of the archive group
+
+        Returns: the group's info page as json text
+
+        """
+        with self._lock:
+            channels = self._groups[group_name]
+            # instrument pvs such as run durations are parsed as integers
+            value_format = u"{:.0f}" if group_name == u"INST" else u"{:.3f}"
+            for channel in channels:
+                if random.random() < self.change_rate:
+                    channel[u"Current Value"][u"Value"] = value_format.format(random.uniform(0, 1000))
+            return json.dumps({u"Channels": channels, u"Enabled": True})
+
+    def config_page(self):
+        """
+        Returns: the block server's configuration page
+
+        """
+        return self._config
+
+
+class _FakeInstrumentHandler(BaseHTTPRequestHandler):
+    """
+    Serves the pages of the server's fake instrument.
+    """
+
+    def do_GET(self):
+        instrument = self.server.instrument
+        if self.path.startswith("/group?name="):
+            group_name = self.path[len("/group?name="):].split("&")[0]
+            try:
+                body = instrument.group_page(group_name)
+            except KeyError:
+                self.send_error(404)
+                return
+        else:
+            body = instrument.config_page()
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+
+class FakeInstrumentServer(ThreadingMixIn, HTTPServer):
+    """
+    Server for the archive engine and configuration pages of a fake instrument, all on one port.
+    """
+    daemon_threads = True
+
+    def __init__(self, instrument, host="127.0.0.1"):
+        """
+        Initialise on a free port.
+        Args:
+            instrument: the fake instrument to serve
+            host: address to serve on
+        """
+        HTTPServer.__init__(self, (host, 0), _FakeInstrumentHandler)
+        self.instrument = instrument
+        self.port = self.server_address[1]
+
+    def start(self):
+        """
+        Serve in a background thread.
+        """
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
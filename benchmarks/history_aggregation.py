@@ -0,0 +1,120 @@
+"""
+Benchmark of aggregating block histories for plotting, e.g. 1000 blocks of 10000 samples into 500 points each.
+"""
+import timeit
+
+import numpy as np
+
+from benchmarks.reporting import report
+from external_webpage.block_history import BlockHistory
+from external_webpage.history_aggregation import bucket_means, bucket_statistics, aggregate_history, AGGREGATES
+
+
+def python_bucket_means(times, values, points):
+    """
+    The previous aggregation, the mean of each bucket found with a loop over the samples.
+    Args:
+        times: times of the samples
+        values: values of the samples; None where disconnected
+        points: number of buckets
+
+    Returns: tuple of the times and values of the buckets
+
+    """
+    bucket_times = []
+    bucket_values = []
+    for bucket in range(points):
+        start = bucket * len(times) // points
+        end = (bucket + 1) * len(times) // points
+        bucket_times.append(sum(times[start:end]) / (end - start))
+        present = [value for value in values[start:end] if value is not None]
+        bucket_values.append(sum(present) / len(present) if present else None)
+    return bucket_times, bucket_values
+
+
+def make_histories(blocks, samples, seed=0):
+    """
+    Args:
+        blocks: number of blocks
+        samples: number of samples of each block
+        seed: seed of the random values
+
+    Returns: tuple of the times of the samples and a random walk for each block, a block per row, with 1% of the
+        samples disconnected
+
+    """
+    random = np.random.RandomState(seed)
+    times = 1.5e9 + 3.0 * np.arange(samples)
+    values = np.cumsum(random.normal(size=(blocks, samples)), axis=1)
+    values[random.random_sample(values.shape) < 0.01] = np.nan
+    return times, values
+
+
+def time_seconds(function, repeat):
+    """
+    Args:
+        function: function to time
+        repeat: number of timings
+
+    Returns: the best of the timings of calling the function once, in seconds
+
+    """
+    return min(timeit.Timer(function).repeat(repeat, 1))
+
+
+def run(args):
+    """
+    Run the benchmark.
+    Args:
+        args: the command line arguments
+    """
+    times, values = make_histories(args.blocks, args.samples)
+    results = {"blocks": args.blocks, "samples_per_block": args.samples, "points": args.points}
+
+    history = BlockHistory(args.samples)
+    for time, value in zip(times.tolist(), values[0].tolist()):
+        history.append(time, value)
+    results["ring_buffer_read_ms_per_block"] = time_seconds(history.get_arrays, args.repeat) * 1e3
+
+    baseline_blocks = min(args.baseline_blocks, args.blocks)
+    as_lists = [(times.tolist(), [None if np.isnan(value) else value for value in row])
+                for row in values[:baseline_blocks].tolist()]
+
+    def python_means():
+        for block_times, block_values in as_lists:
+            python_bucket_means(block_times, block_values, args.points)
+
+    python_ms = time_seconds(python_means, args.repeat) * 1e3 / baseline_blocks
+    results["python_mean_ms_per_block"] = python_ms
+
+    for aggregate in AGGREGATES:
+        def per_block():
+            for row in values:
+                aggregate_history(times, row, args.points, aggregate)
+
+        results["numpy_{}_ms_per_block".format(aggregate)] = time_seconds(per_block, args.repeat) * 1e3 / args.blocks
+
+    # every block at once as a 2D array
+    batched_ms = time_seconds(lambda: bucket_means(times, values, args.points), args.repeat) * 1e3 / args.blocks
+    results["numpy_batched_mean_ms_per_block"] = batched_ms
+    results["numpy_batched_statistics_ms_per_block"] = \
+        time_seconds(lambda: bucket_statistics(times, values, args.points), args.repeat) * 1e3 / args.blocks
+    results["mean_speed_up"] = python_ms / results["numpy_mean_ms_per_block"]
+    results["batched_mean_speed_up"] = python_ms / batched_ms
+    report("Block history aggregation", results, args.output)
+
+
+def add_arguments(parser):
+    """
+    Add the benchmark's arguments to a parser.
+    Args:
+        parser: the argument parser
+    """
+    parser.add_argument("--blocks", type=int, default=1000, help="Number of blocks")
+    parser.add_argument("--samples", type=int, default=10000, help="Number of samples of each block")
+    parser.add_argument("--points", type=int, default=500, help="Number of points each block is aggregated into")
+    parser.add_argument("--baseline-blocks", type=int, default=100,
+                        help="Number of blocks aggregated with the previous Python loop, which is slow")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timings, the best is reported")
+    parser.add_argument("--output", default=None, help="File to save the results to as json")
+    parser.set_defaults(run=run)
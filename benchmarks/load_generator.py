@@ -0,0 +1,410 @@
+"""
+Load generator emulating the browsers polling JSON bourne.
+
+Each dataweb tab (display_blocks.js) polls one instrument and each overview page (ibexOverview.js) polls all the
+instruments, every 5 seconds, as JSONP requests. Alternatively the requests in a JSON bourne log can be replayed with
+their original timing. Polls are run by a pool of client threads so that many viewers can be modelled.
+"""
+import heapq
+import httplib
+import itertools
+import json
+import random
+import re
+import socket
+import threading
+import time
+from datetime import datetime
+from timeit import default_timer
+
+from benchmarks.reporting import latency_summary, report
+
+# Seconds between polls of each page, as set in the front end
+POLL_INTERVAL = 5
+
+# Seconds before a request is treated as failed by the dataweb page
+DATAWEB_TIMEOUT = 4.0
+
+# Seconds before a request is treated as failed by the overview page
+OVERVIEW_TIMEOUT = 2.5
+
+# Seconds to model the pages for if not given
+DEFAULT_DURATION = 60
+
+# Error when the server took longer than the page waits
+TIMED_OUT = "timed out"
+
+# Pattern of the request lines in the JSON bourne log
+LOG_REQUEST_PATTERN = re.compile(
+    r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) Connected to from .* looking at (\S+)\s*$")
+
+
+def jsonp_path(instrument, callback=None):
+    """
+    Args:
+        instrument: instrument requested
+        callback: name of the callback; None for one in the style jQuery generates
+
+    Returns: path requested by a front end page
+
+    """
+    now_ms = int(time.time() * 1000)
+    if callback is None:
+        callback = "jQuery{}_{}".format(random.randint(10 ** 15, 10 ** 16), now_ms)
+    return "/?callback={}&Instrument={}&_={}".format(callback, instrument, now_ms)
+
+
+class Poll(object):
+    """
+    Requests made by one browser page.
+    """
+
+    def __init__(self, kind, instrument, timeout, callback=None, interval=None):
+        """
+        Initialise.
+        Args:
+            kind: the kind of page, results are reported for each kind
+            instrument: instrument the page requests
+            timeout: seconds the page waits for a response
+            callback: fixed callback name the page uses; None for a generated one
+            interval: seconds between requests; None to request only once
+        """
+        self.kind = kind
+        self.instrument = instrument
+        self.timeout = timeout
+        self.callback = callback
+        self.interval = interval
+        # persistent connection of the page when it is not in use
+        self.connection = None
+
+
+def dataweb_tab(instrument):
+    """
+    Args:
+        instrument: instrument displayed
+
+    Returns: the polls of a dataweb tab
+
+    """
+    return Poll("dataweb", instrument, DATAWEB_TIMEOUT, interval=POLL_INTERVAL)
+
+
+def overview_page():
+    """
+    Returns: the polls of an overview page
+
+    """
+    return Poll("overview", "all", OVERVIEW_TIMEOUT, callback="display_data", interval=POLL_INTERVAL)
+
+
+def read_log_requests(log_path):
+    """
+    Read the requests from a JSON bourne log.
+    Args:
+        log_path: path of the log
+
+    Returns: list of seconds from the first request and the polls made
+
+    """
+    requests = []
+    first_time = None
+    with open(log_path) as log_file:
+        for line in log_file:
+            match = LOG_REQUEST_PATTERN.match(line)
+            if match is None:
+                continue
+            request_time = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S,%f")
+            if first_time is None:
+                first_time = request_time
+            instrument = match.group(2)
+            if instrument.upper() == "ALL":
+                poll = Poll("overview", instrument, OVERVIEW_TIMEOUT, callback="display_data")
+            else:
+                poll = Poll("dataweb", instrument, DATAWEB_TIMEOUT)
+            requests.append(((request_time - first_time).total_seconds(), poll))
+    return requests
+
+
+class LoadResults(object):
+    """
+    Latencies and errors of the requests for each kind of page.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.lateness = []
+
+    def add(self, kind, latency, error, lateness):
+        """
+        Add the result of a request.
+        Args:
+            kind: kind of page making the request
+            latency: seconds taken to respond
+            error: the error; None if the request succeeded
+            lateness: seconds after it was due the request was sent
+        """
+        with self._lock:
+            self.latencies.setdefault(kind, []).append(latency)
+            self.lateness.append(lateness)
+            if error is not None:
+                self.errors.setdefault(kind, {})
+                self.errors[kind][error] = self.errors[kind].get(error, 0) + 1
+
+    def summary(self, duration):
+        """
+        Args:
+            duration: seconds the load was generated for
+
+        Returns: dictionary of the results
+
+        """
+        results = {}
+        with self._lock:
+            for kind, latencies in self.latencies.items():
+                errors = sum(self.errors.get(kind, {}).values())
+                results["{}_requests".format(kind)] = len(latencies)
+                results["{}_requests_per_second".format(kind)] = len(latencies) / duration
+                results["{}_error_rate".format(kind)] = float(errors) / len(latencies)
+                results["{}_errors".format(kind)] = dict(self.errors.get(kind, {}))
+                for name, value in latency_summary(latencies).items():
+                    results["{}_{}".format(kind, name)] = value
+            results["client_lag_p99_ms"] = latency_summary(self.lateness)["p99_ms"]
+        return results
+
+
+class LoadGenerator(object):
+    """
+    Pool of client threads sending the requests of the polls as they become due.
+    """
+
+    def __init__(self, host, port, client_threads, keep_alive=False):
+        """
+        Initialise.
+        Args:
+            host: host of the server
+            port: port of the server
+            client_threads: number of threads sending requests
+            keep_alive: True for each page to reuse its connection, as browsers do; False for a new one per request
+        """
+        self._host = host
+        self._port = port
+        self._client_threads = client_threads
+        self._keep_alive = keep_alive
+        self._due = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._end_time = None
+        self.results = LoadResults()
+
+    def add(self, poll, delay):
+        """
+        Add a poll whose first request is due after a delay.
+        Args:
+            poll: the poll
+            delay: seconds from the start of the run the request is due
+        """
+        heapq.heappush(self._due, (delay, next(self._sequence), poll))
+
+    def run(self, duration):
+        """
+        Send the requests as they become due.
+        Args:
+            duration: seconds to run for
+
+        Returns: seconds the run took
+
+        """
+        start_time = time.time()
+        self._due = [(start_time + delay, sequence, poll) for delay, sequence, poll in self._due]
+        heapq.heapify(self._due)
+        self._end_time = start_time + duration
+        clients = [threading.Thread(target=self._send_requests) for _ in range(self._client_threads)]
+        for client in clients:
+            client.daemon = True
+            client.start()
+        for client in clients:
+            client.join()
+        return time.time() - start_time
+
+    def _next_due(self):
+        """
+        Wait for the next request to become due and take it off the queue.
+
+        Returns: tuple of the time it was due and the poll; None if the run is over
+
+        """
+        with self._condition:
+            while len(self._due) > 0:
+                due_time, _, poll = self._due[0]
+                if due_time >= self._end_time:
+                    return None
+                wait_time = due_time - time.time()
+                if wait_time > 0:
+                    self._condition.wait(wait_time)
+                    continue
+                heapq.heappop(self._due)
+                if poll.interval is not None:
+                    # pages poll at a fixed rate, like setInterval, whether or not the last request finished
+                    heapq.heappush(self._due, (due_time + poll.interval, next(self._sequence), poll))
+                    self._condition.notify()
+                return due_time, poll
+            return None
+
+    def _send_requests(self):
+        """
+        Send requests until the run is over.
+        """
+        while True:
+            due = self._next_due()
+            if due is None:
+                return
+            due_time, poll = due
+            lateness = time.time() - due_time
+            latency, error = self._request(poll)
+            self.results.add(poll.kind, latency, error, lateness)
+
+    def _request(self, poll):
+        """
+        Make a request of a poll.
+        Args:
+            poll: the poll
+
+        Returns: tuple of the seconds taken and the error; the error is None if the request succeeded
+
+        """
+        start_time = default_timer()
+        error = None
+        # take the page's connection so that a late request of the same page uses another
+        connection, poll.connection = poll.connection, None
+        try:
+            if connection is not None:
+                try:
+                    response = self._get(connection, poll)
+                except (httplib.HTTPException, socket.error):
+                    # the server closed the idle connection, browsers retry on a new one
+                    connection.close()
+                    connection = None
+            if connection is None:
+                connection = httplib.HTTPConnection(self._host, self._port, timeout=poll.timeout)
+                response = self._get(connection, poll)
+            if self._keep_alive and not response.will_close:
+                poll.connection = connection
+            else:
+                connection.close()
+            if response.status != 200:
+                error = "HTTP {}".format(response.status)
+        except Exception as e:
+            if connection is not None:
+                connection.close()
+            error = TIMED_OUT if "timed out" in str(e) else type(e).__name__
+        latency = default_timer() - start_time
+        if error is None and latency > poll.timeout:
+            error = TIMED_OUT
+        return latency, error
+
+    @staticmethod
+    def _get(connection, poll):
+        """
+        Args:
+            connection: connection to the server
+            poll: the poll making the request
+
+        Returns: the response, which has been read
+
+        """
+        connection.request("GET", jsonp_path(poll.instrument, poll.callback))
+        response = connection.getresponse()
+        response.read()
+        return response
+
+
+def get_instruments(host, port):
+    """
+    Args:
+        host: host of the server
+        port: port of the server
+
+    Returns: names of the instruments the server has information for
+
+    """
+    connection = httplib.HTTPConnection(host, port, timeout=30)
+    try:
+        connection.request("GET", jsonp_path("ALL", "callback"))
+        body = connection.getresponse().read()
+    finally:
+        connection.close()
+    return list(json.loads(body[body.index("(") + 1:body.rindex(")")])["instruments"].keys())
+
+
+def run(args):
+    """
+    Run the load generator.
+    Args:
+        args: the command line arguments
+    """
+    deployment = None
+    host, port = args.host, args.port
+    if args.local:
+        from benchmarks.throughput import LocalDeployment
+        deployment = LocalDeployment(args)
+        host, port = "127.0.0.1", deployment.port
+        time.sleep(args.warmup)
+
+    generator = LoadGenerator(host, port, args.client_threads, args.keep_alive)
+    if args.replay is None:
+        instruments = args.instrument_names.split(",") if args.instrument_names else get_instruments(host, port)
+        for _ in range(args.tabs):
+            generator.add(dataweb_tab(random.choice(instruments)), random.uniform(0, POLL_INTERVAL))
+        for _ in range(args.overviews):
+            generator.add(overview_page(), random.uniform(0, POLL_INTERVAL))
+        duration = args.duration if args.duration is not None else DEFAULT_DURATION
+    else:
+        requests = read_log_requests(args.replay)
+        if len(requests) == 0:
+            raise ValueError("No requests found in {}".format(args.replay))
+        for delay, poll in requests:
+            generator.add(poll, delay / args.speed)
+        duration = args.duration if args.duration is not None else requests[-1][0] / args.speed + 1
+
+    elapsed = generator.run(duration)
+    if deployment is not None:
+        deployment.stop()
+
+    results = generator.results.summary(elapsed)
+    results.update({"dataweb_tabs": args.tabs, "overview_pages": args.overviews, "replayed_log": args.replay,
+                    "keep_alive": args.keep_alive})
+    report("JSON Bourne load", results, args.output)
+
+
+def add_arguments(parser):
+    """
+    Add the load generator's arguments to a parser.
+    Args:
+        parser: the argument parser
+    """
+    from benchmarks.throughput import add_deployment_arguments
+
+    parser.add_argument("--host", default="127.0.0.1", help="Host of the JSON bourne server")
+    parser.add_argument("--port", type=int, default=60000, help="Port of the JSON bourne server")
+    parser.add_argument("--local", action="store_true",
+                        help="Load a server run in this process against fake instruments instead of host:port")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds the local server scrapes for before loading")
+    add_deployment_arguments(parser)
+    parser.add_argument("--tabs", type=int, default=100, help="Number of dataweb tabs open")
+    parser.add_argument("--overviews", type=int, default=5, help="Number of overview pages open")
+    parser.add_argument("--instrument-names", default=None,
+                        help="Comma separated instruments the tabs show; default those the server knows")
+    parser.add_argument("--replay", default=None,
+                        help="JSON bourne log whose requests are replayed instead of modelling tabs; the server "
+                             "must have logged every request, i.e. ACCESS_LOG_SUMMARY_SECONDS set to 0")
+    parser.add_argument("--speed", type=float, default=1.0, help="Speed up factor of a replayed log")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Seconds to generate load for; default {}, or the length of a replayed log".format(
+                            DEFAULT_DURATION))
+    parser.add_argument("--client-threads", type=int, default=50, help="Number of threads sending requests")
+    parser.add_argument("--keep-alive", action="store_true",
+                        help="Each page reuses its connection, as browsers do, instead of connecting for each request")
+    parser.add_argument("--output", default=None, help="File to save the results to as json")
+    parser.set_defaults(run=run)
@@ -0,0 +1,74 @@
+"""
+Helpers for measuring and reporting benchmark results.
+"""
+import json
+
+
+def percentile(values, percent):
+    """
+    Args:
+        values: the values
+        percent: the percentile to return
+
+    Returns: the given percentile of the values (nearest rank); None if there are no values
+
+    """
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(len(ordered) * percent / 100.0))
+    return ordered[index]
+
+
+def latency_summary(latencies):
+    """
+    Args:
+        latencies: latencies in seconds
+
+    Returns: dictionary of the latency percentiles in milliseconds
+
+    """
+    summary = {}
+    for name, percent in [("p50_ms", 50), ("p90_ms", 90), ("p99_ms", 99), ("max_ms", 100)]:
+        value = percentile(latencies, percent)
+        summary[name] = None if value is None else value * 1000.0
+    return summary
+
+
+def peak_memory_mb():
+    """
+    Returns: the peak resident memory of this process in MB; None if it can not be found on this platform
+
+    """
+    try:
+        import resource
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # max rss is in bytes on mac and kilobytes elsewhere
+        return max_rss / (1024.0 * 1024.0) if sys.platform == "darwin" else max_rss / 1024.0
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024.0 * 1024.0)
+    except (ImportError, AttributeError):
+        return None
+
+
+def report(title, results, output_path=None):
+    """
+    Print benchmark results and optionally save them as json so runs can be compared.
+    Args:
+        title: title of the benchmark
+        results: dictionary of result name to value
+        output_path: path of the file to save the results to; None to not save them
+    """
+    print("------ {} ------".format(title))
+    for name in sorted(results.keys()):
+        value = results[name]
+        if isinstance(value, float):
+            value = "{:.3f}".format(value)
+        print("  {:<30} {}".format(name, value))
+    if output_path is not None:
+        with open(output_path, "w") as output_file:
+            json.dump({"benchmark": title, "results": results}, output_file, indent=2, sort_keys=True)
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of parsing the instrument and callback out of a request path.
+"""
+import re
+import timeit
+
+from benchmarks.reporting import report
+from external_webpage.request_handler_utils import get_instrument_and_callback
+
+# Path as requested by a dataweb page
+DATAWEB_PATH = "/?callback=jQuery111306520917483791838_1508400000000&Instrument=LARMOR&_=1508400000001"
+
+
+def regex_get_instrument_and_callback(path):
+    """
+    The previous parser, which searched the path with uncompiled regular expressions.
+    Args:
+        path (str): the requested path
+
+    Returns:
+        tuple: (instrument name, callback mathod name)
+
+    """
+    callback = re.findall('/?callback=(\w+)&', path)
+    instruments = re.findall('&Instrument=([^&]+)&', path)
+    if len(callback) != 1:
+        raise ValueError("Invalid number of callbacks specified: {}".format(path))
+    if len(instruments) != 1:
+        raise ValueError("Invalid number of instruments specified: {}".format(path))
+    return instruments[0].upper(), callback[0]
+
+
+def time_parser(parser, path, number):
+    """
+    Args:
+        parser: the parser
+        path: path to parse
+        number: number of times to parse it
+
+    Returns: best of three of the microseconds taken to parse the path once
+
+    """
+    timer = timeit.Timer(lambda: parser(path))
+    return min(timer.repeat(3, number)) / number * 1e6
+
+
+def run(args):
+    """
+    Run the benchmark.
+    Args:
+        args: the command line arguments
+    """
+    assert get_instrument_and_callback(DATAWEB_PATH) == regex_get_instrument_and_callback(DATAWEB_PATH)
+    regex_us = time_parser(regex_get_instrument_and_callback, DATAWEB_PATH, args.number)
+    parser_us = time_parser(get_instrument_and_callback, DATAWEB_PATH, args.number)
+    results = {
+        "regex_parser_us": regex_us,
+        "query_parser_us": parser_us,
+        "speed_up": regex_us / parser_us}
+    report("Request path parsing", results, args.output)
+
+
+def add_arguments(parser):
+    """
+    Add the benchmark's arguments to a parser.
+    Args:
+        parser: the argument parser
+    """
+    parser.add_argument("--number", type=int, default=100000, help="Number of paths parsed in each timing")
+    parser.add_argument("--output", default=None, help="File to save the results to as json")
+    parser.set_defaults(run=run)
@@ -0,0 +1,253 @@
+"""
+Benchmark of scraping and serving throughput using stand in instruments.
+
+Fake archive engine and block server pages are served locally for each instrument, the real web scrapper manager
+scrapes them and the real request handler serves the results to client threads polling as fast as they can.
+"""
+import httplib
+import random
+import threading
+import time
+from timeit import default_timer
+
+from benchmarks.fake_instrument import FakeInstrument, FakeInstrumentServer
+from benchmarks.reporting import latency_summary, peak_memory_mb, report
+from external_webpage import instrument_scapper
+from external_webpage.data_source_reader import DataSourceReader
+from external_webpage.instrument_scapper import InstrumentScrapper
+from external_webpage.metrics import COLLATE_SECONDS, SCRAPE_FAILURES
+from external_webpage.scrapper_pool import ScrapperPool
+from external_webpage.web_scrapper_manager import WebScrapperManager
+
+
+class StaticInstList(object):
+    """
+    Instrument list which does not change.
+    """
+    error_on_retrieve = ""
+
+    def __init__(self, inst_list):
+        self._inst_list = inst_list
+
+    def retrieve(self):
+        return self._inst_list
+
+    def monitor(self, callback):
+        pass
+
+
+def fake_reader(host):
+    """
+    Create a reader for a fake instrument.
+    Args:
+        host: address and port of the fake instrument's server as address:port
+
+    Returns: reader reading all pages from that port
+
+    """
+    address, port = host.rsplit(":", 1)
+    port = int(port)
+    return DataSourceReader(address, blocks_port=port, inst_port=port, config_port=port)
+
+
+def start_fake_instruments(count, block_count, change_rate, extra_inst_pv_count):
+    """
+    Start servers for fake instruments.
+    Args:
+        count: number of instruments
+        block_count: number of blocks on each instrument
+        change_rate: probability of each value changing on each request
+        extra_inst_pv_count: number of INST channels not shown on the info page
+
+    Returns: dictionary of instrument names to their host (address:port)
+
+    """
+    inst_list = {}
+    for index in range(count):
+        name = "FAKE{}".format(index)
+        server = FakeInstrumentServer(FakeInstrument(name, block_count, change_rate, extra_inst_pv_count))
+        server.start()
+        inst_list[name] = "{}:{}".format(server.server_address[0], server.port)
+    return inst_list
+
+
+def total_count(metric_count, instruments):
+    """
+    Args:
+        metric_count: function returning the count of a metric for an instrument
+        instruments: instrument names
+
+    Returns: the total count for all the instruments
+
+    """
+    return sum(metric_count(instrument=instrument) for instrument in instruments)
+
+
+def poll_server(port, instruments, stop_event, latencies, errors):
+    """
+    Request instruments, and sometimes the summary of all instruments, as fast as possible until stopped.
+    Args:
+        port: port of the web server
+        instruments: names of the instruments to request
+        stop_event: set to stop polling
+        latencies: list to add the request latencies to
+        errors: list to add the failed request errors to
+    """
+    while not stop_event.is_set():
+        instrument = "ALL" if random.random() < 0.1 else random.choice(instruments)
+        start_time = default_timer()
+        try:
+            connection = httplib.HTTPConnection("127.0.0.1", port, timeout=10)
+            connection.request("GET", "/?callback=cb&Instrument={}&".format(instrument))
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        latencies.append(default_timer() - start_time)
+
+
+class LocalDeployment(object):
+    """
+    JSON bourne's web server and scrappers running in this process against fake instruments.
+    """
+
+    def __init__(self, args):
+        """
+        Start fake instruments, scrape them and serve the results on a free port.
+        Args:
+            args: the command line arguments describing the instruments and how to scrape them
+        """
+        import webserver
+        from external_webpage.admission_control import ClientRateLimiter, InFlightLimiter
+
+        instrument_scapper.WAIT_BETWEEN_UPDATES = args.scrape_wait
+        inst_list = start_fake_instruments(args.instruments, args.blocks, args.change_rate, args.extra_inst_pvs)
+        self.instruments = list(inst_list.keys())
+
+        if args.pool_size is None:
+            scrapper_pool = None
+        else:
+            scrapper_pool = ScrapperPool(args.pool_size, reader_class=fake_reader)
+        self._web_manager = WebScrapperManager(
+            scrapper_class=lambda name, host: InstrumentScrapper(name, host, reader_class=fake_reader),
+            inst_list=StaticInstList(inst_list), scrapper_pool=scrapper_pool)
+        webserver.web_manager = self._web_manager
+        webserver.client_rate_limiter = ClientRateLimiter(args.client_rate, args.client_burst)
+        if args.max_in_flight is not None:
+            webserver.in_flight_limiter = InFlightLimiter(args.max_in_flight)
+        self._web_manager.start()
+
+        if args.event_loop_server:
+            self._server = webserver.EventLoopHTTPServer(("127.0.0.1", 0), webserver.get_response)
+        elif args.handler_pool_size is None:
+            self._server = webserver.ThreadedHTTPServer(("127.0.0.1", 0), webserver.MyHandler)
+            self._server.daemon_threads = True
+        else:
+            self._server = webserver.PooledHTTPServer(("127.0.0.1", 0), webserver.MyHandler)
+            self._server.pool_size = args.handler_pool_size
+            self._server.queue_size = args.handler_queue_size
+        self.port = self._server.server_address[1]
+        server_thread = threading.Thread(target=self._server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+    def stop(self):
+        """
+        Stop serving and scraping.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._web_manager.stop()
+        self._web_manager.join()
+
+
+def run(args):
+    """
+    Run the benchmark.
+    Args:
+        args: the command line arguments
+    """
+    deployment = LocalDeployment(args)
+    instruments = deployment.instruments
+    time.sleep(args.warmup)
+
+    stop_event = threading.Event()
+    latencies = []
+    errors = []
+    clients = [threading.Thread(target=poll_server, args=(deployment.port, instruments, stop_event, latencies, errors))
+               for _ in range(args.clients)]
+    scrapes_at_start = total_count(COLLATE_SECONDS.get_count, instruments)
+    failures_at_start = total_count(SCRAPE_FAILURES.get, instruments)
+    start_time = default_timer()
+    for client in clients:
+        client.start()
+    time.sleep(args.duration)
+    stop_event.set()
+    for client in clients:
+        client.join()
+    duration = default_timer() - start_time
+    scrapes = total_count(COLLATE_SECONDS.get_count, instruments) - scrapes_at_start
+    failures = total_count(SCRAPE_FAILURES.get, instruments) - failures_at_start
+    deployment.stop()
+
+    results = {
+        "instruments": args.instruments,
+        "blocks_per_instrument": args.blocks,
+        "clients": args.clients,
+        "scrape_cycles_per_second": scrapes / duration,
+        "scrape_failures": failures,
+        "requests_per_second": len(latencies) / duration,
+        "request_errors": len(errors),
+        "peak_memory_mb": peak_memory_mb()}
+    results.update(latency_summary(latencies))
+    report("JSON Bourne throughput", results, args.output)
+
+
+def add_deployment_arguments(parser):
+    """
+    Add the arguments describing a local deployment to a parser.
+    Args:
+        parser: the argument parser
+    """
+    parser.add_argument("--instruments", type=int, default=40, help="Number of fake instruments")
+    parser.add_argument("--blocks", type=int, default=100, help="Number of blocks on each instrument")
+    parser.add_argument("--extra-inst-pvs", type=int, default=200,
+                        help="Number of INST channels on each instrument which are not on the info page")
+    parser.add_argument("--change-rate", type=float, default=0.1,
+                        help="Probability of each value changing each time its page is requested")
+    parser.add_argument("--scrape-wait", type=int, default=0,
+                        help="Seconds each scrapper waits between scrapes, 0 to scrape as fast as possible")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="Scrape with a pool of this many workers instead of a thread per instrument")
+    parser.add_argument("--client-rate", type=float, default=1e9,
+                        help="Requests per second allowed from a client address, all the load comes from one address "
+                             "so by default it is not limited")
+    parser.add_argument("--client-burst", type=int, default=1000000,
+                        help="Requests allowed at once from an idle client address")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Most requests handled at once; default that of the server")
+    parser.add_argument("--event-loop-server", action="store_true",
+                        help="Handle requests on a single event loop thread instead of a thread per connection")
+    parser.add_argument("--handler-pool-size", type=int, default=None,
+                        help="Handle requests with a pool of this many threads instead of a thread per connection")
+    parser.add_argument("--handler-queue-size", type=int, default=100,
+                        help="Number of connections which can wait for a handler thread in the pool")
+
+
+def add_arguments(parser):
+    """
+    Add the benchmark's arguments to a parser.
+    Args:
+        parser: the argument parser
+    """
+    add_deployment_arguments(parser)
+    parser.add_argument("--clients", type=int, default=10, help="Number of clients polling the server")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to measure for")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds to scrape for before measuring")
+    parser.add_argument("--output", default=None, help="File to save the results to as json")
+    parser.set_defaults(run=run)
@@ -0,0 +1,187 @@
+"""
+Logging which does not block the request handler threads. Records are put on a queue and written by a background
+thread, and the access of each request is counted and logged as a periodic summary rather than a line per request.
+"""
+import logging
+from threading import Event, Lock, Thread
+
+from six.moves import queue
+
+
+class QueueHandler(logging.Handler):
+    """
+    Handler which puts records on a queue for a queue listener to write.
+    """
+
+    def __init__(self, record_queue):
+        """
+        Initialise.
+        Args:
+            record_queue: queue to put the records on
+        """
+        logging.Handler.__init__(self)
+        self.queue = record_queue
+
+    def emit(self, record):
+        """
+        Put a record on the queue.
+        Args:
+            record: the record
+        """
+        try:
+            # format any exception now as the traceback can not be formatted on another thread
+            if record.exc_info:
+                self.format(record)
+                record.exc_info = None
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    """
+    Background thread taking records from a queue and passing them to handlers.
+    """
+
+    _STOP = None
+
+    def __init__(self, record_queue, *handlers):
+        """
+        Initialise.
+        Args:
+            record_queue: queue the records are put on
+            handlers: handlers which write the records
+        """
+        self.queue = record_queue
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        """
+        Start writing records.
+        """
+        self._thread = Thread(target=self._monitor, name="LogWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Write the records already queued and stop.
+        """
+        if self._thread is None:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _monitor(self):
+        """
+        Write records until stopped.
+        """
+        while True:
+            record = self.queue.get()
+            if record is self._STOP:
+                return
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+
+class AccessLog(object):
+    """
+    Log of the requests made to the server. The first request from each client host for an instrument in a period is
+    logged as it happens, the rest are counted and logged as a summary at the end of the period.
+    """
+
+    def __init__(self, logger, summary_seconds=60):
+        """
+        Initialise.
+        Args:
+            logger: logger to log to
+            summary_seconds: seconds between summaries; 0 to log every request
+        """
+        self._logger = logger
+        self.summary_seconds = summary_seconds
+        self._lock = Lock()
+        self._counts = {}
+        self._stop_event = Event()
+        self._thread = None
+
+    def record(self, client_address, instrument):
+        """
+        Record a request.
+        Args:
+            client_address: address of the client as (host, port)
+            instrument: instrument requested
+        """
+        if self.summary_seconds == 0:
+            count = 0
+        else:
+            key = (client_address[0], instrument)
+            with self._lock:
+                count = self._counts.get(key, 0)
+                self._counts[key] = count + 1
+        if count == 0:
+            # Warn level so as to avoid many log messages that come from other modules
+            self._logger.warn("Connected to from %s looking at %s", client_address, instrument)
+
+    def summarise(self):
+        """
+        Log the number of requests for each instrument since the last summary and start counting again.
+        """
+        with self._lock:
+            counts = self._counts
+            self._counts = {}
+        if self.summary_seconds == 0:
+            return
+        requests_by_instrument = {}
+        for (host, instrument), count in counts.items():
+            requests_by_instrument.setdefault(instrument, {})[host] = count
+        for instrument in sorted(requests_by_instrument.keys()):
+            hosts = requests_by_instrument[instrument]
+            self._logger.warn("Access summary for last %s seconds: %s requests from %s clients looking at %s",
+                              self.summary_seconds, sum(hosts.values()), len(hosts), instrument)
+
+    def start(self):
+        """
+        Start logging summaries periodically.
+        """
+        if self.summary_seconds == 0:
+            return
+        self._thread = Thread(target=self._summarise_periodically, name="AccessLogSummary")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Log a last summary and stop.
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self.summarise()
+
+    def _summarise_periodically(self):
+        """
+        Log summaries until stopped.
+        """
+        while not self._stop_event.wait(self.summary_seconds):
+            self.summarise()
+
+
+def start_background_logging(logger, handler):
+    """
+    Write the records of a logger with a handler on a background thread.
+    Args:
+        logger: the logger
+        handler: the handler which writes the records
+
+    Returns: the listener writing the records, stop it to write those outstanding
+
+    """
+    record_queue = queue.Queue()
+    logger.addHandler(QueueHandler(record_queue))
+    listener = QueueListener(record_queue, handler)
+    listener.start()
+    return listener
@@ -0,0 +1,146 @@
+"""
+Admission control of requests, limiting the rate of requests from each client and the number handled at once so that
+one misbehaving client or a burst of requests can not take all the server's capacity.
+"""
+import heapq
+from collections import OrderedDict
+from threading import Lock
+from timeit import default_timer
+
+
+class TokenBucket(object):
+    """
+    Bucket refilled with tokens at a steady rate up to its capacity; each request takes a token.
+    """
+
+    def __init__(self, rate, burst, now):
+        """
+        Initialise full.
+        Args:
+            rate: tokens added per second
+            burst: capacity of the bucket
+            now: the current time in seconds
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_time = now
+        # number of requests refused because the bucket was empty
+        self.throttled = 0
+
+    def refill(self, now):
+        """
+        Add the tokens for the time since the bucket was last refilled.
+        Args:
+            now: the current time in seconds
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+
+    def take(self, now):
+        """
+        Take a token if there is one.
+        Args:
+            now: the current time in seconds
+
+        Returns: True if a token was taken; False if the bucket is empty
+
+        """
+        self.refill(now)
+        if self.tokens < 1:
+            self.throttled += 1
+            return False
+        self.tokens -= 1
+        return True
+
+
+class ClientRateLimiter(object):
+    """
+    Limits the rate of requests from each client with a token bucket per client. At most max_clients buckets are
+    kept, the bucket of the least recently seen client is discarded to make room for a new one. Each bucket counts the
+    requests throttled so that the most throttled clients can be seen.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000, timer=default_timer):
+        """
+        Initialise.
+        Args:
+            rate: sustained requests per second allowed from each client
+            burst: requests allowed from a client at once after it has been idle
+            max_clients: most clients tracked at once
+            timer: function returning the current time in seconds
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._timer = timer
+        # buckets in order of when their client was last seen, least recent first
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+    def allow(self, client):
+        """
+        Args:
+            client: the client making a request
+
+        Returns: True if the client is within its rate; False if the request should be throttled
+
+        """
+        now = self._timer()
+        with self._lock:
+            bucket = self._buckets.pop(client, None)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._buckets.popitem(last=False)
+                bucket = TokenBucket(self.rate, self.burst, now)
+            self._buckets[client] = bucket
+            return bucket.take(now)
+
+    def most_throttled(self, count):
+        """
+        Args:
+            count: most clients returned
+
+        Returns: list of (client, number of requests throttled) of the tracked clients which have been throttled the
+            most, most throttled first
+
+        """
+        with self._lock:
+            throttled = [(client, bucket.throttled) for client, bucket in self._buckets.items() if bucket.throttled > 0]
+        return heapq.nlargest(count, throttled, key=lambda client_and_throttled: client_and_throttled[1])
+
+
+class InFlightLimiter(object):
+    """
+    Limits the number of requests being handled at once.
+    """
+
+    def __init__(self, max_in_flight):
+        """
+        Initialise.
+        Args:
+            max_in_flight: most requests handled at once
+        """
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._lock = Lock()
+
+    def try_enter(self):
+        """
+        Start handling a request if below the limit; call leave when it has been handled.
+
+        Returns: True if the request can be handled; False if it should be shed
+
+        """
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        """
+        Finish handling a request.
+        """
+        with self._lock:
+            self.in_flight -= 1
@@ -0,0 +1,229 @@
+"""
+Recent history of the values of each instrument's blocks, kept in memory so that short trends can be served without
+querying the archiver. Only numeric values are kept, in a fixed size ring buffer of doubles for each block, so memory
+is bounded by the number of samples per block and the number of blocks.
+"""
+import logging
+from array import array
+from threading import Lock
+
+import numpy as np
+
+from external_webpage.history_aggregation import AGGREGATE_MEAN, aggregate_history
+
+logger = logging.getLogger('JSON_bourne')
+
+# Status of a block whose value is current
+CONNECTED_STATUS = "Connected"
+
+# Kind of channel which is a block of the configuration; blocks and instrument PVs are kept apart as they can share
+# names
+CHANNEL_BLOCK = "block"
+
+# Kind of channel which is an instrument PV, e.g. the beam current
+CHANNEL_INST_PV = "inst_pv"
+
+
+def _to_number(value):
+    """
+    Args:
+        value: the value of a block, possibly followed by its units e.g. "1.5 K"
+
+    Returns: the value as a float; None if it is not a number
+
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        parts = value.split()
+    except AttributeError:
+        return None
+    # a number on its own or followed by a single units token, anything else such as "2 min 3 s" is text
+    if len(parts) not in (1, 2):
+        return None
+    try:
+        return float(parts[0])
+    except ValueError:
+        return None
+
+
+class BlockHistory(object):
+    """
+    Ring buffer of the last samples of a block's numeric value, held as doubles with NaN where the block was
+    disconnected or its value was not a number.
+    """
+
+    def __init__(self, capacity):
+        """
+        Initialise empty.
+        Args:
+            capacity: number of samples kept
+        """
+        self.capacity = capacity
+        self._times = array("d", [0.0]) * capacity
+        self._values = array("d", [0.0]) * capacity
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, time, value, connected=True):
+        """
+        Add a sample, replacing the oldest if the buffer is full.
+        Args:
+            time: time of the sample in seconds since the epoch
+            value: the block's value
+            connected: False if the block was disconnected so the value is not current
+        """
+        number = _to_number(value) if connected else None
+        self._times[self._next] = time
+        self._values[self._next] = float("nan") if number is None else number
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def get_arrays(self, since=None):
+        """
+        Copy the samples, the buffers are read as arrays without converting each sample.
+        Args:
+            since: time from which samples are returned; None for all the samples
+
+        Returns: tuple of arrays of the times and values of the samples in time order; values are NaN where the block
+            was disconnected
+
+        """
+        start = (self._next - self._count) % self.capacity
+        end = start + self._count
+        times = np.frombuffer(self._times, dtype=np.float64)
+        values = np.frombuffer(self._values, dtype=np.float64)
+        if end <= self.capacity:
+            times, values = times[start:end].copy(), values[start:end].copy()
+        else:
+            times = np.concatenate((times[start:], times[:end - self.capacity]))
+            values = np.concatenate((values[start:], values[:end - self.capacity]))
+        if since is not None:
+            first = np.searchsorted(times, since)
+            times, values = times[first:], values[first:]
+        return times, values
+
+    def get(self, since=None):
+        """
+        Args:
+            since: time from which samples are returned; None for all the samples
+
+        Returns: tuple of the times and values of the samples in time order, as lists; values are None where the
+            block was disconnected or its value was not a number
+
+        """
+        times, values = self.get_arrays(since)
+        return times.tolist(), _to_list(values)
+
+
+class BlockHistories(object):
+    """
+    Histories of the blocks of all the instruments, added to each time an instrument's data is published. A block's
+    history is started when it has a numeric value, blocks whose values are text are not recorded. Configure by
+    setting samples_per_block and max_blocks before recording.
+    """
+
+    def __init__(self, samples_per_block=1200, max_blocks=5000):
+        """
+        Initialise.
+        Args:
+            samples_per_block: number of samples kept for each block
+            max_blocks: most blocks, across all instruments, with a history; further blocks are not recorded
+        """
+        self.samples_per_block = samples_per_block
+        self.max_blocks = max_blocks
+        self._histories = {}
+        self._block_count = 0
+        self._full_logged = False
+        self._lock = Lock()
+
+    def record(self, instrument, time, data):
+        """
+        Add a sample of each of an instrument's blocks, and forget blocks it no longer has.
+        Args:
+            instrument: name of the instrument
+            time: time of the data in seconds since the epoch
+            data: the instrument's data as published
+        """
+        blocks = {}
+        for name, block in data["inst_pvs"].items():
+            blocks[(CHANNEL_INST_PV, name)] = block
+        for group in data["groups"].values():
+            for name, block in group.items():
+                blocks[(CHANNEL_BLOCK, name)] = block
+
+        with self._lock:
+            histories = self._histories.setdefault(instrument, {})
+            for key in [key for key in histories if key not in blocks]:
+                del histories[key]
+                self._block_count -= 1
+            for key, block in blocks.items():
+                history = histories.get(key)
+                if history is None:
+                    if _to_number(block.get("value")) is None:
+                        continue
+                    if self._block_count >= self.max_blocks:
+                        if not self._full_logged:
+                            logger.warn("Block history is full at {} blocks, {} {} of {} not recorded".format(
+                                self.max_blocks, key[0], key[1], instrument))
+                            self._full_logged = True
+                        continue
+                    history = BlockHistory(self.samples_per_block)
+                    histories[key] = history
+                    self._block_count += 1
+                history.append(time, block.get("value"), block.get("status") == CONNECTED_STATUS)
+
+    def remove(self, instrument):
+        """
+        Forget the histories of an instrument, e.g. when it is removed from the instrument list.
+        Args:
+            instrument: name of the instrument
+        """
+        with self._lock:
+            histories = self._histories.pop(instrument, {})
+            self._block_count -= len(histories)
+            if len(histories) > 0:
+                self._full_logged = False
+
+    def get(self, instrument, block, since=None, points=None, aggregate=AGGREGATE_MEAN, kind=CHANNEL_BLOCK):
+        """
+        Args:
+            instrument: name of the instrument
+            block: name of the block or instrument PV
+            since: time from which samples are returned; None for all the samples
+            points: most points returned, the samples are aggregated if there are more; None for every sample
+            aggregate: how the samples are aggregated, one of history_aggregation.AGGREGATES
+            kind: kind of channel, CHANNEL_BLOCK or CHANNEL_INST_PV
+
+        Returns: tuple of the times and values of the block's samples in time order, as lists; values are None where
+            the block was disconnected or its value was not a number
+
+        """
+        with self._lock:
+            try:
+                history = self._histories[instrument][(kind, block)]
+            except KeyError:
+                raise ValueError("No history of {} {} on {}".format(kind, block, instrument))
+            times, values = history.get_arrays(since)
+
+        # aggregated outside the lock as it is the slow part
+        if points is not None:
+            times, values = aggregate_history(times, values, points, aggregate)
+        return times.tolist(), _to_list(values)
+
+
+def _to_list(values):
+    """
+    Args:
+        values: array of values; NaN where disconnected
+
+    Returns: list of the values; None where disconnected
+
+    """
+    as_objects = values.astype(object)
+    as_objects[np.isnan(values)] = None
+    return as_objects.tolist()
+
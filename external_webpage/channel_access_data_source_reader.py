@@ -0,0 +1,371 @@
+# This file is part of the ISIS IBEX application.
+# Copyright (C) 2017 Science & Technology Facilities Council.
+# All rights reserved.
+#
+# This program is distributed in the hope that it will be useful.
+# This program and the accompanying materials are made available under the
+# terms of the Eclipse Public License v1.0 which accompanies this distribution.
+# EXCEPT AS EXPRESSLY SET FORTH IN THE ECLIPSE PUBLIC LICENSE V1.0, THE PROGRAM
+# AND ACCOMPANYING MATERIALS ARE PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND.  See the Eclipse Public License v1.0 for more details.
+#
+# You should have received a copy of the Eclipse Public License v1.0
+# along with this program; if not, you can obtain a copy from
+# https://www.eclipse.org/org/documents/epl-v10.php or
+# http://opensource.org/licenses/eclipse-1.0.php
+"""
+Classes for getting block and instrument PV values from channel access monitors instead of the archive engine.
+"""
+
+import itertools
+import logging
+from threading import RLock
+
+from CaChannel import CaChannel, CaChannelException, ca
+
+from external_webpage.data_source_reader import DataSourceReader
+from external_webpage.instrument_information_collator import InstrumentInformationCollator
+
+logger = logging.getLogger('JSON_bourne')
+
+# Prefix of block PVs after the instrument prefix
+BLOCK_PV_PREFIX = "CS:SB:"
+
+# Prefix for the host names of instruments, these have a pv prefix of IN:<instrument name>:
+INSTRUMENT_HOST_PREFIX = "NDX"
+
+# PV after the instrument prefix holding the details of the current configuration, it changes when the configuration
+# changes
+CONFIG_PV = "CS:BLOCKSERVER:GET_CURR_CONFIG_DETAILS"
+
+
+def pv_prefix_for_host(host):
+    """
+    Get the pv prefix for an IBEX host.
+    Args:
+        host: the host name of the instrument
+
+    Returns: IN:<name>: for instrument machines (NDX<name>); TE:<host>: otherwise
+
+    """
+    host = host.upper()
+    if host.startswith(INSTRUMENT_HOST_PREFIX):
+        return "IN:{}:".format(host[len(INSTRUMENT_HOST_PREFIX):])
+    return "TE:{}:".format(host)
+
+
+def default_inst_pvs():
+    """
+    Returns: the instrument PVs to monitor by default; the name in the instrument archive mapped to the pv without
+        the instrument prefix
+
+    """
+    inst_pvs = {}
+    for pv in InstrumentInformationCollator.REQUIRED_PVS:
+        inst_pvs[pv] = "DAE:{}".format(pv)
+    inst_pvs[InstrumentInformationCollator.DISPLAY_TITLE_CHANNEL_NAME] = "DAE:TITLE:DISPLAY"
+    return inst_pvs
+
+
+class ChannelAccessMonitors(object):
+    """
+    Channel access layer which subscribes to monitors using CaChannel.
+    """
+
+    def subscribe(self, pv_name, callback):
+        """
+        Subscribe to value and connection changes of a PV.
+        Args:
+            pv_name: name of the pv
+            callback: called with connected and, if connected, value, alarm, units and precision each time the pv
+                changes
+
+        Returns: the subscription; call clear on it to stop monitoring
+
+        """
+        return _ChannelMonitor(pv_name, callback)
+
+
+class _ChannelMonitor(object):
+    """
+    A monitor on a single channel.
+    """
+
+    def __init__(self, pv_name, callback):
+        """
+        Initialise and start searching for the channel.
+        Args:
+            pv_name: name of the pv
+            callback: callback for changes to the pv
+        """
+        self._callback = callback
+        self._subscribed = False
+        self._channel = CaChannel(pv_name)
+        self._channel.search_and_connect(None, self._on_connection_change)
+        self._channel.flush_io()
+
+    def _on_connection_change(self, epics_args, _):
+        """
+        Called by channel access when the channel connects or disconnects. The monitor is added on the first
+        connection only; channel access keeps it across reconnections.
+        """
+        if epics_args[1] != ca.CA_OP_CONN_UP:
+            self._callback(False)
+            return
+        if self._subscribed:
+            return
+
+        try:
+            request_type = ca.dbf_type_to_DBR_CTRL(self._channel.field_type())
+            if request_type == ca.DBR_CTRL_ENUM:
+                request_type = ca.DBR_STS_STRING
+            self._channel.add_masked_array_event(request_type, None, None, self._on_value_change)
+            self._channel.flush_io()
+            self._subscribed = True
+        except CaChannelException as ex:
+            logger.error("Can not monitor {}: {}".format(self._channel.name(), ex))
+
+    def _on_value_change(self, epics_args, _):
+        """
+        Called by channel access when the value or alarm of the channel changes.
+        """
+        value = epics_args["pv_value"]
+        if self._channel.field_type() == ca.DBF_CHAR and isinstance(value, (list, tuple)):
+            value = "".join(chr(character) for character in itertools.takewhile(lambda c: c != 0, value))
+
+        severity = epics_args.get("pv_severity", 0)
+        if severity == 0:
+            alarm = u""
+        else:
+            alarm = u"{}/{}".format(severity.name.upper(), epics_args["pv_status"].name.upper())
+
+        self._callback(True, value, alarm, epics_args.get("pv_units", u""), epics_args.get("pv_precision"))
+
+    def clear(self):
+        """
+        Stop monitoring the channel.
+        """
+        try:
+            self._channel.clear_channel()
+            self._channel.flush_io()
+        except CaChannelException as ex:
+            logger.error("Can not clear monitor on {}: {}".format(self._channel.name(), ex))
+
+
+class ChannelAccessDataSourceReader(DataSourceReader):
+    """
+    Access of block and instrument values from channel access monitors, the configuration is read from the block
+    server's web page when the configuration PV shows it has changed. Pages are returned in the same format as the
+    archive engine info pages so this can be used in place of the data source reader. The change listener is called
+    whenever a monitored value changes.
+    """
+
+    def __init__(self, host, pv_prefix=None, ca_layer=None, inst_pvs=None, **kwargs):
+        """
+        Initialize.
+        Args:
+            host: The host name for the instrument.
+            pv_prefix: The pv prefix of the instrument; None to work it out from the host name
+            ca_layer: The channel access layer used to subscribe to monitors; None for channel access through
+                CaChannel
+            inst_pvs: The instrument pvs to monitor as a dictionary of name in the instrument archive to pv without
+                the prefix; None for the DAE PVs shown on the info page
+            kwargs: Arguments of the data source reader used to read the configuration, e.g. its timeouts
+        """
+        super(ChannelAccessDataSourceReader, self).__init__(host, **kwargs)
+        self._pv_prefix = pv_prefix_for_host(host) if pv_prefix is None else pv_prefix
+        self._ca_layer = ChannelAccessMonitors() if ca_layer is None else ca_layer
+        self._inst_pvs = default_inst_pvs() if inst_pvs is None else inst_pvs
+
+        self._channels_lock = RLock()
+        self._block_channels = {}
+        self._inst_channels = {}
+        self._subscriptions = {}
+        self._change_listener = None
+
+        self._config = None
+        self._config_subscription = None
+        # the configuration is read again on every read while the configuration PV is disconnected
+        self._config_pv_connected = False
+        self._config_changed = True
+        self._config_pv_value = None
+
+    def set_change_listener(self, listener):
+        """
+        Set a function to call when a monitored value or the configuration changes.
+        Args:
+            listener: function with no arguments
+        """
+        self._change_listener = listener
+
+    def _notify_change(self):
+        """
+        Tell the change listener that the instrument's information has changed.
+        """
+        listener = self._change_listener
+        if listener is not None:
+            listener()
+
+    def _monitor(self, channels, channel_name, pv_name):
+        """
+        Start monitoring a pv; it is disconnected until the first update arrives.
+        Args:
+            channels: the channels dictionary to keep the pv's channel in
+            channel_name: the name of the channel in the page
+            pv_name: the name of the pv to monitor
+        """
+        def on_change(connected, value=None, alarm=u"", units=u"", precision=None):
+            if connected:
+                current_value = {u"Value": value, u"Alarm": alarm, u"Units": units}
+                if precision is not None:
+                    current_value[u"Precision"] = precision
+            else:
+                current_value = {u"Value": u"null"}
+            with self._channels_lock:
+                if channel_name not in channels:
+                    return
+                channels[channel_name] = {u"Channel": channel_name,
+                                          u"Connected": connected,
+                                          u"Current Value": current_value}
+            self._notify_change()
+
+        with self._channels_lock:
+            channels[channel_name] = {u"Channel": channel_name,
+                                      u"Connected": False,
+                                      u"Current Value": {u"Value": u"null"}}
+        self._subscriptions[channel_name] = self._ca_layer.subscribe(pv_name, on_change)
+
+    def _stop_monitoring(self, channels, channel_name):
+        """
+        Stop monitoring a pv and forget its channel.
+        Args:
+            channels: the channels dictionary the pv's channel is in
+            channel_name: the name of the channel
+        """
+        with self._channels_lock:
+            del channels[channel_name]
+        self._subscriptions.pop(channel_name).clear()
+
+    def _monitor_blocks(self, block_names):
+        """
+        Monitor exactly the given blocks, starting monitors on new blocks and stopping ones on removed blocks.
+        Args:
+            block_names: names of the blocks
+        """
+        wanted_channels = {}
+        for block_name in block_names:
+            wanted_channels["{}{}{}".format(self._pv_prefix, BLOCK_PV_PREFIX, block_name)] = block_name
+
+        for channel_name in list(self._block_channels.keys()):
+            if channel_name not in wanted_channels:
+                self._stop_monitoring(self._block_channels, channel_name)
+
+        for channel_name in wanted_channels:
+            if channel_name not in self._block_channels:
+                self._monitor(self._block_channels, channel_name, channel_name)
+
+    def _monitor_inst_pvs(self):
+        """
+        Monitor the instrument pvs if they are not already monitored.
+        """
+        if len(self._inst_channels) > 0:
+            return
+        for pv in self._inst_pvs.values():
+            pv_name = "{}{}".format(self._pv_prefix, pv)
+            # The archive engine names its channels with the field
+            self._monitor(self._inst_channels, "{}.VAL".format(pv_name), pv_name)
+
+    def _page(self, channels):
+        """
+        Args:
+            channels: dictionary of channels
+
+        Returns: info page containing the current state of the channels
+
+        """
+        with self._channels_lock:
+            return {u"Channels": list(channels.values()), u"Enabled": True}
+
+    def get_json_from_blocks_archive(self):
+        """
+        get a list of all monitored blocks
+
+        Returns: list of blocks
+
+        """
+        return self._page(self._block_channels)
+
+    def get_json_from_dataweb_archive(self):
+        """
+        get a list of blocks from the dataweb archive; all blocks are in the blocks page so this is empty
+
+        Returns: list of blocks
+
+        """
+        return self._page({})
+
+    def get_json_from_instrument_archive(self):
+        """
+        get a list of the monitored instrument pvs
+
+        Returns: list of blocks
+
+        """
+        self._monitor_inst_pvs()
+        return self._page(self._inst_channels)
+
+    def _on_config_change(self, connected, value=None, *_):
+        """
+        Called when the configuration PV changes; the configuration is read again on the next read if the PV's value
+        has changed.
+        Args:
+            connected: True if the PV is connected
+            value: the details of the configuration
+        """
+        with self._channels_lock:
+            self._config_pv_connected = connected
+            if not connected or value == self._config_pv_value:
+                return
+            self._config_pv_value = value
+            self._config_changed = True
+        self._notify_change()
+
+    def read_config(self):
+        """
+        Read the configuration from the instrument block server, if it has changed since it was last read, and
+        monitor the blocks within it.
+
+        Returns: The configuration as a dictionary.
+
+        """
+        if self._config_subscription is None:
+            self._config_subscription = self._ca_layer.subscribe(
+                "{}{}".format(self._pv_prefix, CONFIG_PV), self._on_config_change)
+
+        with self._channels_lock:
+            read_needed = self._config is None or self._config_changed or not self._config_pv_connected
+            self._config_changed = False
+        if not read_needed:
+            return self._config
+
+        try:
+            config = super(ChannelAccessDataSourceReader, self).read_config()
+        except Exception:
+            with self._channels_lock:
+                self._config_changed = True
+            raise
+        self._monitor_blocks(block["name"] for block in config["blocks"])
+        self._config = config
+        return config
+
+    def close(self):
+        """
+        Stop monitoring all pvs.
+        """
+        if self._config_subscription is not None:
+            self._config_subscription.clear()
+            self._config_subscription = None
+        for channel_name in list(self._block_channels.keys()):
+            self._stop_monitoring(self._block_channels, channel_name)
+        for channel_name in list(self._inst_channels.keys()):
+            self._stop_monitoring(self._inst_channels, channel_name)
@@ -17,10 +17,19 @@
 Classes for getting external resources.
 """
 
+import heapq
+import itertools
 import json
 
 import logging
+from collections import deque
+from threading import Thread, Lock, Condition
+from time import time
+
 import requests
+from six.moves.queue import Queue
+
+from external_webpage.metrics import SOURCE_FETCH_SECONDS
 
 logger = logging.getLogger('JSON_bourne')
 
@@ -31,19 +40,197 @@ PORT_BLOCKS = 4813
 # Port for configuration
 PORT_CONFIG = 8008
 
+# Names of the data sources
+SOURCE_BLOCKS = "BLOCKS"
+SOURCE_DATAWEB = "DATAWEB"
+SOURCE_INST = "INST"
+SOURCE_CONFIG = "CONFIG"
+
+# Default timeout in seconds for connecting to and reading from a data source
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+# Number of recent request latencies kept for each source
+LATENCY_SAMPLES = 100
+
+# Number of latencies needed before a hedged request can be sent
+MIN_LATENCY_SAMPLES_TO_HEDGE = 20
+
+# Percentile of recent latencies after which a hedged request is sent
+HEDGE_PERCENTILE = 95
+
+# Number of threads sending hedged requests, shared by all the readers
+HEDGE_POOL_SIZE = 4
+
+
+class LatencyTracker(object):
+    """
+    Keeps the most recent latencies of requests to a data source.
+    """
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        """
+        Initialize.
+        Args:
+            size: number of latencies to keep
+        """
+        self._latencies = deque(maxlen=size)
+        self._lock = Lock()
+
+    def add(self, latency):
+        """
+        Add a latency.
+        Args:
+            latency: latency in seconds
+        """
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, percent, min_samples=MIN_LATENCY_SAMPLES_TO_HEDGE):
+        """
+        Args:
+            percent: the percentile to return
+            min_samples: number of latencies needed to estimate the percentile
+
+        Returns: the given percentile of the recent latencies; None if there are not enough latencies
+
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < min_samples:
+            return None
+        index = min(len(latencies) - 1, int(len(latencies) * percent / 100.0))
+        return latencies[index]
+
+
+class HedgePool(object):
+    """
+    Pool of worker threads sending hedged requests once they are due. A request cancelled before it is due is never
+    sent, so a thread is only used for the requests which are slower than their deadline.
+    """
+
+    def __init__(self, size=HEDGE_POOL_SIZE):
+        """
+        Initialize.
+        Args:
+            size: number of worker threads, started when the first request is scheduled
+        """
+        self._size = size
+        self._workers = []
+        self._due = []
+        self._pending = {}
+        self._sequence = itertools.count()
+        self._condition = Condition()
+
+    def schedule(self, delay, request):
+        """
+        Queue a request to be sent.
+        Args:
+            delay: seconds from now at which the request is sent
+            request: function to send the request, called on a worker thread
+
+        Returns: the number of the request, to cancel it with
+
+        """
+        with self._condition:
+            if not self._workers:
+                self._start_workers()
+            sequence = next(self._sequence)
+            self._pending[sequence] = request
+            heapq.heappush(self._due, (time() + delay, sequence))
+            self._condition.notify()
+        return sequence
+
+    def cancel(self, sequence):
+        """
+        Cancel a request if it has not yet been sent.
+        Args:
+            sequence: the number of the request
+
+        Returns: True if the request was cancelled; False if it has already been sent
+
+        """
+        with self._condition:
+            return self._pending.pop(sequence, None) is not None
+
+    def _start_workers(self):
+        """
+        Start the worker threads.
+        """
+        for index in range(self._size):
+            worker = Thread(target=self._work, name="HedgeWorker-{}".format(index))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _next_due(self):
+        """
+        Wait for the next request which has not been cancelled to become due.
+
+        Returns: the request
+
+        """
+        with self._condition:
+            while True:
+                if not self._due:
+                    self._condition.wait()
+                    continue
+                due_time, sequence = self._due[0]
+                wait = due_time - time()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._due)
+                request = self._pending.pop(sequence, None)
+                if request is not None:
+                    return request
+
+    def _work(self):
+        """
+        Send requests as they become due.
+        """
+        while True:
+            request = self._next_due()
+            try:
+                request()
+            except Exception as e:
+                logger.error("Hedged request failed: {}".format(e))
+
+
+# Pool sending the hedged requests of all readers
+hedge_pool = HedgePool()
+
 
 class DataSourceReader(object):
     """
     Access of external data sources from urls.
     """
 
-    def __init__(self, host):
+    def __init__(self, host, timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT), source_timeouts=None,
+                 hedged_sources=(), blocks_port=PORT_BLOCKS, inst_port=PORT_INSTPV, config_port=PORT_CONFIG):
         """
         Initialize.
         Args:
             host: The host name for the instrument.
+            timeout: Tuple of connect and read timeouts in seconds for requests to the data sources.
+            source_timeouts: Dictionary of source name to tuple of connect and read timeouts overriding the timeout
+                for that source.
+            hedged_sources: Names of the sources for which a second request is sent if the first has not been
+                answered by the 95th percentile of recent latencies; the second answer is used if the first fails.
+            blocks_port: Port of the blocks and dataweb archive.
+            inst_port: Port of the instrument archive.
+            config_port: Port of the block server's configuration page.
         """
         self._host = host
+        self._blocks_port = blocks_port
+        self._inst_port = inst_port
+        self._config_port = config_port
+        self._timeout = timeout
+        self._source_timeouts = {} if source_timeouts is None else source_timeouts
+        self._hedged_sources = frozenset(hedged_sources)
+        self._latencies = {}
+        for source in self._hedged_sources:
+            self._latencies[source] = LatencyTracker()
 
     def get_json_from_blocks_archive(self):
         """
@@ -52,7 +239,7 @@ class DataSourceReader(object):
         Returns: list of blocks
 
         """
-        return self._get_json_from_info_page(PORT_BLOCKS, "BLOCKS")
+        return self._get_json_from_info_page(self._blocks_port, SOURCE_BLOCKS)
 
     def get_json_from_dataweb_archive(self):
         """
@@ -61,7 +248,7 @@ class DataSourceReader(object):
         Returns: list of blocks
 
         """
-        return self._get_json_from_info_page(PORT_BLOCKS, "DATAWEB")
+        return self._get_json_from_info_page(self._blocks_port, SOURCE_DATAWEB)
 
     def get_json_from_instrument_archive(self):
         """
@@ -70,7 +257,7 @@ class DataSourceReader(object):
         Returns: list of blocks
 
         """
-        return self._get_json_from_info_page(PORT_INSTPV, "INST")
+        return self._get_json_from_info_page(self._inst_port, SOURCE_INST)
 
     def _get_json_from_info_page(self, port, group_name):
         """
@@ -86,12 +273,71 @@ class DataSourceReader(object):
         url = 'http://{host}:{port}/group?name={group_name}&format=json'.format(
             host=self._host, port=port, group_name=group_name)
         try:
-            page = requests.get(url)
+            page = self._get(group_name, url)
             return page.json()
         except Exception as e:
             logger.error("URL not found or json not understood: " + str(url))
             raise e
 
+    def _get(self, source, url):
+        """
+        Get a page from a data source, hedging the request if the source is hedged.
+        Args:
+            source: the name of the source
+            url: the url of the page
+
+        Returns: the response
+
+        """
+        with SOURCE_FETCH_SECONDS.time(host=self._host, source=source):
+            return self._get_from_source(source, url)
+
+    def _get_from_source(self, source, url):
+        """
+        Get a page from a data source, hedging the request if the source is hedged.
+        Args:
+            source: the name of the source
+            url: the url of the page
+
+        Returns: the response
+
+        """
+        timeout = self._source_timeouts.get(source, self._timeout)
+        if source not in self._hedged_sources:
+            return requests.get(url, timeout=timeout)
+
+        latencies = self._latencies[source]
+        hedge_delay = latencies.percentile(HEDGE_PERCENTILE)
+        hedge_sequence = None
+        hedge_answers = Queue()
+        if hedge_delay is not None:
+            def hedged_request():
+                start_time = time()
+                try:
+                    response = requests.get(url, timeout=timeout)
+                except Exception as ex:
+                    hedge_answers.put((False, ex))
+                    return
+                latencies.add(time() - start_time)
+                hedge_answers.put((True, response))
+            hedge_sequence = hedge_pool.schedule(hedge_delay, hedged_request)
+
+        start_time = time()
+        try:
+            response = requests.get(url, timeout=timeout)
+        except Exception:
+            # a hedged request which can no longer be cancelled has been sent, so its answer can be used instead
+            if hedge_sequence is None or hedge_pool.cancel(hedge_sequence):
+                raise
+            succeeded, hedge_response = hedge_answers.get()
+            if succeeded:
+                return hedge_response
+            raise
+        latencies.add(time() - start_time)
+        if hedge_sequence is not None:
+            hedge_pool.cancel(hedge_sequence)
+        return response
+
     def read_config(self):
         """
         Read the configuration from the instrument block server.
@@ -101,7 +347,7 @@ class DataSourceReader(object):
         """
 
         # read config
-        page = requests.get('http://%s:%s/' % (self._host, PORT_CONFIG))
+        page = self._get(SOURCE_CONFIG, 'http://%s:%s/' % (self._host, self._config_port))
         corrected_page = page.content\
             .replace("'", '"')\
             .replace("None", "null")\
@@ -113,3 +359,18 @@ class DataSourceReader(object):
             logger.error("JSON conversion failed: " + str(e))
             logger.error("JSON was: " + str(corrected_page))
             raise e
+
+    def set_change_listener(self, listener):
+        """
+        Set a function to call when the instrument's information changes between reads. The data sources are only
+        read when asked so changes are found by the next read and the listener is never called.
+        Args:
+            listener: function with no arguments
+        """
+        pass
+
+    def close(self):
+        """
+        Release any resources held by the reader.
+        """
+        pass
@@ -0,0 +1,246 @@
+"""
+HTTP/1.1 server which serves all its connections from a single event loop thread, so that thousands of mostly idle
+persistent connections cost a socket each rather than a thread each.
+"""
+import asynchat
+import asyncore
+import logging
+import select
+import socket
+from BaseHTTPServer import BaseHTTPRequestHandler
+from time import time
+
+from external_webpage.metrics import CONNECTIONS_REJECTED
+
+logger = logging.getLogger('JSON_bourne')
+
+# Longest request line and headers accepted, in bytes
+MAX_HEADER_SIZE = 8192
+
+# Whether sockets are waited on with poll, select is only used where poll is not available (Windows)
+USE_POLL = hasattr(select, "poll")
+
+# Most connections open at once when waiting with select, which on Windows can only wait on 512 sockets including the
+# listening socket
+MAX_SELECT_CONNECTIONS = 500
+
+# Most connections open at once when waiting with poll, which has no limit on sockets so this only bounds memory use
+MAX_POLL_CONNECTIONS = 10000
+
+# Reason phrase of each status code
+REASONS = {code: reason for code, (reason, _) in BaseHTTPRequestHandler.responses.items()}
+
+
+def format_response(code, body, content_type, keep_alive):
+    """
+    Args:
+        code: the HTTP status code
+        body: the body of the response
+        content_type: the content type of the body
+        keep_alive: True if the connection is kept open after the response; False if it is closed
+
+    Returns: the complete HTTP/1.1 response
+
+    """
+    return "HTTP/1.1 {} {}\r\nContent-type: {}\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n{}".format(
+        code, REASONS.get(code, ""), content_type, len(body), "keep-alive" if keep_alive else "close", body)
+
+
+class _HTTPConnection(asynchat.async_chat):
+    """
+    A connection to a client, reads each request's headers and pushes the response onto the output buffer.
+    """
+
+    def __init__(self, server, sock, client_address):
+        """
+        Initialise.
+        Args:
+            server: the server which accepted the connection
+            sock: the connection's socket
+            client_address: address of the client as (host, port)
+        """
+        asynchat.async_chat.__init__(self, sock, map=server.socket_map)
+        self.set_terminator("\r\n\r\n")
+        self._server = server
+        self.client_address = client_address
+        self._incoming = []
+        self._incoming_size = 0
+        self._closing = False
+        self.last_activity = time()
+
+    def collect_incoming_data(self, data):
+        """
+        Collect the data of the request headers.
+        Args:
+            data: data read
+        """
+        self.last_activity = time()
+        if self._closing:
+            return
+        self._incoming_size += len(data)
+        if self._incoming_size > MAX_HEADER_SIZE:
+            self._respond(431, "", "text/plain", keep_alive=False)
+            return
+        self._incoming.append(data)
+
+    def found_terminator(self):
+        """
+        Respond to a request whose headers have been read.
+        """
+        self.last_activity = time()
+        header = "".join(self._incoming)
+        self._incoming = []
+        self._incoming_size = 0
+        lines = header.split("\r\n")
+        request_line = lines[0].split()
+        if len(request_line) != 3 or not request_line[2].startswith("HTTP/"):
+            self._respond(400, "", "text/plain", keep_alive=False)
+            return
+        method, path, version = request_line
+
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+
+        if method != "GET" or "content-length" in headers or "transfer-encoding" in headers:
+            # requests with a body are not supported, close rather than read the body
+            self._respond(405, "", "text/plain", keep_alive=False)
+            return
+
+        try:
+            code, body, content_type = self._server.respond(path, self.client_address, headers)
+        except Exception as e:
+            logger.error("Error responding to {}: {}".format(path, e))
+            code, body, content_type = 500, "", "text/plain"
+        self._respond(code, body, content_type, keep_alive)
+
+    def _respond(self, code, body, content_type, keep_alive):
+        """
+        Queue a response to be written.
+        Args:
+            code: the HTTP status code
+            body: the body of the response
+            content_type: the content type of the body
+            keep_alive: True to keep the connection open after the response; False to close it
+        """
+        self.push(format_response(code, body, content_type, keep_alive))
+        if not keep_alive:
+            # ignore anything else sent and close once written
+            self._closing = True
+            self._incoming = []
+            self.set_terminator(None)
+            self.close_when_done()
+
+    def handle_error(self):
+        """
+        Close the connection rather than print the traceback.
+        """
+        logger.debug("Error on connection from {}".format(self.client_address), exc_info=True)
+        self.close()
+
+
+class EventLoopHTTPServer(asyncore.dispatcher):
+    """
+    Server accepting connections and handling them all on the thread which calls serve_forever.
+    """
+
+    def __init__(self, server_address, respond, keep_alive_timeout=30, backlog=128, max_connections=None):
+        """
+        Initialise and listen.
+        Args:
+            server_address: (host, port) to listen on; port 0 for a free port
+            respond: function of the path, client address and headers (by lower case name) returning the status code,
+                body and content type; called on the event loop thread so should not block
+            keep_alive_timeout: seconds after which idle connections are closed
+            backlog: number of connections waiting to be accepted
+            max_connections: most connections open at once, further connections are refused with a 503; None for
+                MAX_POLL_CONNECTIONS where poll is used and MAX_SELECT_CONNECTIONS where select is used
+        """
+        self.socket_map = {}
+        asyncore.dispatcher.__init__(self, map=self.socket_map)
+        self.respond = respond
+        self.keep_alive_timeout = keep_alive_timeout
+        if max_connections is None:
+            max_connections = MAX_POLL_CONNECTIONS if USE_POLL else MAX_SELECT_CONNECTIONS
+        self.max_connections = max_connections
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind(server_address)
+        self.listen(backlog)
+        self.server_address = self.socket.getsockname()
+        self._running = False
+
+    def handle_accept(self):
+        """
+        Accept a connection.
+        """
+        accepted = self.accept()
+        if accepted is None:
+            return
+        sock, client_address = accepted
+        # the socket map holds the listening socket as well as the connections
+        if len(self.socket_map) - 1 >= self.max_connections:
+            CONNECTIONS_REJECTED.inc(reason="too_many_connections")
+            try:
+                sock.send(format_response(503, "", "text/plain", keep_alive=False))
+            except socket.error as e:
+                logger.debug("Failed to reject connection from {}: {}".format(client_address, e))
+            sock.close()
+            return
+        _HTTPConnection(self, sock, client_address)
+
+    def connections(self):
+        """
+        Returns: the open connections
+        """
+        return [channel for channel in self.socket_map.values() if channel is not self]
+
+    def close_idle_connections(self):
+        """
+        Close connections idle for longer than the keep alive timeout which have nothing left to write.
+        """
+        cutoff = time() - self.keep_alive_timeout
+        for connection in self.connections():
+            if connection.last_activity < cutoff and not connection.writable():
+                connection.close()
+
+    def serve_forever(self, poll_interval=0.5):
+        """
+        Handle connections until shutdown is called. Sockets are waited on with poll where available as select is
+        limited to a fixed number of sockets (512 on Windows).
+        Args:
+            poll_interval: seconds between checks for idle connections and shutdown
+        """
+        self._running = True
+        next_idle_check = time() + poll_interval
+        while self._running:
+            asyncore.loop(timeout=poll_interval, map=self.socket_map, count=1, use_poll=USE_POLL)
+            if time() >= next_idle_check:
+                self.close_idle_connections()
+                next_idle_check = time() + poll_interval
+
+    def shutdown(self):
+        """
+        Stop serving, the event loop stops within its poll interval.
+        """
+        self._running = False
+
+    def server_close(self):
+        """
+        Close the server and all its connections.
+        """
+        for connection in self.connections():
+            connection.close()
+        self.close()
+
+    def handle_error(self):
+        """
+        Log errors accepting connections rather than stopping.
+        """
+        logger.error("Error accepting connection", exc_info=True)
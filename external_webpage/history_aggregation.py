@@ -0,0 +1,176 @@
+"""
+Aggregation of the numeric history of blocks into fewer points for plotting. The aggregations are NumPy operations
+over whole arrays of samples rather than loops over the samples; values are NaN where a block was disconnected.
+"""
+import numpy as np
+
+# Mean of the samples in each of a number of equal buckets
+AGGREGATE_MEAN = "mean"
+
+# Smallest and largest sample in each of a number of equal buckets, keeping the peaks a mean would smooth away
+AGGREGATE_MIN_MAX = "minmax"
+
+# Largest triangle three buckets, the sample in each bucket which best keeps the shape of the line
+AGGREGATE_LTTB = "lttb"
+
+# Ways a history can be aggregated
+AGGREGATES = (AGGREGATE_MEAN, AGGREGATE_MIN_MAX, AGGREGATE_LTTB)
+
+
+def bucket_starts(count, buckets):
+    """
+    Args:
+        count: number of samples
+        buckets: number of buckets, at most the number of samples
+
+    Returns: the index of the first sample in each of the equal buckets the samples are split into
+
+    """
+    return np.arange(buckets) * count // buckets
+
+
+def bucket_means(times, values, buckets):
+    """
+    Split samples into equal buckets and find the mean time and mean value of each. Several blocks can be aggregated
+    at once by passing their values as a 2D array, a block per row.
+    Args:
+        times: times of the samples
+        values: values of the samples along the last axis; NaN where disconnected
+        buckets: number of buckets; fewer if there are fewer samples
+
+    Returns: tuple of arrays of the mean time and mean value of each bucket along the last axis; values are NaN for
+        buckets without a connected sample
+
+    """
+    count = values.shape[-1]
+    buckets = min(buckets, count)
+    if buckets == 0:
+        return times[:0], values[..., :0]
+    starts = bucket_starts(count, buckets)
+    sizes = np.diff(np.append(starts, count))
+    disconnected = np.isnan(values)
+    connected_counts = sizes - np.add.reduceat(disconnected, starts, axis=-1, dtype=np.int64)
+    connected_values = values.copy()
+    np.copyto(connected_values, 0.0, where=disconnected)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.add.reduceat(connected_values, starts, axis=-1) / connected_counts
+    return np.add.reduceat(times, starts) / sizes, means
+
+
+def bucket_statistics(times, values, buckets):
+    """
+    Split samples into equal buckets and find the mean time and the mean, minimum and maximum value of each. Several
+    blocks can be aggregated at once by passing their values as a 2D array, a block per row.
+    Args:
+        times: times of the samples
+        values: values of the samples along the last axis; NaN where disconnected
+        buckets: number of buckets; fewer if there are fewer samples
+
+    Returns: dictionary of "times", "mean", "min" and "max" arrays with a bucket along the last axis; values are NaN
+        for buckets without a connected sample
+
+    """
+    bucket_times, means = bucket_means(times, values, buckets)
+    if len(bucket_times) == 0:
+        return {"times": bucket_times, "mean": means, "min": means, "max": means}
+    starts = bucket_starts(values.shape[-1], len(bucket_times))
+    # fmin and fmax ignore NaN unless the whole bucket is NaN
+    return {"times": bucket_times, "mean": means,
+            "min": np.fmin.reduceat(values, starts, axis=-1), "max": np.fmax.reduceat(values, starts, axis=-1)}
+
+
+def min_max_decimate(times, values, buckets):
+    """
+    Split the connected samples into equal buckets and keep the smallest and largest sample of each.
+    Args:
+        times: times of the samples
+        values: values of the samples; NaN where disconnected
+        buckets: number of buckets
+
+    Returns: tuple of arrays of the times and values of the samples kept, in time order
+
+    """
+    connected = ~np.isnan(values)
+    times = times[connected]
+    values = values[connected]
+    count = len(values)
+    if count <= 2 * buckets:
+        return times, values
+
+    starts = bucket_starts(count, buckets)
+    sizes = np.diff(np.append(starts, count))
+    positions = np.arange(count)
+    # first position in each bucket holding its minimum or maximum, positions elsewhere are past the end
+    minimum = np.repeat(np.minimum.reduceat(values, starts), sizes)
+    maximum = np.repeat(np.maximum.reduceat(values, starts), sizes)
+    minimum_positions = np.minimum.reduceat(np.where(values == minimum, positions, count), starts)
+    maximum_positions = np.minimum.reduceat(np.where(values == maximum, positions, count), starts)
+    kept = np.unique(np.concatenate((minimum_positions, maximum_positions)))
+    return times[kept], values[kept]
+
+
+def lttb(times, values, points):
+    """
+    Reduce the connected samples to a number of points with the largest triangle three buckets algorithm. Each point
+    depends on the one chosen before it so the buckets are visited in turn, but the samples within each bucket are
+    compared as arrays.
+    Args:
+        times: times of the samples
+        values: values of the samples; NaN where disconnected
+        points: number of points, at least 3
+
+    Returns: tuple of arrays of the times and values of the samples kept, in time order
+
+    """
+    if points < 3:
+        raise ValueError("At least 3 points are needed to keep the shape of a line, not {}".format(points))
+    connected = ~np.isnan(values)
+    times = times[connected]
+    values = values[connected]
+    count = len(values)
+    if count <= points:
+        return times, values
+
+    # the first and last samples are always kept, the rest are split into points - 2 buckets
+    edges = 1 + np.arange(points - 1) * (count - 2) // (points - 2)
+    sizes = np.diff(edges)
+    mean_times = np.add.reduceat(times[1:-1], edges[:-1] - 1) / sizes
+    mean_values = np.add.reduceat(values[1:-1], edges[:-1] - 1) / sizes
+    # each bucket is compared with the mean of the next bucket, or the last sample for the last bucket
+    next_times = np.append(mean_times[1:], times[-1])
+    next_values = np.append(mean_values[1:], values[-1])
+
+    kept = np.empty(points, dtype=np.intp)
+    kept[0] = 0
+    kept[-1] = count - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        areas = np.abs((times[previous] - next_times[bucket]) * (values[start:end] - values[previous]) -
+                       (times[previous] - times[start:end]) * (next_values[bucket] - values[previous]))
+        previous = start + np.argmax(areas)
+        kept[bucket + 1] = previous
+    return times[kept], values[kept]
+
+
+def aggregate_history(times, values, points, aggregate=AGGREGATE_MEAN):
+    """
+    Reduce a block's history to at most a number of points.
+    Args:
+        times: times of the samples
+        values: values of the samples; NaN where disconnected
+        points: most points returned
+        aggregate: how the samples are aggregated, one of AGGREGATES
+
+    Returns: tuple of arrays of the times and values of the points
+
+    """
+    if aggregate == AGGREGATE_MIN_MAX:
+        if points < 2:
+            raise ValueError("At least 2 points are needed for the smallest and largest samples, not {}".format(points))
+        return min_max_decimate(times, values, points // 2)
+    if aggregate == AGGREGATE_LTTB:
+        return lttb(times, values, points)
+    if len(values) <= points:
+        return times, values
+    return bucket_means(times, values, points)
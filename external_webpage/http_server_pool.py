@@ -0,0 +1,104 @@
+"""
+Mix-in for a socket server which handles connections with a fixed size pool of worker threads.
+"""
+import logging
+from threading import Thread
+
+from six.moves import queue
+
+from external_webpage.metrics import CONNECTIONS_REJECTED
+
+logger = logging.getLogger('JSON_bourne')
+
+# Response written to connections which are rejected because the queue is full
+SERVICE_UNAVAILABLE_RESPONSE = \
+    "HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nRetry-After: 5\r\nConnection: close\r\n\r\n"
+
+
+class PoolingMixIn:
+    """
+    Handle each connection on one of a fixed number of worker threads. Connections wait in a bounded queue for a free
+    worker; once the queue is full further connections are rejected at once with a 503 rather than starting more
+    threads. Configure by setting pool_size and queue_size before serving.
+    """
+
+    # number of worker threads
+    pool_size = 20
+
+    # number of connections which can wait for a worker
+    queue_size = 100
+
+    # whether connections are kept open between requests, off by default as an idle connection holds its worker
+    keep_alive = False
+
+    # seconds an idle persistent connection holds a worker
+    keep_alive_timeout = 2
+
+    _requests = None
+    _workers = None
+
+    def should_close_connections(self):
+        """
+        Returns: True if connections should be closed after the current response, because they are not kept open or
+            others are waiting for a worker; False otherwise
+        """
+        return not self.keep_alive or (self._requests is not None and not self._requests.empty())
+
+    def process_request(self, request, client_address):
+        """
+        Queue a connection for a worker, or reject it if the queue is full.
+        Args:
+            request: the connection's socket
+            client_address: address of the client
+        """
+        if self._workers is None:
+            self._start_workers()
+        try:
+            self._requests.put_nowait((request, client_address))
+        except queue.Full:
+            CONNECTIONS_REJECTED.inc(reason="queue_full")
+            try:
+                request.sendall(SERVICE_UNAVAILABLE_RESPONSE)
+            except Exception as e:
+                logger.debug("Failed to reject connection from {}: {}".format(client_address, e))
+            self.shutdown_request(request)
+
+    def _start_workers(self):
+        """
+        Start the worker threads.
+        """
+        self._requests = queue.Queue(self.queue_size)
+        self._workers = []
+        for index in range(self.pool_size):
+            worker = Thread(target=self._work, name="HandlerPoolWorker-{}".format(index))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        """
+        Handle connections until the server is closed.
+        """
+        while True:
+            request_and_address = self._requests.get()
+            if request_and_address is None:
+                return
+            request, client_address = request_and_address
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def stop_workers(self):
+        """
+        Stop the workers once they have handled the connections already queued.
+        """
+        if self._workers is None:
+            return
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = None
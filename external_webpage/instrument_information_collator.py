@@ -21,6 +21,7 @@ import logging
 
 from block_utils import (format_blocks, set_rc_values_for_blocks)
 from external_webpage.data_source_reader import DataSourceReader
+from external_webpage.metrics import StageTimer
 from external_webpage.web_page_parser import WebPageParser
 
 logger = logging.getLogger('JSON_bourne')
@@ -80,6 +81,16 @@ class InstrumentInformationCollator:
     RUN_DURATION_CHANNEL_NAME = "RUNDURATION"
     # name of the channel fo the run duration for the current period
     RUN_DURATION_PD_CHANNEL_NAME = "RUNDURATION_PD"
+    # instrument PVs which are shown on the info page
+    REQUIRED_PVS = ["RUNSTATE", "RUNNUMBER", "_RBNUMBER", TITLE_CHANNEL_NAME, USERNAME_CHANNEL_NAME, "STARTTIME",
+                    RUN_DURATION_CHANNEL_NAME, RUN_DURATION_PD_CHANNEL_NAME, "GOODFRAMES", "GOODFRAMES_PD",
+                    "RAWFRAMES", "RAWFRAMES_PD", "PERIOD", "NUMPERIODS", "PERIODSEQ", "BEAMCURRENT", "TOTALUAMPS",
+                    "COUNTRATE", "DAEMEMORYUSED", "TOTALCOUNTS", "DAETIMINGSOURCE", "MONITORCOUNTS",
+                    "MONITORSPECTRUM", "MONITORFROM", "MONITORTO", "NUMTIMECHANNELS", "NUMSPECTRA", "SHUTTER",
+                    "SIM_MODE"]
+    # names of the channels in the instrument archive which are needed, i.e. required pvs and the display title
+    REQUIRED_INST_CHANNEL_NAMES = frozenset(
+        [pv + ".VAL" for pv in REQUIRED_PVS] + [DISPLAY_TITLE_CHANNEL_NAME + ".VAL"])
 
     def __init__(self, host="localhost", reader=None):
         """
@@ -94,14 +105,14 @@ class InstrumentInformationCollator:
             self.reader = reader
 
         self.web_page_parser = WebPageParser()
+        self.last_stage_timings = None
 
-    def _get_inst_pvs(self, ans, blocks_all):
+    def _get_inst_pvs(self, ans):
         """
         Extracts and formats a list of relevant instrument PVs from all instrument PVs.
 
         Args:
             ans: List of blocks from the instrument archive.
-            blocks_all: List of blocks from the block and dataweb archives.
 
         Returns: A trimmed list of instrument PVs.
 
@@ -112,20 +123,8 @@ class InstrumentInformationCollator:
         username_channel_name = InstrumentInformationCollator.USERNAME_CHANNEL_NAME
         run_duration_channel_name = InstrumentInformationCollator.RUN_DURATION_CHANNEL_NAME
         run_duration_pd_channel_name = InstrumentInformationCollator.RUN_DURATION_PD_CHANNEL_NAME
-        required_pvs = ["RUNSTATE", "RUNNUMBER", "_RBNUMBER", title_channel_name,
-                        username_channel_name, "STARTTIME",
-                        run_duration_channel_name, run_duration_pd_channel_name, "GOODFRAMES", "GOODFRAMES_PD",
-                        "RAWFRAMES", "RAWFRAMES_PD", "PERIOD", "NUMPERIODS", "PERIODSEQ", "BEAMCURRENT", "TOTALUAMPS",
-                        "COUNTRATE", "DAEMEMORYUSED", "TOTALCOUNTS", "DAETIMINGSOURCE", "MONITORCOUNTS",
-                        "MONITORSPECTRUM", "MONITORFROM", "MONITORTO", "NUMTIMECHANNELS", "NUMSPECTRA", "SHUTTER",
-                        "SIM_MODE"]
-
-        try:
-            set_rc_values_for_blocks(blocks_all.values(), ans)
-        except Exception as e:
-            logging.error("Error in setting rc values for blocks: " + str(e))
 
-        for pv in required_pvs:
+        for pv in InstrumentInformationCollator.REQUIRED_PVS:
             if pv + ".VAL" in ans:
                 wanted[pv] = ans[pv + ".VAL"]
 
@@ -148,6 +147,22 @@ class InstrumentInformationCollator:
 
         return wanted
 
+    def _is_wanted_inst_channel(self, name):
+        """
+        Is the channel from the instrument archive needed for the info page.
+
+        Args:
+            name: the block name of the channel
+
+        Returns: True if it is one of the required pvs, the display title or a run control value; False otherwise
+
+        """
+        if name in InstrumentInformationCollator.REQUIRED_INST_CHANNEL_NAMES:
+            return True
+        # run control values are the only names which keep their block name, e.g. BLOCK:RC:LOW.VAL
+        name_parts = name.split(":")
+        return len(name_parts) == 3 and name_parts[1] == "RC"
+
     def _convert_seconds(self, block):
         """
         Receives the value from the block and converts to hours, minutes and seconds.
@@ -170,24 +185,59 @@ class InstrumentInformationCollator:
             block.set_value("{} hr {} min {} s".format(str(hours), str(minutes), str(seconds)))
         block.set_units("")
 
+    def _set_rc_values(self, blocks_all, instrument_blocks):
+        """
+        Set the run control values of the blocks from the instrument PVs.
+
+        Args:
+            blocks_all: List of blocks from the block and dataweb archives.
+            instrument_blocks: List of blocks from the instrument archive.
+
+        """
+        try:
+            set_rc_values_for_blocks(blocks_all.values(), instrument_blocks)
+        except Exception as e:
+            logging.error("Error in setting rc values for blocks: " + str(e))
+
     def collate(self):
         """
         Returns the collated information on instrument configuration, blocks and run status PVs as JSON.
+        How long each stage took is kept in last_stage_timings.
 
         Returns: JSON of the instrument's configuration and status.
 
         """
+        timer = StageTimer()
+        try:
+            return self._collate(timer)
+        finally:
+            self.last_stage_timings = timer.as_dict()
+
+    def _collate(self, timer):
+        """
+        Returns the collated information on instrument configuration, blocks and run status PVs as JSON.
+
+        Args:
+            timer: the timer recording how long each stage takes
+
+        Returns: JSON of the instrument's configuration and status.
 
-        instrument_config = InstrumentConfig(self.reader.read_config())
+        """
+        with timer.stage("read_config"):
+            instrument_config = InstrumentConfig(self.reader.read_config())
 
         try:
 
             # read blocks
-            json_from_blocks_archive = self.reader.get_json_from_blocks_archive()
-            blocks_log = self.web_page_parser.extract_blocks(json_from_blocks_archive)
+            with timer.stage("fetch_blocks_archive"):
+                json_from_blocks_archive = self.reader.get_json_from_blocks_archive()
+            with timer.stage("extract_blocks_archive"):
+                blocks_log = self.web_page_parser.extract_blocks(json_from_blocks_archive)
 
-            json_from_dataweb_archive = self.reader.get_json_from_dataweb_archive()
-            blocks_nolog = self.web_page_parser.extract_blocks(json_from_dataweb_archive)
+            with timer.stage("fetch_dataweb_archive"):
+                json_from_dataweb_archive = self.reader.get_json_from_dataweb_archive()
+            with timer.stage("extract_dataweb_archive"):
+                blocks_nolog = self.web_page_parser.extract_blocks(json_from_dataweb_archive)
 
             blocks_all = dict(blocks_log.items() + blocks_nolog.items())
 
@@ -195,23 +245,33 @@ class InstrumentInformationCollator:
             for block_name, block in blocks_all.items():
                 block.set_visibility(instrument_config.block_is_visible(block_name))
 
-            json_from_instrument_archive = self.reader.get_json_from_instrument_archive()
-            instrument_blocks = self.web_page_parser.extract_blocks(json_from_instrument_archive)
+            with timer.stage("fetch_instrument_archive"):
+                json_from_instrument_archive = self.reader.get_json_from_instrument_archive()
+            with timer.stage("extract_instrument_archive"):
+                instrument_blocks = self.web_page_parser.extract_blocks(json_from_instrument_archive,
+                                                                        self._is_wanted_inst_channel)
 
-            inst_pvs = format_blocks(self._get_inst_pvs(instrument_blocks, blocks_all))
+            with timer.stage("set_rc_values"):
+                self._set_rc_values(blocks_all, instrument_blocks)
+            with timer.stage("get_inst_pvs"):
+                wanted_inst_pvs = self._get_inst_pvs(instrument_blocks)
+            with timer.stage("format_inst_pvs"):
+                inst_pvs = format_blocks(wanted_inst_pvs)
 
         except Exception as e:
             logger.error("Failed to read blocks: " + str(e))
             raise e
 
-        blocks_all_formatted = format_blocks(blocks_all)
-        groups = {}
-        for group in instrument_config.groups:
-            blocks = {}
-            for block in group["blocks"]:
-                if block in blocks_all_formatted.keys():
-                    blocks[block] = blocks_all_formatted[block]
-            groups[group["name"]] = blocks
+        with timer.stage("format_blocks"):
+            blocks_all_formatted = format_blocks(blocks_all)
+        with timer.stage("group_blocks"):
+            groups = {}
+            for group in instrument_config.groups:
+                blocks = {}
+                for block in group["blocks"]:
+                    if block in blocks_all_formatted.keys():
+                        blocks[block] = blocks_all_formatted[block]
+                groups[group["name"]] = blocks
 
         return {
             "config_name": instrument_config.name,
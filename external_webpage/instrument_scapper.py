@@ -1,63 +1,163 @@
 import logging
 import traceback
 from threading import Thread, Event, RLock
-from time import sleep
+from time import time
 
+from external_webpage.block_history import BlockHistories
+from external_webpage.data_source_reader import DataSourceReader
 from external_webpage.instrument_information_collator import InstrumentInformationCollator
+from external_webpage.metrics import COLLATE_SECONDS, SCRAPE_FAILURES, SCRAPED_DATA_LOCK_WAIT_SECONDS, acquire_timed
+from external_webpage.payload_formats import encode_instrument_data
+from external_webpage.profiling import profiler
+from external_webpage.request_handler_utils import InstrumentSummaries
 
 scraped_data = {}
+# diagnostics of the last scrape of each instrument, also guarded by the scraped data lock
+scrape_diagnostics = {}
+# version of each instrument's scraped data, incremented on each publish, also guarded by the scraped data lock
+scraped_data_versions = {}
+# scraped data of each instrument encoded in each format, also guarded by the scraped data lock
+encoded_data = {}
+# summary of all the instruments' scraped data, also guarded by the scraped data lock
+instrument_summaries = InstrumentSummaries()
 scraped_data_lock = RLock()
+# recent history of the values of each instrument's blocks, guarded by its own lock
+block_histories = BlockHistories()
 logger = logging.getLogger('JSON_bourne')
 
 WAIT_BETWEEN_UPDATES = 3
 WAIT_BETWEEN_FAILED_UPDATES = 60
+
+# Seconds waited after a reader reports that an instrument's information has changed before scraping it, so that a
+# burst of changes, e.g. the PVs updated when a run starts, is published in one scrape
+WAIT_AFTER_CHANGE = 0.5
 RETRIES_BETWEEN_LOGS = 60
 
 
+class InstrumentScrape(object):
+    """
+    A scrape of an instrument's ArchiveEngine; each scrape collates the instrument's information and publishes it.
+    """
+
+    def __init__(self, name, host, reader_class=DataSourceReader, on_change=None):
+        """
+        Initialize.
+        Args:
+            name: Name of instrument.
+            host: Host for the instrument.
+            reader_class: Class of the reader used to get the instrument's external information.
+            on_change: Function called when the reader reports that the instrument's information has changed so it
+                should be scraped again; None if changes are only picked up by the next scheduled scrape
+        """
+        self._name = name
+        self._host = host
+        self._previously_failed = False
+        self._tries_since_logged = 0
+        self._reader = reader_class(host)
+        if on_change is not None:
+            self._reader.set_change_listener(on_change)
+        self._collator = InstrumentInformationCollator(host, self._reader)
+
+    def scrape(self):
+        """
+        Scrape the instrument once and update the scraped data.
+
+        Returns: the number of seconds to wait before the next scrape
+
+        """
+        with profiler.profile():
+            return self._scrape()
+
+    def _scrape(self):
+        """
+        Scrape the instrument once and update the scraped data.
+
+        Returns: the number of seconds to wait before the next scrape
+
+        """
+        try:
+            self._tries_since_logged += 1
+            with COLLATE_SECONDS.time(instrument=self._name):
+                temp_data = self._collator.collate()
+            self._publish(temp_data)
+            if self._previously_failed:
+                logger.error("Reconnected with " + str(self._name))
+            self._previously_failed = False
+            return WAIT_BETWEEN_UPDATES
+        except Exception as e:
+            SCRAPE_FAILURES.inc(instrument=self._name)
+            if not self._previously_failed or self._tries_since_logged >= RETRIES_BETWEEN_LOGS:
+                logger.error("Failed to get data from instrument: {0} at {1} error was: {2}{3}".format(
+                    self._name, self._host, e, " - Stack (1 line) {stack}:".format(stack=traceback.format_exc())))
+                self._previously_failed = True
+                self._tries_since_logged = 0
+            self._publish("", str(e))
+            return WAIT_BETWEEN_FAILED_UPDATES
+
+    def _publish(self, data, error=None):
+        """
+        Publish the result of a scrape.
+        Args:
+            data: the instrument's collated information; empty string if the scrape failed
+            error: the reason the scrape failed; None if it succeeded
+        """
+        diagnostics = {
+            "host": self._host,
+            "time": time(),
+            "error": error,
+            "stage_timings": self._collator.last_stage_timings}
+        # encoded once here rather than on each request for the data
+        encoded = encode_instrument_data(data)
+        if data != "":
+            block_histories.record(self._name, diagnostics["time"], data)
+        with acquire_timed(scraped_data_lock, SCRAPED_DATA_LOCK_WAIT_SECONDS, user="scrapper"):
+            scraped_data[self._name] = data
+            encoded_data[self._name] = encoded
+            scraped_data_versions[self._name] = scraped_data_versions.get(self._name, 0) + 1
+            scrape_diagnostics[self._name] = diagnostics
+            instrument_summaries.update(self._name, data)
+
+    def close(self):
+        """
+        Release the resources used by the scrape.
+        """
+        self._reader.close()
+
+
 class InstrumentScrapper(Thread):
     """
     Thread that continually scrapes data from an instrument's ArchiveEngine.
     """
-    _previously_failed = False
-    _tries_since_logged = 0
 
     def wait(self, seconds):
         """
-        Wait for a number of seconds but in short waits so can stop thread more quickly
+        Wait for a number of seconds, or less if the instrument's information changes or the thread is stopped
         Args:
             seconds: number of seconds to wait
 
         Returns:
 
         """
-        for i in range(seconds):
-            if self._stop_event.is_set():
-                return
-            sleep(1)
+        if self._wake_event.wait(seconds) and not self._stop_event.is_set():
+            self._stop_event.wait(WAIT_AFTER_CHANGE)
+        # changes from now on are not in the scrape about to start so wake for them
+        self._wake_event.clear()
 
-    def __init__(self, name, host):
+    def __init__(self, name, host, reader_class=DataSourceReader):
         """
         Initialize.
         Args:
             name: Name of instrument.
             host: Host for the instrument.
+            reader_class: Class of the reader used to get the instrument's external information.
         """
         super(InstrumentScrapper, self).__init__()
         self._host = host
         self._name = name
+        self._reader_class = reader_class
         self._stop_event = Event()
-
-    def is_instrument(self, name, host):
-        """
-        Is this scrapper for this name and _host
-        Args:
-            name: name of the instrument
-            host: _host of the instrument
-
-        Returns: True is _host and name match; False otherwise
-
-        """
-        return self._name == name and self._host == host
+        # set when the instrument's information changes or the thread is stopped
+        self._wake_event = Event()
 
     def run(self):
         """
@@ -65,31 +165,68 @@ class InstrumentScrapper(Thread):
         Returns:
 
         """
-        global scraped_data
-        web_page_scraper = InstrumentInformationCollator(self._host)
+        instrument_scrape = InstrumentScrape(self._name, self._host, self._reader_class,
+                                             on_change=self._wake_event.set)
         logger.info("Scrapper started for {}".format(self._name))
         while not self._stop_event.is_set():
-            try:
-                self._tries_since_logged += 1
-                temp_data = web_page_scraper.collate()
-                with scraped_data_lock:
-                    scraped_data[self._name] = temp_data
-                if self._previously_failed:
-                    logger.error("Reconnected with " + str(self._name))
-                self._previously_failed = False
-                self.wait(WAIT_BETWEEN_UPDATES)
-            except Exception as e:
-                if not self._previously_failed or self._tries_since_logged >= RETRIES_BETWEEN_LOGS:
-                    logger.error("Failed to get data from instrument: {0} at {1} error was: {2}{3}".format(
-                        self._name, self._host, e, " - Stack (1 line) {stack}:".format(stack=traceback.format_exc())))
-                    self._previously_failed = True
-                    self._tries_since_logged = 0
-                with scraped_data_lock:
-                    scraped_data[self._name] = ""
-                self.wait(WAIT_BETWEEN_FAILED_UPDATES)
+            self.wait(instrument_scrape.scrape())
+        instrument_scrape.close()
 
     def stop(self):
         """
         Stop the thread at the next available point
         """
         self._stop_event.set()
+        self._wake_event.set()
+
+
+def get_scraped_data_snapshot():
+    """
+    Get the data of the instruments which are available, to save as a snapshot.
+
+    Returns: tuple of the dictionary of instrument name to its data and the total number of times data has been
+        published, which changes whenever the data changes
+
+    """
+    with acquire_timed(scraped_data_lock, SCRAPED_DATA_LOCK_WAIT_SECONDS, user="snapshot"):
+        instruments = {name: data for name, data in scraped_data.items() if data != ""}
+        return instruments, sum(scraped_data_versions.values())
+
+
+def publish_snapshot(instruments):
+    """
+    Publish the data of instruments loaded from a snapshot, flagged as stale, for those which have not been scraped
+    yet. The flag is cleared when an instrument is next scraped as its data is replaced.
+    Args:
+        instruments: dictionary of instrument name to its data
+    """
+    for name, data in instruments.items():
+        data = dict(data, stale=True)
+        encoded = encode_instrument_data(data)
+        with acquire_timed(scraped_data_lock, SCRAPED_DATA_LOCK_WAIT_SECONDS, user="snapshot"):
+            if name in scraped_data:
+                continue
+            scraped_data[name] = data
+            encoded_data[name] = encoded
+            scraped_data_versions[name] = scraped_data_versions.get(name, 0) + 1
+            instrument_summaries.update(name, data)
+
+
+def discard_stale_instruments(instruments):
+    """
+    Discard the data loaded from a snapshot for instruments which are not on the instrument list, so that an
+    instrument removed from the list is not served as stale data forever.
+    Args:
+        instruments: names of the instruments on the instrument list
+    """
+    with acquire_timed(scraped_data_lock, SCRAPED_DATA_LOCK_WAIT_SECONDS, user="snapshot"):
+        for name, data in list(scraped_data.items()):
+            if name in instruments or data == "" or not data.get("stale"):
+                continue
+            logger.info("Discarding snapshot of {} as it is no longer on the instrument list".format(name))
+            del scraped_data[name]
+            encoded_data.pop(name, None)
+            # the version still changes so that data cached for the previous version is not reused
+            scraped_data_versions[name] = scraped_data_versions.get(name, 0) + 1
+            instrument_summaries.remove(name)
+            block_histories.remove(name)
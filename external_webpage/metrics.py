@@ -0,0 +1,384 @@
+"""
+Counters and histograms of how JSON bourne is performing, exported in the Prometheus text format.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from timeit import default_timer
+
+# Default histogram buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label_value(value):
+    """
+    Args:
+        value: label value
+
+    Returns: the value escaped for the text format
+
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_names, label_values, extra_labels=()):
+    """
+    Args:
+        label_names: names of the labels
+        label_values: values of the labels, in the same order as the names
+        extra_labels: further pairs of label name and value
+
+    Returns: the labels in the text format; empty if there are none
+
+    """
+    pairs = list(zip(label_names, label_values)) + list(extra_labels)
+    if len(pairs) == 0:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, _escape_label_value(value)) for name, value in pairs) + "}"
+
+
+def _format_number(value):
+    """
+    Args:
+        value: number
+
+    Returns: the number in the text format
+
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(object):
+    """
+    Base of the metrics, holds the values of the metric for each set of label values.
+    """
+
+    type_name = None
+
+    def __init__(self, name, documentation, label_names=()):
+        """
+        Initialise.
+        Args:
+            name: name of the metric
+            documentation: help text for the metric
+            label_names: names of the labels the metric's values are split by
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = Lock()
+
+    def _label_values(self, labels):
+        """
+        Args:
+            labels: dictionary of label name to value
+
+        Returns: tuple of the label values in label name order
+
+        """
+        if set(labels.keys()) != set(self.label_names):
+            raise ValueError("Metric {} has labels {} not {}".format(self.name, self.label_names, labels.keys()))
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        """
+        Returns: lines of the metric in the text format
+
+        """
+        lines = ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} {}".format(self.name, self.type_name)]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.extend(self._render_value(label_values, value))
+        return lines
+
+    def _render_value(self, label_values, value):
+        """
+        Args:
+            label_values: the label values
+            value: the value for those labels, a number unless the metric renders its values itself
+
+        Returns: lines of the value in the text format
+
+        """
+        return ["{}{} {}".format(self.name, _format_labels(self.label_names, label_values), _format_number(value))]
+
+
+class Counter(_Metric):
+    """
+    A count which only goes up.
+    """
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        """
+        Increase the count.
+        Args:
+            amount: amount to increase it by
+            labels: the label values
+        """
+        label_values = self._label_values(labels)
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, **labels):
+        """
+        Args:
+            labels: the label values
+
+        Returns: the current count
+
+        """
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+
+class Gauge(_Metric):
+    """
+    A value which can go up and down, e.g. the current state of something.
+    """
+
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        """
+        Set the value.
+        Args:
+            value: the new value
+            labels: the label values
+        """
+        label_values = self._label_values(labels)
+        with self._lock:
+            self._values[label_values] = value
+
+    def replace(self, values):
+        """
+        Replace all the values, those for label values not given are removed.
+        Args:
+            values: list of tuples of a dictionary of label name to value and the value for those labels
+        """
+        values = dict((self._label_values(labels), value) for labels, value in values)
+        with self._lock:
+            self._values = values
+
+    def get(self, **labels):
+        """
+        Args:
+            labels: the label values
+
+        Returns: the current value; None if it has not been set
+
+        """
+        with self._lock:
+            return self._values.get(self._label_values(labels))
+
+
+class _HistogramValue(object):
+    """
+    Observations of a histogram for one set of label values.
+    """
+
+    def __init__(self, bucket_count):
+        self.bucket_counts = [0] * bucket_count
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """
+    Observations counted in buckets, e.g. of how long something took.
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        """
+        Initialise.
+        Args:
+            name: name of the metric
+            documentation: help text for the metric
+            label_names: names of the labels the metric's values are split by
+            buckets: upper bounds of the buckets in ascending order
+        """
+        super(Histogram, self).__init__(name, documentation, label_names)
+        self.buckets = tuple(float(bucket) for bucket in buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        """
+        Add an observation.
+        Args:
+            value: value observed
+            labels: the label values
+        """
+        label_values = self._label_values(labels)
+        with self._lock:
+            try:
+                histogram_value = self._values[label_values]
+            except KeyError:
+                histogram_value = _HistogramValue(len(self.buckets))
+                self._values[label_values] = histogram_value
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    histogram_value.bucket_counts[index] += 1
+                    break
+            histogram_value.sum += value
+            histogram_value.count += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe how long the body of the with statement takes in seconds.
+        Args:
+            labels: the label values
+        """
+        start_time = default_timer()
+        try:
+            yield
+        finally:
+            self.observe(default_timer() - start_time, **labels)
+
+    def get_count(self, **labels):
+        """
+        Args:
+            labels: the label values
+
+        Returns: the number of observations
+
+        """
+        with self._lock:
+            try:
+                return self._values[self._label_values(labels)].count
+            except KeyError:
+                return 0
+
+    def _render_value(self, label_values, value):
+        lines = []
+        cumulative_count = 0
+        for upper_bound, bucket_count in zip(self.buckets, value.bucket_counts):
+            cumulative_count += bucket_count
+            labels = _format_labels(self.label_names, label_values, [("le", _format_number(upper_bound))])
+            lines.append("{}_bucket{} {}".format(self.name, labels, cumulative_count))
+        labels = _format_labels(self.label_names, label_values)
+        lines.append("{}_sum{} {}".format(self.name, labels, _format_number(value.sum)))
+        lines.append("{}_count{} {}".format(self.name, labels, value.count))
+        return lines
+
+
+class MetricsRegistry(object):
+    """
+    The metrics which are exported.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """
+        Add a metric to those exported.
+        Args:
+            metric: the metric
+
+        Returns: the metric
+
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Returns: all the metrics in the Prometheus text format
+
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def acquire_timed(lock, histogram, **labels):
+    """
+    Acquire a lock for the body of a with statement observing how long it took to acquire.
+    Args:
+        lock: the lock
+        histogram: histogram of lock wait times
+        labels: the label values
+    """
+    start_time = default_timer()
+    lock.acquire()
+    try:
+        histogram.observe(default_timer() - start_time, **labels)
+        yield
+    finally:
+        lock.release()
+
+
+class StageTimer(object):
+    """
+    Records how long each stage of a task takes; time spent in a stage more than once is added together.
+    """
+
+    def __init__(self):
+        self._start_time = default_timer()
+        self._stages = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the body of a with statement as a stage.
+        Args:
+            name: name of the stage
+        """
+        start_time = default_timer()
+        try:
+            yield
+        finally:
+            self._stages[name] = self._stages.get(name, 0.0) + default_timer() - start_time
+
+    def as_dict(self):
+        """
+        Returns: dictionary of the seconds taken by each stage, in the order they started, and in total
+
+        """
+        return {"stages": OrderedDict(self._stages), "total": default_timer() - self._start_time}
+
+
+registry = MetricsRegistry()
+
+COLLATE_SECONDS = registry.register(Histogram(
+    "json_bourne_collate_seconds", "Time taken to collate an instrument's information.", ["instrument"]))
+
+SCRAPE_FAILURES = registry.register(Counter(
+    "json_bourne_scrape_failures_total", "Number of failed instrument scrapes.", ["instrument"]))
+
+SOURCE_FETCH_SECONDS = registry.register(Histogram(
+    "json_bourne_source_fetch_seconds", "Time taken to fetch a page from a data source.", ["host", "source"]))
+
+SCRAPED_DATA_LOCK_WAIT_SECONDS = registry.register(Histogram(
+    "json_bourne_scraped_data_lock_wait_seconds", "Time waited to acquire the scraped data lock.", ["user"]))
+
+JSON_ENCODE_SECONDS = registry.register(Histogram(
+    "json_bourne_json_encode_seconds", "Time taken to encode a response as JSON.", ["instrument"]))
+
+REQUESTS = registry.register(Counter(
+    "json_bourne_requests_total", "Number of requests served.", ["instrument", "code"]))
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "json_bourne_request_seconds", "Time taken to serve a request.", ["instrument"]))
+
+CONNECTIONS_REJECTED = registry.register(Counter(
+    "json_bourne_connections_rejected_total", "Number of connections rejected without being handled.", ["reason"]))
+
+REQUESTS_SHED = registry.register(Counter(
+    "json_bourne_requests_shed_total", "Number of requests refused by admission control.", ["reason"]))
+
+THROTTLED_CLIENTS = registry.register(Gauge(
+    "json_bourne_client_requests_throttled", "Number of requests throttled from each of the most throttled clients.",
+    ["client"]))
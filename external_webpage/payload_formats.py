@@ -0,0 +1,109 @@
+"""
+Formats an instrument's data is served in. Each format is encoded once each time the data is published so requests
+only have to look up the encoded data. The MessagePack format is only available if msgpack is installed.
+
+The compact format (version 1) is:
+    {"schema": 1,
+     "fields": names of the block fields in the order they appear in each block's row,
+     "defaults": default value of each field, fields with a default value are null in a row,
+     "config_name": name of the configuration,
+     "groups": list of [group name, list of block rows],
+     "inst_pvs": list of block rows,
+     "stale": true, only present if the data is the last known data from before a restart}
+where a block row is [block name, value of each field...] with trailing null fields omitted.
+"""
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Standard json format, a dictionary per block
+FORMAT_JSON = "json"
+
+# Compact json format, a positional array per block with default values omitted
+FORMAT_COMPACT = "compact"
+
+# Binary MessagePack format of the standard data, for scripts and services rather than the web page
+FORMAT_MSGPACK = "msgpack"
+
+# Formats which are encoded
+FORMATS = (FORMAT_JSON, FORMAT_COMPACT) + ((FORMAT_MSGPACK,) if msgpack is not None else ())
+
+# Content type of each binary format, these are served as they are rather than wrapped in a JSONP callback
+BINARY_FORMAT_CONTENT_TYPES = {FORMAT_MSGPACK: "application/msgpack"}
+
+# Format of each media type which can be requested in an Accept header
+ACCEPTED_MEDIA_TYPES = {"application/msgpack": FORMAT_MSGPACK, "application/x-msgpack": FORMAT_MSGPACK}
+
+# Version of the compact format
+COMPACT_SCHEMA_VERSION = 1
+
+# Fields of a block in the order they are in a compact block row
+COMPACT_BLOCK_FIELDS = ("value", "status", "alarm", "visibility", "rc_low", "rc_high", "rc_inrange", "rc_enabled")
+
+# Default values of the fields of a block, those with a default value are omitted from a compact block row; fields
+# without a default are omitted when they are not present
+COMPACT_BLOCK_DEFAULTS = {"status": "Connected", "alarm": "", "visibility": True}
+
+
+def to_compact_block_row(name, block):
+    """
+    Args:
+        name: name of the block
+        block: description of the block
+
+    Returns: the block as a compact block row
+
+    """
+    row = [name]
+    for field in COMPACT_BLOCK_FIELDS:
+        value = block.get(field)
+        if field in COMPACT_BLOCK_DEFAULTS and value == COMPACT_BLOCK_DEFAULTS[field]:
+            value = None
+        row.append(value)
+    while row[-1] is None:
+        row.pop()
+    return row
+
+
+def to_compact(instrument_data):
+    """
+    Args:
+        instrument_data: the data of an instrument in the standard format
+
+    Returns: the data in the compact format
+
+    """
+    compact = {
+        "schema": COMPACT_SCHEMA_VERSION,
+        "fields": COMPACT_BLOCK_FIELDS,
+        "defaults": COMPACT_BLOCK_DEFAULTS,
+        "config_name": instrument_data["config_name"],
+        "groups": [[group_name, [to_compact_block_row(name, block) for name, block in blocks.items()]]
+                   for group_name, blocks in instrument_data["groups"].items()],
+        "inst_pvs": [to_compact_block_row(name, block) for name, block in instrument_data["inst_pvs"].items()]}
+    if instrument_data.get("stale"):
+        compact["stale"] = True
+    return compact
+
+
+def encode_instrument_data(instrument_data):
+    """
+    Encode the data of an instrument in each format.
+    Args:
+        instrument_data: the data of the instrument; empty string if it is unavailable
+
+    Returns: dictionary of format to the encoded data; empty if the instrument is unavailable
+
+    """
+    if instrument_data == "":
+        return {}
+    encoded = {
+        FORMAT_JSON: json.dumps(instrument_data),
+        FORMAT_COMPACT: json.dumps(to_compact(instrument_data), separators=(",", ":"))}
+    if msgpack is not None:
+        # strings as the str type rather than binary so that they are decoded as strings
+        encoded[FORMAT_MSGPACK] = msgpack.packb(instrument_data, use_bin_type=False)
+    return encoded
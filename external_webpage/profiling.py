@@ -0,0 +1,124 @@
+"""
+Profiling of the work done on the scrapper and request handler threads while the server is running.
+"""
+import cProfile
+import logging
+import os
+import pstats
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock, Timer
+
+logger = logging.getLogger('JSON_bourne')
+
+# Directory the profile statistics are written to
+DEFAULT_OUTPUT_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'log')
+
+# Longest time a profile can be run for in seconds
+MAX_PROFILE_SECONDS = 600
+
+# Number of functions listed in the profile summary
+SUMMARY_FUNCTION_COUNT = 50
+
+
+class ThreadProfiler(object):
+    """
+    Profiles each unit of work, i.e. scrape or request, done while it is active and writes the aggregate statistics
+    to a file when it finishes.
+    """
+
+    def __init__(self, output_directory=DEFAULT_OUTPUT_DIRECTORY):
+        """
+        Initialise.
+        Args:
+            output_directory: directory to write the statistics to
+        """
+        self.output_directory = output_directory
+        self._lock = Lock()
+        self._active = False
+        self._profiles = []
+        self._output_path = None
+
+    def is_active(self):
+        """
+        Returns: True if profiling is in progress; False otherwise
+        """
+        return self._active
+
+    def start(self, seconds):
+        """
+        Start profiling.
+        Args:
+            seconds: how long to profile for
+
+        Returns: path the statistics will be written to, with .pstats and .txt extensions; None if already profiling
+
+        """
+        if seconds <= 0 or seconds > MAX_PROFILE_SECONDS:
+            raise ValueError("Profile time must be between 0 and {} seconds".format(MAX_PROFILE_SECONDS))
+        with self._lock:
+            if self._active:
+                return None
+            self._profiles = []
+            self._output_path = os.path.join(
+                self.output_directory, "profile_{}".format(datetime.now().strftime("%Y%m%d_%H%M%S")))
+            self._active = True
+
+        timer = Timer(seconds, self.finish)
+        timer.daemon = True
+        timer.start()
+        logger.warn("Profiling for {} seconds, output to {}".format(seconds, self._output_path))
+        return self._output_path
+
+    @contextmanager
+    def profile(self):
+        """
+        Profile the body of the with statement if profiling is active.
+        """
+        if not self._active:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                if self._active:
+                    self._profiles.append(profile)
+
+    def finish(self):
+        """
+        Stop profiling and write the aggregate statistics.
+
+        Returns: path the statistics were written to without extension; None if there were none
+
+        """
+        with self._lock:
+            if not self._active:
+                return None
+            self._active = False
+            profiles = self._profiles
+            self._profiles = []
+            output_path = self._output_path
+
+        if len(profiles) == 0:
+            logger.warn("Profiling finished, nothing was profiled")
+            return None
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(output_path + ".pstats")
+        with open(output_path + ".txt", "w") as summary_file:
+            stats.stream = summary_file
+            summary_file.write("Aggregate of {} profiled scrapes and requests\n".format(len(profiles)))
+            stats.sort_stats("cumulative").print_stats(SUMMARY_FUNCTION_COUNT)
+        logger.warn("Profiling finished, {} profiled scrapes and requests written to {}".format(
+            len(profiles), output_path))
+        return output_path
+
+
+profiler = ThreadProfiler()
@@ -1,31 +1,92 @@
+import bisect
+import json
 import re
 from collections import OrderedDict
+from threading import Lock
 
+from six.moves.urllib.parse import unquote_plus
 
-def get_instrument_and_callback(path):
+from external_webpage.block_history import CHANNEL_BLOCK, CHANNEL_INST_PV
+from external_webpage.history_aggregation import AGGREGATE_MEAN, AGGREGATES
+from external_webpage.payload_formats import FORMAT_JSON, FORMATS, ACCEPTED_MEDIA_TYPES
+
+# Parameters of a request path which are used, in any order and ignoring any others
+PARAMETER_PATTERN = re.compile(r"[?&](callback|Instrument)=([^&]*)")
+
+# Parameters of a request path which select parts of an instrument's data
+PROJECTION_PATTERN = re.compile(r"[?&](fields|group)=([^&]*)")
+
+# Parts of an instrument's data which can be selected with the fields parameter
+INSTRUMENT_FIELDS = ("config_name", "groups", "inst_pvs")
+
+# Parameter of a request path which selects the format of the instrument's data
+FORMAT_PATTERN = re.compile(r"[?&]format=([^&]*)")
+
+# Quality parameter of a media type in an Accept header which refuses it
+REFUSED_PATTERN = re.compile(r"q=0(\.0*)?\Z")
+
+# Parameters of a request path for the history of a block or instrument PV
+HISTORY_PARAMETER_PATTERN = re.compile(r"[?&](block|inst_pv|seconds|points|aggregate)=([^&]*)")
+
+# Valid JSONP callback name, any other characters could inject script into the response
+CALLBACK_PATTERN = re.compile(r"\w+\Z")
+
+
+def get_instrument_and_callback(path, callback_required=True):
     """
-    Looks at the path used to connect and picks out the callback function and the instrument name.
+    Looks at the path used to connect and picks out the callback function and the instrument name. The parameters
+    can be in any order.
     Args:
         path (str): the requested path
+        callback_required (bool): False if the response is not JSONP so the callback is optional
 
     Returns:
-        tuple: (instrument name, callback mathod name)
+        tuple: (instrument name, callback mathod name or None if there is none and it is not required)
 
     """
+    callbacks = []
+    instruments = []
+    for name, value in PARAMETER_PATTERN.findall(path):
+        if name == "callback":
+            callbacks.append(value)
+        else:
+            instruments.append(value)
+
     # JSONP requires a response of the format "name_of_callback(json_string)"
     # e.g. myFunction({ "a": 1, "b": 2})
-    callback = re.findall('/?callback=(\w+)&', path)
-
-    # Look for the instrument data
-    instruments = re.findall('&Instrument=([^&]+)&', path)
-
-    if len(callback) != 1:
+    if len(callbacks) == 0 and not callback_required:
+        callback = None
+    elif len(callbacks) != 1:
         raise ValueError("Invalid number of callbacks specified: {}".format(path))
+    elif CALLBACK_PATTERN.match(callbacks[0]) is None:
+        raise ValueError("Invalid callback specified: {}".format(path))
+    else:
+        callback = callbacks[0]
 
     if len(instruments) != 1:
         raise ValueError("Invalid number of instruments specified: {}".format(path))
+    instrument = instruments[0]
+    if "%" in instrument or "+" in instrument:
+        instrument = unquote_plus(instrument)
+    if instrument == "":
+        raise ValueError("No instrument specified: {}".format(path))
 
-    return instruments[0].upper(), callback[0]
+    return instrument.upper(), callback
+
+
+def get_summary_details_of_instrument(instrument_data):
+    """
+    Gets whether ibex is running for an instrument.
+    :param instrument_data: The data scraped from the archiver webpage for the instrument
+    :return: A json dictionary containing the state of the instrument
+    """
+    try:
+        run_state = instrument_data["inst_pvs"]["RUNSTATE"]["value"]
+    except (KeyError, TypeError):
+        run_state = "UNKNOWN"
+
+    return {"is_up": (instrument_data != ''),
+            "run_state": run_state}
 
 
 def get_summary_details_of_all_instruments(data):
@@ -38,17 +99,73 @@ def get_summary_details_of_all_instruments(data):
     inst_data = OrderedDict()
     ordered_inst_list = sorted(data.keys(), key=lambda s: s.lower())
     for inst in ordered_inst_list:
-        v = data[inst]
+        inst_data[inst] = get_summary_details_of_instrument(data[inst])
 
-        try:
-            run_state = v["inst_pvs"]["RUNSTATE"]["value"]
-        except (KeyError, TypeError):
-            run_state = "UNKNOWN"
+    return inst_data
 
-        inst_data[inst] = {"is_up": (v != ''),
-                           "run_state": run_state}
 
-    return inst_data
+class InstrumentSummaries(object):
+    """
+    The summary of all the instruments, as returned by get_summary_details_of_all_instruments, kept up to date as each
+    instrument's data is published so that it does not have to be rebuilt for each request.
+    """
+
+    def __init__(self):
+        self._summaries = {}
+        self._ordered_instruments = []
+        self._summaries_as_json = None
+
+    def update(self, instrument, instrument_data):
+        """
+        Update the summary of an instrument.
+        Args:
+            instrument: name of the instrument
+            instrument_data: the data scraped for the instrument
+        """
+        summary = get_summary_details_of_instrument(instrument_data)
+        if self._summaries.get(instrument) == summary:
+            return
+        if instrument not in self._summaries:
+            bisect.insort(self._ordered_instruments, (instrument.lower(), instrument))
+        self._summaries[instrument] = summary
+        self._summaries_as_json = None
+
+    def remove(self, instrument):
+        """
+        Remove the summary of an instrument.
+        Args:
+            instrument: name of the instrument
+        """
+        if self._summaries.pop(instrument, None) is None:
+            return
+        self._ordered_instruments.remove((instrument.lower(), instrument))
+        self._summaries_as_json = None
+
+    def as_ordered_dict(self):
+        """
+        Returns: ordered dictionary of the summary of each instrument in instrument name order
+
+        """
+        return OrderedDict((instrument, self._summaries[instrument]) for _, instrument in self._ordered_instruments)
+
+    def as_json(self):
+        """
+        Returns: the summaries as json; only encoded again after a summary has changed
+
+        """
+        if self._summaries_as_json is None:
+            self._summaries_as_json = json.dumps(self.as_ordered_dict())
+        return self._summaries_as_json
+
+
+def get_all_instruments_as_json(error, summaries_as_json):
+    """
+    Gets the response to a request for all instruments.
+    :param error: The error retrieving the instrument list
+    :param summaries_as_json: The summaries of the instruments as json
+    :return: The response as json
+    """
+    return '{{"error": {}, "instruments": {}}}'.format(json.dumps(error), summaries_as_json)
 
 
 def get_detailed_state_of_specific_instrument(instrument, data):
@@ -63,3 +180,207 @@ def get_detailed_state_of_specific_instrument(instrument, data):
     if data[instrument] == "":
         raise ValueError("Instrument has become unavailable")
     return data[instrument]
+
+
+def get_instruments_in_batch(instrument):
+    """
+    Gets the instruments requested in a batch request, i.e. Instrument=A,B
+    :param instrument: The instrument parameter of the request
+    :return: The instruments requested, in the order they were requested without repeats; None if the request is
+        not a batch
+    """
+    if "," not in instrument:
+        return None
+    return list(OrderedDict.fromkeys(name for name in instrument.split(",") if name != ""))
+
+
+def get_detailed_state_of_instruments(instruments, data):
+    """
+    Gets the detailed states of several instruments, used to display several instruments in one page
+    :param instruments: The instruments to get data for
+    :param data: The data scraped from the archiver webpage
+    :return: A dictionary of the data of each instrument, None for an instrument without data, and of the reason
+        each instrument without data has none
+    """
+    states = OrderedDict()
+    errors = {}
+    for instrument in instruments:
+        try:
+            states[instrument] = get_detailed_state_of_specific_instrument(instrument, data)
+        except ValueError as e:
+            states[instrument] = None
+            errors[instrument] = str(e)
+    return {"instruments": states, "errors": errors}
+
+
+def get_projection(path):
+    """
+    Looks at the path used to connect and picks out which parts of the instrument's data are requested, e.g.
+    fields=inst_pvs,config_name or group=Temperatures
+    Args:
+        path (str): the requested path
+
+    Returns:
+        tuple: (fields requested or None for all, group requested or None for all)
+
+    """
+    fields = []
+    groups = []
+    for name, value in PROJECTION_PATTERN.findall(path):
+        if name == "fields":
+            fields.append(value)
+        else:
+            groups.append(value)
+    if len(fields) > 1 or len(groups) > 1:
+        raise ValueError("Invalid number of fields or groups specified: {}".format(path))
+
+    requested_fields = None
+    if len(fields) == 1:
+        requested_fields = tuple(sorted(set(field for field in unquote_plus(fields[0]).split(",") if field != "")))
+        if any(field not in INSTRUMENT_FIELDS for field in requested_fields):
+            raise ValueError("Invalid fields specified: {}".format(path))
+    requested_group = unquote_plus(groups[0]) if len(groups) == 1 else None
+    if requested_group is not None and requested_fields is not None and "groups" not in requested_fields:
+        raise ValueError("Group specified without the groups field: {}".format(path))
+    return requested_fields, requested_group
+
+
+def get_format(path, accept=None):
+    """
+    Looks at the path used to connect and picks out the format the instrument's data is requested in, e.g.
+    format=compact. Without a format parameter the format is negotiated from the Accept header.
+    Args:
+        path (str): the requested path
+        accept (str): the Accept header of the request; None if there is none
+
+    Returns:
+        str: the format requested, json if none is requested
+
+    """
+    formats = FORMAT_PATTERN.findall(path)
+    if len(formats) == 0:
+        return _get_accepted_format(accept)
+    if len(formats) > 1 or formats[0] not in FORMATS:
+        raise ValueError("Invalid format specified: {}".format(path))
+    return formats[0]
+
+
+def _get_accepted_format(accept):
+    """
+    Args:
+        accept (str): the Accept header of a request; None if there is none
+
+    Returns:
+        str: the first available format in the header which is not refused, json if there is none
+
+    """
+    if accept is None:
+        return FORMAT_JSON
+    for media_range in accept.split(","):
+        parameters = [parameter.replace(" ", "") for parameter in media_range.split(";")]
+        payload_format = ACCEPTED_MEDIA_TYPES.get(parameters[0].lower())
+        if payload_format in FORMATS and not any(REFUSED_PATTERN.match(parameter) for parameter in parameters[1:]):
+            return payload_format
+    return FORMAT_JSON
+
+
+def get_history_query(path):
+    """
+    Looks at the path used to connect and picks out which block's history is requested, how many seconds of history,
+    the most points to return and how samples are aggregated into them, e.g. block=Temp1&seconds=600&points=100; an
+    instrument PV's history is requested with inst_pv instead of block, e.g. inst_pv=BEAMCURRENT
+    Args:
+        path (str): the requested path
+
+    Returns:
+        tuple: (kind of channel, block or instrument PV name, seconds of history or None for all, most points or None
+            for every sample, aggregate)
+
+    """
+    parameters = {}
+    for name, value in HISTORY_PARAMETER_PATTERN.findall(path):
+        if name in parameters:
+            raise ValueError("Parameter {} specified more than once: {}".format(name, path))
+        parameters[name] = unquote_plus(value)
+
+    channels = [(kind, parameters[kind]) for kind in (CHANNEL_BLOCK, CHANNEL_INST_PV) if parameters.get(kind, "") != ""]
+    if len(channels) != 1:
+        raise ValueError("Exactly one block or instrument PV must be specified: {}".format(path))
+    kind, name = channels[0]
+    try:
+        seconds = float(parameters["seconds"]) if "seconds" in parameters else None
+        points = int(parameters["points"]) if "points" in parameters else None
+    except ValueError:
+        raise ValueError("Invalid seconds or points specified: {}".format(path))
+    if (seconds is not None and not seconds > 0) or (points is not None and points < 1):
+        raise ValueError("Invalid seconds or points specified: {}".format(path))
+    aggregate = parameters.get("aggregate", AGGREGATE_MEAN)
+    if aggregate not in AGGREGATES:
+        raise ValueError("Invalid aggregate specified: {}".format(path))
+    return kind, name, seconds, points, aggregate
+
+
+def project_instrument_state(state, fields, group):
+    """
+    Selects parts of the detailed state of an instrument
+    :param state: The detailed state of the instrument
+    :param fields: The fields to select; None for all
+    :param group: The group to select from the groups; None for all
+    :return: The selected parts of the state
+    """
+    if group is not None and fields is not None and "groups" not in fields:
+        raise ValueError("Group {} can not be selected without the groups field".format(group))
+    projection = {field: value for field, value in state.items() if fields is None or field in fields}
+    if group is not None:
+        try:
+            projection["groups"] = {group: projection["groups"][group]}
+        except KeyError:
+            raise ValueError("Group {} not known".format(group))
+    return projection
+
+
+class ProjectionCache(object):
+    """
+    Cache of the json of the projections of each instrument's state for the latest version of the state, so that
+    each projection is only built and encoded once for each update.
+    """
+
+    def __init__(self, max_projections_per_instrument=32):
+        """
+        Initialise.
+        Args:
+            max_projections_per_instrument: most projections cached for each instrument, beyond these they are built
+                for each request
+        """
+        self.max_projections_per_instrument = max_projections_per_instrument
+        self._lock = Lock()
+        self._projections = {}
+
+    def get_json(self, instrument, version, state, fields, group):
+        """
+        Args:
+            instrument: name of the instrument
+            version: version of the instrument's state, changes each time the state is updated
+            state: the detailed state of the instrument
+            fields: the fields to select; None for all
+            group: the group to select from the groups; None for all
+
+        Returns: the projection of the state as json
+
+        """
+        key = (fields, group)
+        with self._lock:
+            cached_version, projections = self._projections.get(instrument, (None, {}))
+            if cached_version == version and key in projections:
+                return projections[key]
+
+        projection_as_json = json.dumps(project_instrument_state(state, fields, group))
+
+        with self._lock:
+            cached_version, projections = self._projections.get(instrument, (None, {}))
+            if cached_version != version:
+                projections = {}
+                self._projections[instrument] = (version, projections)
+            if len(projections) < self.max_projections_per_instrument:
+                projections[key] = projection_as_json
+        return projection_as_json
@@ -0,0 +1,234 @@
+"""
+A fixed size pool of worker threads which scrape instruments as they become due.
+"""
+import heapq
+import itertools
+import logging
+from threading import Thread, Condition
+from time import time
+
+from external_webpage.data_source_reader import DataSourceReader
+from external_webpage.instrument_scapper import InstrumentScrape, WAIT_AFTER_CHANGE
+
+logger = logging.getLogger('JSON_bourne')
+
+
+class PooledScrapper(object):
+    """
+    Scrapper for an instrument whose scrapes are run by the workers of a scrapper pool. It has the same interface as
+    an instrument scrapper thread so that the web scrapper manager can manage it in the same way.
+    """
+
+    def __init__(self, pool, name, host):
+        """
+        Initialize.
+        Args:
+            pool: the pool which will run the scrapes
+            name: Name of instrument.
+            host: Host for the instrument.
+        """
+        self._pool = pool
+        self._name = name
+        self._host = host
+        self.instrument_scrape = None
+        self.stopped = False
+        # sequence number and due time of the scrapper's entry in the pool's queue; None while it is being scraped
+        self.due_sequence = None
+        self.due_time = None
+        # True if the instrument's information changed while it was being scraped
+        self.changed = False
+
+    def start(self):
+        """
+        Queue the first scrape of the instrument.
+        """
+        self.instrument_scrape = InstrumentScrape(self._name, self._host, self._pool.reader_class,
+                                                  on_change=self._on_change)
+        logger.info("Scrapper started for {}".format(self._name))
+        self._pool.schedule(self, 0)
+
+    def _on_change(self):
+        """
+        Called when the instrument's information changes, bring its next scrape forward.
+        """
+        self._pool.scrape_soon(self)
+
+    def is_alive(self):
+        """
+        Returns: True if the scrapper is still being run by the pool; False otherwise
+        """
+        return not self.stopped and self._pool.is_running()
+
+    def stop(self):
+        """
+        Stop the scrapper, it will not be scraped again.
+        """
+        self._pool.remove(self)
+
+    def join(self):
+        """
+        Scrapes are run on the pool's threads so there is nothing to wait for; join the pool instead.
+        """
+        pass
+
+
+class ScrapperPool(object):
+    """
+    Pool of worker threads taking instruments from a queue ordered on when each instrument is next due to be scraped.
+    Only as many archivers as there are workers are accessed at once and a slow archiver only holds up one worker.
+    Each scrapper has one entry in the queue at a time; an entry whose sequence number is no longer the scrapper's is
+    out of date and is skipped.
+    """
+
+    def __init__(self, size, reader_class=DataSourceReader):
+        """
+        Initialise.
+        Args:
+            size: number of worker threads
+            reader_class: class of the reader used to get each instrument's external information
+        """
+        self.reader_class = reader_class
+        self._size = size
+        self._workers = []
+        self._due = []
+        self._sequence = itertools.count()
+        self._condition = Condition()
+        self._running = False
+
+    def create_scrapper(self, name, host):
+        """
+        Create a scrapper whose scrapes will be run by this pool.
+        Args:
+            name: Name of instrument.
+            host: Host for the instrument.
+
+        Returns: the scrapper
+
+        """
+        return PooledScrapper(self, name, host)
+
+    def schedule(self, scrapper, delay):
+        """
+        Queue a scrape of an instrument.
+        Args:
+            scrapper: the instrument's scrapper
+            delay: seconds from now at which the scrape is due
+        """
+        with self._condition:
+            scrapper.due_sequence = next(self._sequence)
+            scrapper.due_time = time() + delay
+            heapq.heappush(self._due, (scrapper.due_time, scrapper.due_sequence, scrapper))
+            self._condition.notify()
+
+    def scrape_soon(self, scrapper):
+        """
+        Bring forward the next scrape of an instrument whose information has changed, to WAIT_AFTER_CHANGE seconds
+        from now.
+        Args:
+            scrapper: the instrument's scrapper
+        """
+        with self._condition:
+            if scrapper.stopped:
+                return
+            if scrapper.due_sequence is None:
+                # being scraped, it is scheduled soon when the scrape finishes
+                scrapper.changed = True
+            elif scrapper.due_time > time() + WAIT_AFTER_CHANGE:
+                self.schedule(scrapper, WAIT_AFTER_CHANGE)
+
+    def remove(self, scrapper):
+        """
+        Stop scraping an instrument. A queued scrapper is closed at once and its entry in the queue is out of date, so
+        a scrapper started for the same instrument in its place is not scraped alongside it; a scrapper being scraped
+        is closed when its scrape finishes.
+        Args:
+            scrapper: the instrument's scrapper
+        """
+        with self._condition:
+            scrapper.stopped = True
+            queued = scrapper.due_sequence is not None
+            scrapper.due_sequence = None
+        if queued:
+            scrapper.instrument_scrape.close()
+
+    def is_running(self):
+        """
+        Returns: True if the workers are running; False otherwise
+        """
+        return self._running
+
+    def start(self):
+        """
+        Start the worker threads.
+        """
+        self._running = True
+        for index in range(self._size):
+            worker = Thread(target=self._work, name="ScrapperPoolWorker-{}".format(index))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        """
+        Stop the workers once they have finished their current scrape and close the queued scrappers.
+        """
+        with self._condition:
+            self._running = False
+            queued = [scrapper for _, sequence, scrapper in self._due if sequence == scrapper.due_sequence]
+            for scrapper in queued:
+                scrapper.due_sequence = None
+            self._due = []
+            self._condition.notify_all()
+        for scrapper in queued:
+            scrapper.instrument_scrape.close()
+
+    def join(self):
+        """
+        Wait for the workers to stop.
+        """
+        for worker in self._workers:
+            worker.join()
+
+    def _next_due(self):
+        """
+        Wait for the next instrument scrape to become due and take it off the queue.
+
+        Returns: the scrapper whose scrape is due; None if the pool is stopping
+
+        """
+        with self._condition:
+            while self._running:
+                if len(self._due) == 0:
+                    self._condition.wait()
+                    continue
+                due_time, sequence, scrapper = self._due[0]
+                if sequence != scrapper.due_sequence:
+                    heapq.heappop(self._due)
+                    continue
+                wait_time = due_time - time()
+                if wait_time > 0:
+                    self._condition.wait(wait_time)
+                    continue
+                heapq.heappop(self._due)
+                scrapper.due_sequence = None
+                scrapper.changed = False
+                return scrapper
+            return None
+
+    def _work(self):
+        """
+        Scrape instruments as they become due until the pool is stopped.
+        """
+        while True:
+            scrapper = self._next_due()
+            if scrapper is None:
+                return
+            wait_time = scrapper.instrument_scrape.scrape()
+            with self._condition:
+                finished = scrapper.stopped or not self._running
+                if not finished:
+                    if scrapper.changed:
+                        wait_time = min(wait_time, WAIT_AFTER_CHANGE)
+                    self.schedule(scrapper, wait_time)
+            if finished:
+                scrapper.instrument_scrape.close()
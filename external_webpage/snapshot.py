@@ -0,0 +1,139 @@
+"""
+Snapshot of the scraped data saved to disk periodically, so that after a restart the last known data can be served
+until each instrument has been scraped again. The snapshot is zlib compressed JSON and is written to a temporary file
+which is then renamed over the previous snapshot, so a crash while writing never leaves a partial snapshot.
+"""
+import json
+import logging
+import os
+import zlib
+from threading import Event, Thread
+from time import time
+
+logger = logging.getLogger('JSON_bourne')
+
+# Version of the snapshot format, snapshots of other versions are not loaded
+SNAPSHOT_VERSION = 1
+
+
+def _replace(source, destination):
+    """
+    Rename a file over another. On Windows rename fails if the destination exists so it is removed first, leaving a
+    moment without a snapshot rather than a partial one.
+    Args:
+        source: path of the file to rename
+        destination: path to rename it to
+    """
+    try:
+        os.rename(source, destination)
+    except OSError:
+        if not os.path.exists(destination):
+            raise
+        os.remove(destination)
+        os.rename(source, destination)
+
+
+def save_snapshot(path, instruments, snapshot_time=None):
+    """
+    Save a snapshot atomically.
+    Args:
+        path: path of the snapshot file
+        instruments: dictionary of instrument name to its data
+        snapshot_time: time of the snapshot in seconds since the epoch; None for now
+    """
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "time": time() if snapshot_time is None else snapshot_time,
+        "instruments": instruments}
+    compressed = zlib.compress(json.dumps(snapshot, separators=(",", ":")))
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        snapshot_file.write(compressed)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    _replace(temporary_path, path)
+
+
+def load_snapshot(path):
+    """
+    Load a snapshot.
+    Args:
+        path: path of the snapshot file
+
+    Returns: tuple of the time of the snapshot and the dictionary of instrument name to its data; None if there is no
+        snapshot or it can not be read
+
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as snapshot_file:
+            snapshot = json.loads(zlib.decompress(snapshot_file.read()))
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            logger.error("Snapshot {} is version {}, expected {}".format(
+                path, snapshot.get("version"), SNAPSHOT_VERSION))
+            return None
+        return snapshot["time"], snapshot["instruments"]
+    except Exception as e:
+        logger.error("Unable to load snapshot {}: {}".format(path, e))
+        return None
+
+
+class SnapshotWriter(object):
+    """
+    Background thread saving a snapshot periodically when the data has changed.
+    """
+
+    def __init__(self, path, get_data, interval=60):
+        """
+        Initialise.
+        Args:
+            path: path of the snapshot file
+            get_data: function returning a tuple of the dictionary of instrument name to its data and a value which
+                changes whenever the data changes
+            interval: seconds between snapshots
+        """
+        self.path = path
+        self.interval = interval
+        self._get_data = get_data
+        self._last_change = None
+        self._stop_event = Event()
+        self._thread = None
+
+    def save(self):
+        """
+        Save a snapshot if the data has changed since the last one.
+        """
+        instruments, change = self._get_data()
+        if change == self._last_change:
+            return
+        try:
+            save_snapshot(self.path, instruments)
+            self._last_change = change
+        except Exception as e:
+            logger.error("Unable to save snapshot {}: {}".format(self.path, e))
+
+    def start(self):
+        """
+        Start saving snapshots periodically.
+        """
+        self._thread = Thread(target=self._save_periodically, name="SnapshotWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Save a last snapshot and stop.
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self.save()
+
+    def _save_periodically(self):
+        """
+        Save snapshots until stopped.
+        """
+        while not self._stop_event.wait(self.interval):
+            self.save()
@@ -47,11 +47,13 @@ class WebPageParser(object):
     Parses parts of a json web page.
     """
 
-    def extract_blocks(self, info_page_as_json):
+    def extract_blocks(self, info_page_as_json, wanted=None):
         """
         Extract blocks from channels on the given page.
         Args:
             info_page_as_json: the json from an info web page
+            wanted: if set only channels whose block name is wanted are converted to blocks, others are skipped
+                before any block is created. Either a predicate taking the block name or a collection of block names.
 
         Returns: list of blocks
 
@@ -63,26 +65,36 @@ class WebPageParser(object):
         except (KeyError, TypeError):
             raise BlocksParseError("There is no json object for channels")
 
+        if wanted is None or callable(wanted):
+            is_wanted = wanted
+        else:
+            is_wanted = wanted.__contains__
+
         for channel in channels:
             try:
-                block = self._create_block_from_channel(channel)
-                blocks[block.get_name()] = block
+                name = shorten_title(channel["Channel"])
+                if is_wanted is not None and not is_wanted(name):
+                    continue
+                block = self._create_block_from_channel(channel, name)
+                blocks[name] = block
             except (ValueError, KeyError, AttributeError, TypeError) as ex:
                 logger.error("Can not convert block from channel {0}: {1}".format(channel, ex))
 
         return blocks
 
-    def _create_block_from_channel(self, channel):
+    def _create_block_from_channel(self, channel, name=None):
         """
         Create a single block from a channel object.
 
         Args:
             channel: the channel.
+            name: the block name for the channel; None to work it out from the channel
 
         Returns:
 
         """
-        name = shorten_title(channel["Channel"])
+        if name is None:
+            name = shorten_title(channel["Channel"])
         connected = channel["Connected"]
         current_value = channel["Current Value"]
         if connected:
@@ -1,6 +1,7 @@
 """
 Relation to web scrapper management.
 """
+import hashlib
 import json
 import logging
 import zlib
@@ -11,7 +12,8 @@ import six
 from CaChannel import CaChannelException
 from CaChannel.util import caget
 
-from external_webpage.instrument_scapper import InstrumentScrapper
+from external_webpage.channel_access_data_source_reader import ChannelAccessMonitors
+from external_webpage.instrument_scapper import InstrumentScrapper, block_histories, discard_stale_instruments
 
 # logger for the class
 logger = logging.getLogger('JSON_bourne')
@@ -32,24 +34,47 @@ class InstList(object):
     INSTRUMENT_LIST_NOT_JSON = "Instrument list is not json"
     INSTRUMENT_LIST_NOT_CORRECT_FORMAT = "Instrument list not in correct format"
 
-    def __init__(self, caget_fn=caget, local_inst_list=None):
+    def __init__(self, caget_fn=caget, local_inst_list=None, ca_layer=None):
         """
         Initialise.
         Args:
             caget_fn: function to perform a caget
             local_inst_list: local instrument list to override/add entries to the one from instrument list pv
+            ca_layer: channel access layer used to monitor the instrument list pv; None to use CaChannel
         """
         self.error_on_retrieve = "Instrument list not yet retrieved"
         self._caget_fn = caget_fn
+        self._ca_layer = ca_layer
+        self._monitor_subscription = None
         if local_inst_list is None:
             self._local_inst_list = {}
         else:
             self._local_inst_list = local_inst_list
         self._cached_list = self._local_inst_list
+        self._cached_raw_hash = None
+
+    def monitor(self, callback):
+        """
+        Monitor the instrument list pv so that changes can be picked up without waiting for the next refresh.
+        Args:
+            callback: function with no arguments called whenever the instrument list pv changes
+        """
+        if self._ca_layer is None:
+            self._ca_layer = ChannelAccessMonitors()
+
+        def on_change(connected, *args):
+            if connected:
+                callback()
+
+        try:
+            self._monitor_subscription = self._ca_layer.subscribe(INST_LIST_PV, on_change)
+        except CaChannelException as ex:
+            logger.error("ERROR: Can not monitor instrument list, changes will be seen at next refresh. {}".format(ex))
 
     def retrieve(self):
         """
-        retrieve the instrument list
+        retrieve the instrument list; if the pv value is unchanged since the last successful retrieve the cached
+        list is returned without decoding it again
         Returns: list of instruments with their host names
         """
 
@@ -64,6 +89,11 @@ class InstList(object):
             logger.error("ERROR: Error getting instrument list. {}".format(ex))
             return self._cached_list
 
+        raw_hash = self._hash(raw)
+        if raw_hash == self._cached_raw_hash:
+            self.error_on_retrieve = ""
+            return self._cached_list
+
         try:
             full_inst_list_string = self._dehex_and_decompress(raw)
         except Exception as ex:
@@ -91,10 +121,24 @@ class InstList(object):
 
         self._cached_list = inst_list
         self._cached_list.update(self._local_inst_list)
+        self._cached_raw_hash = raw_hash
         self.error_on_retrieve = ""
 
         return self._cached_list
 
+    def _hash(self, value):
+        """
+        Hash the raw pv value
+        Args:
+            value: value to hash
+
+        Returns: digest of the value
+
+        """
+        if isinstance(value, six.text_type):
+            value = value.encode("utf-8")
+        return hashlib.sha1(value).hexdigest()
+
     def _dehex_and_decompress(self, value):
         """
         Decompress and dehex pv value
@@ -116,19 +160,60 @@ class InstList(object):
         return zlib.decompress(bytes.fromhex(value)).decode("utf-8")
 
 
+class InstListChanges(object):
+    """
+    The changes between two instrument lists.
+    """
+
+    def __init__(self, old_inst_list, new_inst_list):
+        """
+        Initialise.
+        Args:
+            old_inst_list: previous dictionary of instrument names to host names
+            new_inst_list: current dictionary of instrument names to host names
+        """
+        self.added = {}
+        self.removed = {}
+        self.rehosted = {}
+        for name, host in new_inst_list.items():
+            try:
+                old_host = old_inst_list[name]
+            except KeyError:
+                self.added[name] = host
+                continue
+            if old_host != host:
+                self.rehosted[name] = (old_host, host)
+        for name, host in old_inst_list.items():
+            if name not in new_inst_list:
+                self.removed[name] = host
+
+    def __nonzero__(self):
+        """
+        Returns: True if there are any changes; False otherwise
+        """
+        return len(self.added) > 0 or len(self.removed) > 0 or len(self.rehosted) > 0
+
+    __bool__ = __nonzero__
+
+    def __str__(self):
+        return "added: {}, removed: {}, rehosted: {}".format(self.added, self.removed, self.rehosted)
+
+
 class WebScrapperManager(Thread):
     """
     Manager for the web scrappers that are creating the data for the data web
     It is responsible for starting then and making sure they are running
     """
 
-    def __init__(self, scrapper_class=InstrumentScrapper, inst_list=None, local_inst_list=None):
+    def __init__(self, scrapper_class=InstrumentScrapper, inst_list=None, local_inst_list=None, scrapper_pool=None):
         """
         Initialiser.
         Args:
             scrapper_class: the class for the Scrappers
             inst_list: the instrument list getter
             local_inst_list: a local instrument list to add to global instrument list
+            scrapper_pool: pool of workers to run the scrapes on instead of a thread per instrument; None for a
+                thread per instrument
         """
         super(WebScrapperManager, self).__init__()
         if inst_list is None:
@@ -136,9 +221,16 @@ class WebScrapperManager(Thread):
         else:
             self._inst_list = inst_list
 
-        self._scrapper_class = scrapper_class
-        self.scrappers = []
+        self._scrapper_pool = scrapper_pool
+        if scrapper_pool is None:
+            self._scrapper_class = scrapper_class
+        else:
+            self._scrapper_class = scrapper_pool.create_scrapper
+        # scrappers keyed on the instrument name and host they are scraping
+        self._scrappers = {}
+        self._instruments = {}
         self._stop_event = Event()
+        self._inst_list_changed = Event()
 
     def wait(self, seconds):
         """
@@ -150,7 +242,7 @@ class WebScrapperManager(Thread):
 
         """
         for i in range(seconds):
-            if self._stop_event.is_set():
+            if self._stop_event.is_set() or self._inst_list_changed.is_set():
                 return
             sleep(1)
 
@@ -158,70 +250,80 @@ class WebScrapperManager(Thread):
         """
         Perform a run of the web scrapper management cycle
         """
+        if self._scrapper_pool is not None:
+            self._scrapper_pool.start()
+        self._inst_list.monitor(self._inst_list_changed.set)
         while not self._stop_event.is_set():
+            self._inst_list_changed.clear()
             self.maintain_scrapper_list()
             self.wait(TIME_BETWEEN_INSTLIST_REFRESH)
         self.stop_all()
 
     def maintain_scrapper_list(self):
         """
-        Maintain the scrapper list by starting any instrument scrapper on the list and stopping those not on the list
+        Maintain the scrapper list by starting any instrument scrapper on the list and stopping those not on the list.
+        If the list has not changed and all scrappers are running nothing is done. Data loaded from a snapshot for
+        instruments not on the list is discarded, as are the block histories of instruments removed from the list.
+
+        Returns: the changes to the instrument list since it was last maintained
         """
         inst_list = self._inst_list.retrieve()
-        new_scrappers_list = []
-        for scrapper in self.scrappers:
-            if scrapper.is_alive() and self._is_scrapper_in_inst_list(inst_list, scrapper):
-                new_scrappers_list.append(scrapper)
-            else:
-                scrapper.stop()
-        self.scrappers = new_scrappers_list
-        for name, host in self._scrapper_to_start(inst_list):
-            scrapper = self._scrapper_class(name, host)
-            scrapper.start()
-            self.scrappers.append(scrapper)
-
-    def _is_scrapper_in_inst_list(self, inst_list, scrapper):
+        if self._inst_list.error_on_retrieve == "":
+            # only once the list is known, so the snapshot is served while the list can not be read
+            discard_stale_instruments(inst_list)
+        changes = InstListChanges(self._instruments, inst_list)
+        self._instruments = dict(inst_list)
+        if changes:
+            logger.info("Instrument list changed, {}".format(changes))
+        elif all(scrapper.is_alive() for scrapper in self._scrappers.values()):
+            return changes
+
+        self.reconcile(inst_list)
+        for name in changes.removed:
+            block_histories.remove(name)
+        return changes
+
+    def reconcile(self, instruments):
         """
-        Check if scapper is in instrument list
+        Reconcile the running scrappers with a whole instrument list in one pass; scrappers are started for
+        instruments without a running scrapper and stopped for those no longer on the list.
         Args:
-            inst_list: the instrument list
-            scrapper: scrapper to checker
-
-        Returns: True if in; False otherwise
-
-        """
-        for name, host in inst_list.items():
-            if scrapper.is_instrument(name, host):
-                return True
-        return False
-
-    def _scrapper_to_start(self, instruments):
+            instruments: dictionary of instrument names to host names, e.g. the merged lists of several sites
         """
-        Generator returning scrapper to start, i.e. ones in the instrument list but not in the scrappers list
-        Args:
-            instruments:
+        wanted = set(instruments.items())
+        for name_and_host, scrapper in list(self._scrappers.items()):
+            if name_and_host not in wanted or not scrapper.is_alive():
+                scrapper.stop()
+                del self._scrappers[name_and_host]
 
-        Returns:
+        for name_and_host in wanted:
+            if name_and_host not in self._scrappers:
+                scrapper = self._scrapper_class(*name_and_host)
+                scrapper.start()
+                self._scrappers[name_and_host] = scrapper
 
+    @property
+    def scrappers(self):
+        """
+        Returns: list of the running scrappers
         """
-        for name, host in instruments.items():
-            for scrapper in self.scrappers:
-                if scrapper.is_instrument(name, host):
-                    break
-            else:
-                yield name, host
+        return list(self._scrappers.values())
 
     def stop_all(self):
         """
         Stop all scrapper threads.
 
         """
-        for scrapper in self.scrappers:
+        for scrapper in self._scrappers.values():
             scrapper.stop()
+        if self._scrapper_pool is not None:
+            self._scrapper_pool.stop()
 
         print("   Waiting for scrappers to stop ...")
-        for scrapper in self.scrappers:
+        for scrapper in self._scrappers.values():
             scrapper.join()
+        if self._scrapper_pool is not None:
+            self._scrapper_pool.join()
         print("   ... finished")
 
     def instrument_list_retrieval_errors(self):
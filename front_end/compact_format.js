@@ -0,0 +1,75 @@
+/**
+ * Decoding of the compact format of an instrument's data, requested with format=compact.
+ */
+
+var COMPACT_SCHEMA_VERSION = 1;
+
+/**
+ * Decodes a compact block row into a block description.
+ *
+ * @param row The row, the block name followed by the value of each field.
+ * @param fields The names of the fields in the order they are in the row.
+ * @param defaults The default value of each field which has one.
+ * @return The block name and its description as [name, description].
+ */
+function decodeCompactBlock(row, fields, defaults) {
+    var block = {};
+    for (var i = 0; i < fields.length; i++) {
+        var field = fields[i];
+        var value = i + 1 < row.length ? row[i + 1] : null;
+        if (value === null) {
+            if (!defaults.hasOwnProperty(field)) {
+                continue;
+            }
+            value = defaults[field];
+        }
+        block[field] = value;
+    }
+    return [row[0], block];
+}
+
+/**
+ * Decodes a list of compact block rows.
+ *
+ * @param rows The rows.
+ * @param fields The names of the fields in the order they are in each row.
+ * @param defaults The default value of each field which has one.
+ * @return Object of block name to description.
+ */
+function decodeCompactBlocks(rows, fields, defaults) {
+    var blocks = {};
+    for (var i = 0; i < rows.length; i++) {
+        var nameAndBlock = decodeCompactBlock(rows[i], fields, defaults);
+        blocks[nameAndBlock[0]] = nameAndBlock[1];
+    }
+    return blocks;
+}
+
+/**
+ * Decodes an instrument's data in the compact format into the same form as the standard format.
+ *
+ * @param obj The data in the compact format.
+ * @return The data in the standard format; the data as it is if it is not in the compact format, e.g. from a server
+ *     which does not support it.
+ */
+function decodeCompact(obj) {
+    if (obj === null || typeof obj !== "object" || obj.schema === undefined) {
+        return obj;
+    }
+    if (obj.schema !== COMPACT_SCHEMA_VERSION) {
+        throw new Error("Unsupported compact format schema " + obj.schema);
+    }
+    var groups = {};
+    for (var i = 0; i < obj.groups.length; i++) {
+        groups[obj.groups[i][0]] = decodeCompactBlocks(obj.groups[i][1], obj.fields, obj.defaults);
+    }
+    var state = {
+        config_name: obj.config_name,
+        groups: groups,
+        inst_pvs: decodeCompactBlocks(obj.inst_pvs, obj.fields, obj.defaults)
+    };
+    if (obj.stale) {
+        state.stale = true;
+    }
+    return state;
+}
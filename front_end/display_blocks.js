@@ -7,6 +7,8 @@ var nodeConfigTitle = document.createElement("H2");
 var instrumentState;
 var showHidden;
 var timeout = 4000;
+// request the compact format of the data, smaller to transfer; set true to opt in
+var useCompactFormat = false;
 
 dictInstPV = {
     RUNSTATE: 'Run Status',
@@ -117,15 +119,22 @@ function clear(node) {
  * Fetches the latest instrument data.
  */
 function refresh() {
+	var parameters = {"Instrument": instrument};
+	if (useCompactFormat) {
+		parameters["format"] = "compact";
+	}
 	$.ajax({
 		url: HOST + ":" + PORT + "/",
 		dataType: 'jsonp',
-		data: {"Instrument": instrument},
+		data: parameters,
 		timeout: timeout,
 		error: function(xhr, status, error){
 			displayError();
 		},
 		success: function(data){
+			if (useCompactFormat) {
+				data = decodeCompact(data);
+			}
 			parseObject(data);
 		}
 	});
@@ -181,6 +190,10 @@ function createTitle(inst_details){
 	document.getElementById("inst_name").style.border = "black 2px solid";
 	var title = document.createElement("h2");
 	title.innerHTML = instrument.toUpperCase() + " is " + runStatus;
+	if (inst_details["stale"]) {
+		// last known state from before the server restarted
+		title.innerHTML += " (updating)";
+	}
 	var blockListClass = document.createAttribute("class");
 	blockListClass.value = "text-center";
 	title.setAttributeNode(blockListClass);
@@ -0,0 +1,41 @@
+# This file is part of the ISIS IBEX application.
+# Copyright (C) 2017 Science & Technology Facilities Council.
+# All rights reserved.
+#
+# This program is distributed in the hope that it will be useful.
+# This program and the accompanying materials are made available under the
+# terms of the Eclipse Public License v1.0 which accompanies this distribution.
+# EXCEPT AS EXPRESSLY SET FORTH IN THE ECLIPSE PUBLIC LICENSE V1.0, THE PROGRAM
+# AND ACCOMPANYING MATERIALS ARE PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES
+# OR CONDITIONS OF ANY KIND.  See the Eclipse Public License v1.0 for more details.
+#
+# You should have received a copy of the Eclipse Public License v1.0
+# along with this program; if not, you can obtain a copy from
+# https://www.eclipse.org/org/documents/epl-v10.php or
+# http://opensource.org/licenses/eclipse-1.0.php
+"""
+Run the JSON Bourne benchmarks, e.g.
+
+    python run_benchmarks.py throughput --instruments 40 --clients 10 --output before.json
+    python run_benchmarks.py load --host localhost --port 60000 --tabs 200 --overviews 10
+    python run_benchmarks.py history --blocks 1000 --samples 10000 --points 500
+"""
+import argparse
+
+from benchmarks import history_aggregation, load_generator, request_parsing, throughput
+
+BENCHMARKS = {
+    "history": history_aggregation,
+    "load": load_generator,
+    "parsing": request_parsing,
+    "throughput": throughput,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a JSON Bourne benchmark")
+    subparsers = parser.add_subparsers(title="benchmarks")
+    for name, benchmark in sorted(BENCHMARKS.items()):
+        benchmark.add_arguments(subparsers.add_parser(name, help=benchmark.__doc__.strip().split("\n")[0]))
+    args = parser.parse_args()
+    args.run(args)
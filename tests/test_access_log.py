@@ -0,0 +1,118 @@
+import logging
+import os
+import sys
+from hamcrest import *
+import unittest
+
+from mock import Mock
+from six.moves import queue
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.access_log import AccessLog, QueueHandler, QueueListener
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class TestBackgroundLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = queue.Queue()
+        self.logger = logging.getLogger("test_access_log")
+        self.logger.propagate = False
+        self.queue_handler = QueueHandler(self.queue)
+        self.logger.addHandler(self.queue_handler)
+        self.addCleanup(self.logger.removeHandler, self.queue_handler)
+        self.handler = RecordingHandler()
+        self.listener = QueueListener(self.queue, self.handler)
+
+    def test_GIVEN_record_logged_WHEN_listener_not_running_THEN_record_queued_not_written(self):
+        self.logger.warn("message %s", 1)
+
+        assert_that(self.queue.qsize(), is_(1))
+        assert_that(self.handler.messages, is_([]))
+
+    def test_GIVEN_records_logged_WHEN_listener_stopped_THEN_all_records_written_in_order(self):
+        self.listener.start()
+        for index in range(3):
+            self.logger.warn("message %s", index)
+
+        self.listener.stop()
+
+        assert_that(self.handler.messages, is_(["message 0", "message 1", "message 2"]))
+
+    def test_GIVEN_exception_logged_WHEN_written_THEN_traceback_included(self):
+        self.listener.start()
+        try:
+            raise ValueError("bad value")
+        except ValueError:
+            self.logger.exception("failed")
+
+        self.listener.stop()
+
+        assert_that(self.handler.messages[0], contains_string("ValueError: bad value"))
+
+
+class TestAccessLog(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = Mock()
+        self.access_log = AccessLog(self.logger, summary_seconds=60)
+
+    def test_GIVEN_first_request_from_client_WHEN_record_THEN_request_logged(self):
+        self.access_log.record(("1.2.3.4", 5000), "LARMOR")
+
+        self.logger.warn.assert_called_once_with("Connected to from %s looking at %s", ("1.2.3.4", 5000), "LARMOR")
+
+    def test_GIVEN_repeated_requests_from_client_WHEN_record_THEN_only_first_logged(self):
+        for port in range(5000, 5010):
+            self.access_log.record(("1.2.3.4", port), "LARMOR")
+
+        assert_that(self.logger.warn.call_count, is_(1))
+
+    def test_GIVEN_requests_WHEN_summarise_THEN_count_of_requests_and_clients_logged_for_each_instrument(self):
+        for port in range(5000, 5003):
+            self.access_log.record(("1.2.3.4", port), "LARMOR")
+        self.access_log.record(("1.2.3.5", 5000), "LARMOR")
+        self.access_log.record(("1.2.3.4", 5000), "ALL")
+        self.logger.reset_mock()
+
+        self.access_log.summarise()
+
+        summaries = [call[0][2:] for call in self.logger.warn.call_args_list]
+        assert_that(summaries, is_([(1, 1, "ALL"), (4, 2, "LARMOR")]))
+
+    def test_GIVEN_summary_logged_WHEN_record_THEN_first_request_logged_again(self):
+        self.access_log.record(("1.2.3.4", 5000), "LARMOR")
+        self.access_log.summarise()
+        self.logger.reset_mock()
+
+        self.access_log.record(("1.2.3.4", 5001), "LARMOR")
+
+        assert_that(self.logger.warn.call_count, is_(1))
+
+    def test_GIVEN_no_summaries_WHEN_record_repeated_requests_THEN_every_request_logged(self):
+        access_log = AccessLog(self.logger, summary_seconds=0)
+
+        for port in range(5000, 5003):
+            access_log.record(("1.2.3.4", port), "LARMOR")
+        access_log.summarise()
+
+        assert_that(self.logger.warn.call_count, is_(3))
+
+    def test_GIVEN_no_summaries_WHEN_record_THEN_requests_not_counted(self):
+        access_log = AccessLog(self.logger, summary_seconds=0)
+
+        access_log.record(("1.2.3.4", 5000), "LARMOR")
+
+        assert_that(access_log._counts, is_({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import sys
+from hamcrest import *
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.admission_control import ClientRateLimiter, InFlightLimiter, TokenBucket
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_GIVEN_full_bucket_WHEN_take_burst_tokens_THEN_all_taken_and_next_refused(self):
+        bucket = TokenBucket(rate=1, burst=3, now=0)
+
+        taken = [bucket.take(0) for _ in range(4)]
+
+        assert_that(taken, is_([True, True, True, False]))
+
+    def test_GIVEN_empty_bucket_WHEN_time_passes_THEN_refilled_at_rate(self):
+        bucket = TokenBucket(rate=2, burst=3, now=0)
+        for _ in range(3):
+            bucket.take(0)
+
+        taken = [bucket.take(1) for _ in range(3)]
+
+        assert_that(taken, is_([True, True, False]))
+
+    def test_GIVEN_idle_bucket_WHEN_refill_THEN_tokens_limited_to_burst(self):
+        bucket = TokenBucket(rate=2, burst=3, now=0)
+
+        bucket.refill(100)
+
+        assert_that(bucket.tokens, is_(3))
+
+
+class TestClientRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.limiter = ClientRateLimiter(rate=1, burst=2, max_clients=2, timer=self.timer)
+
+    def test_GIVEN_client_over_its_rate_WHEN_allow_THEN_client_throttled_but_other_clients_allowed(self):
+        allowed = [self.limiter.allow("abuser") for _ in range(3)]
+
+        assert_that(allowed, is_([True, True, False]))
+        assert_that(self.limiter.allow("other"), is_(True))
+
+    def test_GIVEN_throttled_client_WHEN_time_passes_THEN_client_allowed_again(self):
+        for _ in range(3):
+            self.limiter.allow("client")
+
+        self.timer.now += 1
+
+        assert_that(self.limiter.allow("client"), is_(True))
+
+    def test_GIVEN_many_clients_WHEN_allow_THEN_at_most_max_clients_tracked(self):
+        for index in range(100):
+            self.limiter.allow("client{}".format(index))
+
+        assert_that(list(self.limiter._buckets.keys()), is_(["client98", "client99"]))
+
+    def test_GIVEN_clients_throttled_WHEN_most_throttled_THEN_throttled_clients_most_throttled_first(self):
+        for client, requests in [("polite", 1), ("abuser", 6), ("other", 3)]:
+            for _ in range(requests):
+                self.limiter.allow(client)
+
+        assert_that(self.limiter.most_throttled(10), is_([("abuser", 4), ("other", 1)]))
+
+    def test_GIVEN_clients_throttled_WHEN_most_throttled_with_count_THEN_only_count_clients(self):
+        for client, requests in [("abuser", 6), ("other", 3)]:
+            for _ in range(requests):
+                self.limiter.allow(client)
+
+        assert_that(self.limiter.most_throttled(1), is_([("abuser", 4)]))
+
+    def test_GIVEN_max_clients_tracked_WHEN_new_client_THEN_least_recently_seen_client_discarded(self):
+        self.limiter.allow("idle")
+        for _ in range(3):
+            self.limiter.allow("busy")
+        self.timer.now += 1
+
+        self.limiter.allow("new")
+
+        assert_that(self.limiter._buckets, not_(has_key("idle")))
+        assert_that(self.limiter._buckets, has_key("busy"))
+
+
+class TestInFlightLimiter(unittest.TestCase):
+
+    def test_GIVEN_limit_reached_WHEN_try_enter_THEN_refused_until_a_request_leaves(self):
+        limiter = InFlightLimiter(2)
+
+        entered = [limiter.try_enter() for _ in range(3)]
+        limiter.leave()
+
+        assert_that(entered, is_([True, True, False]))
+        assert_that(limiter.try_enter(), is_(True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import sys
+from hamcrest import *
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.block_history import BlockHistory, BlockHistories, CHANNEL_INST_PV
+
+
+def block(value, status="Connected"):
+    return {"value": value, "status": status, "alarm": "", "visibility": True}
+
+
+def instrument_data(inst_pvs=None, **blocks):
+    if inst_pvs is None:
+        inst_pvs = {"RUNSTATE": block("SETUP")}
+    return {"config_name": "config", "groups": {"Temperatures": blocks}, "inst_pvs": inst_pvs}
+
+
+class TestBlockHistory(unittest.TestCase):
+
+    def test_GIVEN_numeric_values_with_units_WHEN_appended_THEN_held_as_numbers(self):
+        history = BlockHistory(5)
+
+        history.append(1, "1.5 K")
+        history.append(2, "2")
+
+        assert_that(history.get(), is_(([1.0, 2.0], [1.5, 2.0])))
+
+    def test_GIVEN_formatted_duration_WHEN_appended_THEN_not_recorded_as_a_number(self):
+        history = BlockHistory(5)
+
+        history.append(1, "2 min 3 s")
+
+        assert_that(history.get(), is_(([1.0], [None])))
+
+    def test_GIVEN_text_starting_with_a_number_WHEN_appended_THEN_not_recorded_as_a_number(self):
+        history = BlockHistory(5)
+
+        history.append(1, "3 of 4 detectors")
+
+        assert_that(history.get(), is_(([1.0], [None])))
+
+    def test_GIVEN_full_buffer_WHEN_appended_THEN_oldest_replaced(self):
+        history = BlockHistory(3)
+
+        for time in range(5):
+            history.append(time, str(time))
+
+        assert_that(history.get(), is_(([2.0, 3.0, 4.0], [2.0, 3.0, 4.0])))
+        assert_that(len(history), is_(3))
+
+    def test_GIVEN_disconnected_block_WHEN_appended_THEN_value_is_none(self):
+        history = BlockHistory(3)
+
+        history.append(1, "1")
+        history.append(2, "null", connected=False)
+
+        assert_that(history.get(), is_(([1.0, 2.0], [1.0, None])))
+
+    def test_GIVEN_value_which_is_not_a_number_WHEN_appended_THEN_value_is_none_and_held_as_a_double(self):
+        history = BlockHistory(3)
+        history.append(1, "1")
+
+        history.append(2, "RUNNING")
+
+        assert_that(history.get(), is_(([1.0, 2.0], [1.0, None])))
+        assert_that(history._values.typecode, is_("d"))
+
+    def test_GIVEN_samples_WHEN_get_since_time_THEN_only_later_samples(self):
+        history = BlockHistory(5)
+        for time in range(5):
+            history.append(time, str(time))
+
+        result = history.get(since=3)
+
+        assert_that(result, is_(([3.0, 4.0], [3.0, 4.0])))
+
+
+class TestBlockHistories(unittest.TestCase):
+
+    def test_GIVEN_published_data_WHEN_recorded_THEN_history_of_numeric_blocks_kept(self):
+        histories = BlockHistories(samples_per_block=10)
+
+        histories.record("INST", 1, instrument_data(TEMP1=block("1.5")))
+        histories.record("INST", 2, instrument_data(TEMP1=block("2.5")))
+
+        assert_that(histories.get("INST", "TEMP1"), is_(([1.0, 2.0], [1.5, 2.5])))
+
+    def test_GIVEN_text_values_WHEN_recorded_THEN_not_recorded_and_do_not_count_towards_max_blocks(self):
+        histories = BlockHistories(samples_per_block=10, max_blocks=1)
+
+        histories.record("INST", 1, instrument_data(TITLE=block("My experiment")))
+        histories.record("INST", 2, instrument_data(TITLE=block("My experiment"), TEMP1=block("1.5")))
+
+        with self.assertRaises(ValueError):
+            histories.get("INST", "TITLE")
+        with self.assertRaises(ValueError):
+            histories.get("INST", "RUNSTATE")
+        assert_that(histories.get("INST", "TEMP1"), is_(([2.0], [1.5])))
+
+    def test_GIVEN_block_removed_from_data_WHEN_recorded_THEN_its_history_forgotten(self):
+        histories = BlockHistories(samples_per_block=10)
+        histories.record("INST", 1, instrument_data(TEMP1=block("1.5")))
+
+        histories.record("INST", 2, instrument_data())
+
+        with self.assertRaises(ValueError):
+            histories.get("INST", "TEMP1")
+
+    def test_GIVEN_max_blocks_reached_WHEN_recorded_THEN_further_blocks_not_recorded(self):
+        histories = BlockHistories(samples_per_block=10, max_blocks=1)
+
+        histories.record("INST", 1, instrument_data(TEMP1=block("1")))
+        histories.record("OTHER", 1, instrument_data(TEMP1=block("1")))
+
+        histories.get("INST", "TEMP1")
+        with self.assertRaises(ValueError):
+            histories.get("OTHER", "TEMP1")
+
+    def test_GIVEN_numeric_history_WHEN_get_points_THEN_bucket_means_ignoring_disconnected(self):
+        histories = BlockHistories(samples_per_block=10)
+        for time, value in enumerate(["1", "3", "null", "5"]):
+            histories.record("INST", time, instrument_data(TEMP1=block(value, "Connected" if value != "null" else "")))
+
+        result = histories.get("INST", "TEMP1", points=2)
+
+        assert_that(result, is_(([0.5, 2.5], [2.0, 5.0])))
+
+    def test_GIVEN_block_and_inst_pv_with_same_name_WHEN_recorded_THEN_histories_kept_apart(self):
+        histories = BlockHistories(samples_per_block=10)
+
+        histories.record("INST", 1, instrument_data(inst_pvs={"BEAMCURRENT": block("150")},
+                                                    BEAMCURRENT=block("1.5")))
+
+        assert_that(histories.get("INST", "BEAMCURRENT"), is_(([1.0], [1.5])))
+        assert_that(histories.get("INST", "BEAMCURRENT", kind=CHANNEL_INST_PV), is_(([1.0], [150.0])))
+
+    def test_GIVEN_instrument_removed_WHEN_other_instrument_recorded_THEN_its_blocks_no_longer_count(self):
+        histories = BlockHistories(samples_per_block=10, max_blocks=1)
+        histories.record("INST", 1, instrument_data(TEMP1=block("1")))
+
+        histories.remove("INST")
+        histories.record("OTHER", 1, instrument_data(TEMP1=block("1")))
+
+        with self.assertRaises(ValueError):
+            histories.get("INST", "TEMP1")
+        assert_that(histories.get("OTHER", "TEMP1"), is_(([1.0], [1.0])))
+
+    def test_GIVEN_unknown_block_WHEN_get_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            BlockHistories().get("INST", "UNKNOWN")
@@ -0,0 +1,210 @@
+import os
+import sys
+from hamcrest import *
+import unittest
+
+from mock import Mock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from CaChannel import ca
+
+from external_webpage.channel_access_data_source_reader import ChannelAccessDataSourceReader, pv_prefix_for_host, \
+    ChannelAccessMonitors, CONFIG_PV
+from external_webpage.data_source_reader import SOURCE_CONFIG
+from external_webpage.instrument_information_collator import InstrumentInformationCollator
+from tests.data_mother import ConfigMother
+
+
+class FakeSubscription(object):
+    def __init__(self, ca_layer, pv_name):
+        self.ca_layer = ca_layer
+        self.pv_name = pv_name
+
+    def clear(self):
+        del self.ca_layer.callbacks[self.pv_name]
+
+
+class FakeCaLayer(object):
+    """
+    Channel access layer which records subscriptions so that tests can post updates to them.
+    """
+    def __init__(self):
+        self.callbacks = {}
+
+    def subscribe(self, pv_name, callback):
+        self.callbacks[pv_name] = callback
+        return FakeSubscription(self, pv_name)
+
+    def post(self, pv_name, *args):
+        self.callbacks[pv_name](*args)
+
+
+PREFIX = "TE:TEST:"
+
+
+class TestChannelAccessDataSourceReader(unittest.TestCase):
+
+    def setUp(self):
+        self.ca_layer = FakeCaLayer()
+        self.reader = ChannelAccessDataSourceReader("host", pv_prefix=PREFIX, ca_layer=self.ca_layer)
+        self.config = ConfigMother.create_config(blocks=[ConfigMother.create_block("BLOCK")])
+        self.read_config_patch = patch("external_webpage.data_source_reader.DataSourceReader.read_config",
+                                       return_value=self.config)
+        self.read_config = self.read_config_patch.start()
+
+    def tearDown(self):
+        self.read_config_patch.stop()
+
+    def test_GIVEN_config_with_block_WHEN_read_config_THEN_block_pv_monitored(self):
+        self.reader.read_config()
+
+        assert_that(self.ca_layer.callbacks, has_key(PREFIX + "CS:SB:BLOCK"))
+
+    def test_GIVEN_block_monitored_but_no_update_WHEN_get_blocks_THEN_block_is_disconnected(self):
+        self.reader.read_config()
+
+        page = self.reader.get_json_from_blocks_archive()
+
+        assert_that(page["Channels"], has_length(1))
+        assert_that(page["Channels"][0]["Connected"], is_(False))
+
+    def test_GIVEN_block_update_WHEN_get_blocks_THEN_block_has_new_value(self):
+        self.reader.read_config()
+
+        self.ca_layer.post(PREFIX + "CS:SB:BLOCK", True, 1.5, u"", u"mm", 3)
+        page = self.reader.get_json_from_blocks_archive()
+
+        assert_that(page["Channels"][0]["Connected"], is_(True))
+        assert_that(page["Channels"][0]["Current Value"],
+                    has_entries({"Value": 1.5, "Alarm": u"", "Units": u"mm", "Precision": 3}))
+
+    def test_GIVEN_block_removed_from_config_WHEN_read_config_THEN_block_no_longer_monitored(self):
+        self.reader.read_config()
+        self.config["blocks"] = []
+
+        self.reader.read_config()
+
+        assert_that(self.ca_layer.callbacks, not_(has_key(PREFIX + "CS:SB:BLOCK")))
+        assert_that(self.reader.get_json_from_blocks_archive()["Channels"], has_length(0))
+
+    def test_GIVEN_monitors_WHEN_collate_THEN_block_and_inst_pv_values_returned(self):
+        reader = self.reader
+        block = ConfigMother.create_block("BLOCK")
+        self.config["groups"] = [ConfigMother.create_group("group", [block["name"]])]
+        collator = InstrumentInformationCollator(reader=reader)
+        collator.collate()
+
+        self.ca_layer.post(PREFIX + "CS:SB:BLOCK", True, u"hello", u"", u"", None)
+        self.ca_layer.post(PREFIX + "DAE:RUNSTATE", True, u"RUNNING", u"", u"", None)
+        result = collator.collate()
+
+        assert_that(result["groups"]["group"]["BLOCK"]["value"], is_(u"hello"))
+        assert_that(result["inst_pvs"]["RUNSTATE"]["value"], is_(u"RUNNING"))
+
+    def test_GIVEN_monitors_WHEN_close_THEN_all_monitors_cleared(self):
+        self.reader.read_config()
+        self.reader.get_json_from_instrument_archive()
+
+        self.reader.close()
+
+        assert_that(self.ca_layer.callbacks, is_({}))
+
+    def test_GIVEN_change_listener_WHEN_block_updates_THEN_listener_called(self):
+        listener = Mock()
+        self.reader.set_change_listener(listener)
+        self.reader.read_config()
+
+        self.ca_layer.post(PREFIX + "CS:SB:BLOCK", True, 1.0, u"", u"mm", 3)
+
+        listener.assert_called_once_with()
+
+    def test_GIVEN_config_pv_unchanged_WHEN_read_config_again_THEN_config_not_fetched_again(self):
+        self.reader.read_config()
+        self.ca_layer.post(PREFIX + CONFIG_PV, True, "config details")
+        self.reader.read_config()
+
+        config = self.reader.read_config()
+
+        assert_that(self.read_config.call_count, is_(2))
+        assert_that(config, is_(self.config))
+
+    def test_GIVEN_config_pv_changes_WHEN_read_config_THEN_config_fetched_again_and_listener_called(self):
+        listener = Mock()
+        self.reader.set_change_listener(listener)
+        self.reader.read_config()
+        self.ca_layer.post(PREFIX + CONFIG_PV, True, "config details")
+        self.reader.read_config()
+
+        self.ca_layer.post(PREFIX + CONFIG_PV, True, "new config details")
+        self.reader.read_config()
+
+        assert_that(self.read_config.call_count, is_(3))
+        assert_that(listener.call_count, is_(2))
+
+    def test_GIVEN_config_pv_disconnected_WHEN_read_config_THEN_config_fetched_every_time(self):
+        self.reader.read_config()
+        self.ca_layer.post(PREFIX + CONFIG_PV, False)
+
+        self.reader.read_config()
+        self.reader.read_config()
+
+        assert_that(self.read_config.call_count, is_(3))
+
+    def test_GIVEN_config_fetch_fails_WHEN_read_config_again_THEN_config_fetched_again(self):
+        self.reader.read_config()
+        self.ca_layer.post(PREFIX + CONFIG_PV, True, "config details")
+        self.read_config.side_effect = [IOError("failed"), self.config]
+        with self.assertRaises(IOError):
+            self.reader.read_config()
+
+        self.reader.read_config()
+
+        assert_that(self.read_config.call_count, is_(3))
+
+    def test_GIVEN_source_timeouts_WHEN_get_config_page_THEN_requested_with_config_timeout(self):
+        reader = ChannelAccessDataSourceReader("host", pv_prefix=PREFIX, ca_layer=self.ca_layer,
+                                               source_timeouts={SOURCE_CONFIG: (1, 2)})
+
+        with patch("external_webpage.data_source_reader.requests.get") as get:
+            reader._get(SOURCE_CONFIG, "http://host:8008/")
+
+        get.assert_called_once_with("http://host:8008/", timeout=(1, 2))
+
+    def test_GIVEN_instrument_host_WHEN_get_prefix_THEN_instrument_prefix(self):
+        assert_that(pv_prefix_for_host("NDXLARMOR"), is_("IN:LARMOR:"))
+
+    def test_GIVEN_non_instrument_host_WHEN_get_prefix_THEN_test_prefix(self):
+        assert_that(pv_prefix_for_host("NDW1798"), is_("TE:NDW1798:"))
+
+
+class TestChannelMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.channel = Mock()
+        self.channel.field_type.return_value = ca.DBF_DOUBLE
+        self.ca_channel_patch = patch("external_webpage.channel_access_data_source_reader.CaChannel",
+                                      return_value=self.channel)
+        self.ca_channel_patch.start()
+        self.callback = Mock()
+        ChannelAccessMonitors().subscribe("PV", self.callback)
+        self.on_connection_change = self.channel.search_and_connect.call_args[0][1]
+
+    def tearDown(self):
+        self.ca_channel_patch.stop()
+
+    def test_GIVEN_channel_WHEN_connects_THEN_monitor_added(self):
+        self.on_connection_change((None, ca.CA_OP_CONN_UP), None)
+
+        assert_that(self.channel.add_masked_array_event.call_count, is_(1))
+
+    def test_GIVEN_channel_WHEN_disconnects_and_reconnects_THEN_monitor_added_only_once(self):
+        self.on_connection_change((None, ca.CA_OP_CONN_UP), None)
+        self.on_connection_change((None, ca.CA_OP_CONN_DOWN), None)
+        self.on_connection_change((None, ca.CA_OP_CONN_UP), None)
+
+        assert_that(self.channel.add_masked_array_event.call_count, is_(1))
+        self.callback.assert_called_once_with(False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+import time
+from hamcrest import *
+import unittest
+
+from mock import Mock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.data_source_reader import DataSourceReader, HedgePool, LatencyTracker, SOURCE_BLOCKS, \
+    SOURCE_CONFIG, MIN_LATENCY_SAMPLES_TO_HEDGE
+
+
+def page(value):
+    response = Mock()
+    response.json = Mock(return_value=value)
+    response.content = str(value)
+    return response
+
+
+class TestDataSourceReader(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch("external_webpage.data_source_reader.requests")
+        self.requests = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_GIVEN_default_timeouts_WHEN_get_blocks_THEN_request_has_timeout(self):
+        self.requests.get = Mock(return_value=page({}))
+        reader = DataSourceReader("host", timeout=(1, 2))
+
+        reader.get_json_from_blocks_archive()
+
+        assert_that(self.requests.get.call_args[1], has_entry("timeout", (1, 2)))
+
+    def test_GIVEN_timeout_for_config_source_WHEN_read_config_THEN_request_has_source_timeout(self):
+        self.requests.get = Mock(return_value=page({}))
+        reader = DataSourceReader("host", timeout=(1, 2), source_timeouts={SOURCE_CONFIG: (3, 4)})
+
+        reader.read_config()
+
+        assert_that(self.requests.get.call_args[1], has_entry("timeout", (3, 4)))
+
+    def test_GIVEN_hedged_source_with_no_latencies_WHEN_get_blocks_THEN_one_request_sent(self):
+        self.requests.get = Mock(return_value=page({"Channels": []}))
+        reader = DataSourceReader("host", hedged_sources=[SOURCE_BLOCKS])
+
+        result = reader.get_json_from_blocks_archive()
+
+        assert_that(result, is_({"Channels": []}))
+        assert_that(self.requests.get.call_count, is_(1))
+
+    def hedged_reader(self, get):
+        self.requests.get = get
+        reader = DataSourceReader("host", hedged_sources=[SOURCE_BLOCKS])
+        for _ in range(MIN_LATENCY_SAMPLES_TO_HEDGE):
+            reader._latencies[SOURCE_BLOCKS].add(0.01)
+        return reader
+
+    def test_GIVEN_hedged_source_and_first_request_answered_in_time_WHEN_get_blocks_THEN_no_hedged_request_sent(self):
+        reader = self.hedged_reader(Mock(return_value=page("first")))
+
+        result = reader.get_json_from_blocks_archive()
+        time.sleep(0.1)
+
+        assert_that(result, is_("first"))
+        assert_that(self.requests.get.call_count, is_(1))
+
+    def test_GIVEN_hedged_source_and_first_request_slow_WHEN_get_blocks_THEN_hedged_request_sent(self):
+        responses = [(0.5, page("slow")), (0, page("hedged"))]
+
+        def get(url, timeout):
+            delay, response = responses.pop(0)
+            time.sleep(delay)
+            return response
+        reader = self.hedged_reader(get)
+
+        result = reader.get_json_from_blocks_archive()
+
+        assert_that(result, is_("slow"))
+        assert_that(responses, is_([]))
+
+    def test_GIVEN_hedged_source_and_slow_first_request_fails_WHEN_get_blocks_THEN_hedged_request_answer_used(self):
+        responses = [(0.5, IOError("failed")), (0, page("hedged"))]
+
+        def get(url, timeout):
+            delay, response = responses.pop(0)
+            time.sleep(delay)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        reader = self.hedged_reader(get)
+
+        result = reader.get_json_from_blocks_archive()
+
+        assert_that(result, is_("hedged"))
+
+    def test_GIVEN_hedged_source_and_first_request_sent_on_calling_thread_WHEN_get_blocks_THEN_not_on_new_thread(self):
+        threads = []
+
+        def get(url, timeout):
+            threads.append(threading.current_thread())
+            return page("first")
+        reader = self.hedged_reader(get)
+
+        reader.get_json_from_blocks_archive()
+
+        assert_that(threads, is_([threading.current_thread()]))
+
+    def test_GIVEN_hedged_source_and_all_requests_fail_WHEN_get_blocks_THEN_error_raised(self):
+        def get(url, timeout):
+            time.sleep(0.1)
+            raise IOError("failed")
+        reader = self.hedged_reader(get)
+
+        with self.assertRaises(IOError):
+            reader.get_json_from_blocks_archive()
+
+
+class TestHedgePool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = HedgePool(size=1)
+
+    def test_GIVEN_request_scheduled_WHEN_due_THEN_request_sent_on_pool_thread(self):
+        sent = threading.Event()
+        threads = []
+
+        def request():
+            threads.append(threading.current_thread())
+            sent.set()
+        self.pool.schedule(0.05, request)
+
+        assert_that(sent.wait(5), is_(True))
+        assert_that(threads, is_not(has_item(threading.current_thread())))
+
+    def test_GIVEN_request_cancelled_before_due_WHEN_due_THEN_request_not_sent(self):
+        request = Mock()
+        sequence = self.pool.schedule(0.05, request)
+
+        cancelled = self.pool.cancel(sequence)
+        time.sleep(0.2)
+
+        assert_that(cancelled, is_(True))
+        request.assert_not_called()
+
+    def test_GIVEN_request_sent_WHEN_cancel_THEN_not_cancelled(self):
+        sent = threading.Event()
+        sequence = self.pool.schedule(0, sent.set)
+        sent.wait(5)
+
+        assert_that(self.pool.cancel(sequence), is_(False))
+
+
+class TestLatencyTracker(unittest.TestCase):
+
+    def test_GIVEN_too_few_latencies_WHEN_percentile_THEN_none(self):
+        tracker = LatencyTracker()
+        tracker.add(1)
+
+        assert_that(tracker.percentile(95, min_samples=2), is_(None))
+
+    def test_GIVEN_latencies_WHEN_percentile_THEN_percentile_returned(self):
+        tracker = LatencyTracker()
+        for latency in range(100):
+            tracker.add(latency)
+
+        assert_that(tracker.percentile(95), is_(95))
+
+    def test_GIVEN_more_latencies_than_size_WHEN_percentile_THEN_only_recent_latencies_used(self):
+        tracker = LatencyTracker(size=2)
+        for latency in [100, 1, 2]:
+            tracker.add(latency)
+
+        assert_that(tracker.percentile(100, min_samples=1), is_(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
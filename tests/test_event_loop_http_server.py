@@ -0,0 +1,184 @@
+import os
+import socket
+import sys
+import threading
+import time
+from hamcrest import *
+import unittest
+
+from mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.event_loop_http_server import EventLoopHTTPServer, MAX_POLL_CONNECTIONS, \
+    MAX_SELECT_CONNECTIONS
+
+
+def respond(path, client_address, headers):
+    if path == "/error":
+        raise ValueError("error")
+    if path == "/accept":
+        return 200, "accept {}".format(headers.get("accept")), "text/plain"
+    return 200, "response to {}".format(path), "text/plain"
+
+
+def read_responses(connection, count):
+    """
+    Read complete responses, relying on each having a content length.
+    """
+    data = ""
+    responses = []
+    while len(responses) < count:
+        header_end = data.find("\r\n\r\n")
+        if header_end >= 0:
+            header = data[:header_end]
+            length = int([line for line in header.split("\r\n") if line.startswith("Content-Length")][0].split(":")[1])
+            end = header_end + 4 + length
+            if len(data) >= end:
+                responses.append((header, data[header_end + 4:end]))
+                data = data[end:]
+                continue
+        received = connection.recv(4096)
+        if not received:
+            break
+        data += received
+    return responses
+
+
+def is_closed(connection):
+    try:
+        return connection.recv(1) == ""
+    except socket.error:
+        return True
+
+
+class TestEventLoopHTTPServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = EventLoopHTTPServer(("127.0.0.1", 0), respond, keep_alive_timeout=0.2)
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+
+        def stop():
+            self.server.shutdown()
+            thread.join()
+            self.server.server_close()
+        self.addCleanup(stop)
+
+    def connect(self):
+        connection = socket.create_connection(self.server.server_address, timeout=5)
+        self.addCleanup(connection.close)
+        return connection
+
+    def test_GIVEN_request_WHEN_served_THEN_response_has_body_and_content_length(self):
+        connection = self.connect()
+        connection.sendall("GET /?callback=a&Instrument=b HTTP/1.1\r\nHost: x\r\n\r\n")
+
+        header, body = read_responses(connection, 1)[0]
+
+        assert_that(header, starts_with("HTTP/1.1 200 OK"))
+        assert_that(header, contains_string("Connection: keep-alive"))
+        assert_that(body, is_("response to /?callback=a&Instrument=b"))
+
+    def test_GIVEN_request_with_headers_WHEN_served_THEN_headers_passed_by_lower_case_name(self):
+        connection = self.connect()
+        connection.sendall("GET /accept HTTP/1.1\r\nAccept: application/msgpack\r\n\r\n")
+
+        _, body = read_responses(connection, 1)[0]
+
+        assert_that(body, is_("accept application/msgpack"))
+
+    def test_GIVEN_max_connections_open_WHEN_another_connects_THEN_refused_with_service_unavailable(self):
+        self.server.max_connections = 2
+        open_connections = [self.connect() for _ in range(2)]
+        for connection in open_connections:
+            connection.sendall("GET /1 HTTP/1.1\r\n\r\n")
+            read_responses(connection, 1)
+
+        refused = self.connect()
+        header, _ = read_responses(refused, 1)[0]
+
+        assert_that(header, starts_with("HTTP/1.1 503"))
+        assert_that(is_closed(refused), is_(True))
+        assert_that(len(self.server.connections()), is_(2))
+
+    def test_GIVEN_persistent_connection_WHEN_several_requests_THEN_all_answered_in_order_on_same_connection(self):
+        connection = self.connect()
+
+        connection.sendall("GET /1 HTTP/1.1\r\n\r\nGET /2 HTTP/1.1\r\n\r\n")
+        first_responses = read_responses(connection, 2)
+        connection.sendall("GET /3 HTTP/1.1\r\n\r\n")
+        last_response = read_responses(connection, 1)
+
+        bodies = [body for _, body in first_responses + last_response]
+        assert_that(bodies, is_(["response to /1", "response to /2", "response to /3"]))
+
+    def test_GIVEN_connection_close_requested_WHEN_served_THEN_connection_closed_after_response(self):
+        connection = self.connect()
+        connection.sendall("GET /1 HTTP/1.1\r\nConnection: close\r\n\r\n")
+
+        header, _ = read_responses(connection, 1)[0]
+
+        assert_that(header, contains_string("Connection: close"))
+        assert_that(is_closed(connection), is_(True))
+
+    def test_GIVEN_http_1_0_request_WHEN_served_THEN_connection_closed_after_response(self):
+        connection = self.connect()
+        connection.sendall("GET /1 HTTP/1.0\r\n\r\n")
+
+        read_responses(connection, 1)
+
+        assert_that(is_closed(connection), is_(True))
+
+    def test_GIVEN_post_WHEN_served_THEN_method_not_allowed(self):
+        connection = self.connect()
+        connection.sendall("POST / HTTP/1.1\r\nContent-Length: 2\r\n\r\nab")
+
+        header, _ = read_responses(connection, 1)[0]
+
+        assert_that(header, starts_with("HTTP/1.1 405"))
+
+    def test_GIVEN_respond_raises_WHEN_served_THEN_internal_server_error(self):
+        connection = self.connect()
+        connection.sendall("GET /error HTTP/1.1\r\n\r\n")
+
+        header, _ = read_responses(connection, 1)[0]
+
+        assert_that(header, starts_with("HTTP/1.1 500"))
+
+    def test_GIVEN_connection_idle_longer_than_timeout_WHEN_serving_THEN_connection_closed(self):
+        connection = self.connect()
+        connection.sendall("GET /1 HTTP/1.1\r\n\r\n")
+        read_responses(connection, 1)
+
+        time.sleep(0.5)
+
+        assert_that(is_closed(connection), is_(True))
+
+    def test_GIVEN_many_idle_connections_WHEN_request_on_one_THEN_answered(self):
+        connections = [self.connect() for _ in range(200)]
+
+        connections[-1].sendall("GET /last HTTP/1.1\r\n\r\n")
+
+        assert_that(read_responses(connections[-1], 1)[0][1], is_("response to /last"))
+
+
+class TestEventLoopHTTPServerMaxConnections(unittest.TestCase):
+
+    def test_GIVEN_poll_used_WHEN_created_without_max_connections_THEN_poll_limit_used(self):
+        with patch("external_webpage.event_loop_http_server.USE_POLL", True):
+            server = EventLoopHTTPServer(("127.0.0.1", 0), respond)
+        self.addCleanup(server.server_close)
+
+        assert_that(server.max_connections, is_(MAX_POLL_CONNECTIONS))
+
+    def test_GIVEN_select_used_WHEN_created_without_max_connections_THEN_select_limit_used(self):
+        with patch("external_webpage.event_loop_http_server.USE_POLL", False):
+            server = EventLoopHTTPServer(("127.0.0.1", 0), respond)
+        self.addCleanup(server.server_close)
+
+        assert_that(server.max_connections, is_(MAX_SELECT_CONNECTIONS))
+
+
+if __name__ == '__main__':
+    unittest.main()
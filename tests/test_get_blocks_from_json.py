@@ -196,5 +196,25 @@ class TestBlocksFromJSON(unittest.TestCase):
 
         assert_that(result[expected_name].get_description()["value"], is_(expected_value))
 
+    def test_GIVEN_channels_and_wanted_predicate_WHEN_parse_THEN_only_wanted_blocks_returned(self):
+        expected_name = "BLOCK"
+        json = ArchiveMother.create_info_page(
+            [ArchiveMother.create_channel(name=expected_name), ArchiveMother.create_channel(name="OTHER")])
+        parser = WebPageParser()
+
+        result = parser.extract_blocks(json, lambda name: name == expected_name)
+
+        assert_that(result.keys(), is_([expected_name]))
+
+    def test_GIVEN_channels_and_wanted_name_set_WHEN_parse_THEN_only_wanted_blocks_returned(self):
+        expected_name = "BLOCK"
+        json = ArchiveMother.create_info_page(
+            [ArchiveMother.create_channel(name=expected_name), ArchiveMother.create_channel(name="OTHER")])
+        parser = WebPageParser()
+
+        result = parser.extract_blocks(json, {expected_name})
+
+        assert_that(result.keys(), is_([expected_name]))
+
 if __name__ == '__main__':
     unittest.main()
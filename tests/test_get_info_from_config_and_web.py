@@ -180,5 +180,40 @@ class TestGetInfoFromConfigAndWeb(unittest.TestCase):
 
         assert_that(result["groups"][group_name][block_name]["visibility"], is_(expected_is_visible))
 
+    def test_GIVEN_instrument_archive_has_pvs_which_are_not_required_WHEN_parse_THEN_they_are_not_in_inst_pvs(self):
+        channel_values = [ArchiveMother.create_channel(name="DAE:RUNSTATE.VAL", value="SETUP"),
+                          ArchiveMother.create_channel(name="DAE:NOT_REQUIRED.VAL")]
+        self.reader.get_json_from_instrument_archive = Mock(
+            return_value=ArchiveMother.create_info_page(channel_values))
+
+        result = self.scraper.collate()
+
+        assert_that(result["inst_pvs"].keys(), is_(["RUNSTATE"]))
+
+    def test_GIVEN_instrument_archive_has_unwanted_channels_WHEN_checking_channel_THEN_only_required_and_run_control_channels_are_wanted(self):
+
+        assert_that(self.scraper._is_wanted_inst_channel("RUNSTATE.VAL"), is_(True))
+        assert_that(self.scraper._is_wanted_inst_channel("DISPLAY.VAL"), is_(True))
+        assert_that(self.scraper._is_wanted_inst_channel("BLOCK:RC:LOW.VAL"), is_(True))
+        assert_that(self.scraper._is_wanted_inst_channel("NOT_REQUIRED.VAL"), is_(False))
+
+    def test_GIVEN_collate_WHEN_finished_THEN_stage_timings_recorded(self):
+        self.scraper.collate()
+
+        assert_that(self.scraper.last_stage_timings["stages"].keys(), has_items(
+            "read_config", "fetch_blocks_archive", "extract_blocks_archive", "fetch_dataweb_archive",
+            "extract_dataweb_archive", "fetch_instrument_archive", "extract_instrument_archive", "set_rc_values",
+            "get_inst_pvs", "format_inst_pvs", "format_blocks", "group_blocks"))
+        assert_that(self.scraper.last_stage_timings["total"], greater_than_or_equal_to(0))
+
+    def test_GIVEN_fetch_fails_WHEN_collate_THEN_stage_timings_recorded_up_to_failure(self):
+        self.reader.get_json_from_dataweb_archive = Mock(side_effect=IOError("failed"))
+
+        with self.assertRaises(IOError):
+            self.scraper.collate()
+
+        assert_that(self.scraper.last_stage_timings["stages"].keys(), is_(
+            ["read_config", "fetch_blocks_archive", "extract_blocks_archive", "fetch_dataweb_archive"]))
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,10 @@
 from hamcrest import *
 
 from external_webpage.request_handler_utils import get_instrument_and_callback, \
-    get_summary_details_of_all_instruments, get_detailed_state_of_specific_instrument
+    get_summary_details_of_all_instruments, get_detailed_state_of_specific_instrument, InstrumentSummaries, \
+    get_all_instruments_as_json, get_instruments_in_batch, get_detailed_state_of_instruments, get_projection, \
+    project_instrument_state, ProjectionCache, get_format, get_history_query
+from external_webpage.payload_formats import FORMATS
 import json
 import unittest
 
@@ -26,6 +29,11 @@ class TestHandlerUtils_InstrumentandCallback(unittest.TestCase):
         with self.assertRaises(ValueError):
             get_instrument_and_callback(INST_STR.format("test"))
 
+    def test_GIVEN_path_with_instrument_and_no_callback_WHEN_callback_not_required_THEN_callback_is_none(self):
+        result = get_instrument_and_callback(INST_STR.format("test"), callback_required=False)
+
+        assert_that(result, is_(("TEST", None)))
+
     def test_GIVEN_path_with_callback_and_empty_instrument_WHEN_get_instrument_and_callback_called_THEN_raises_error(self):
         with self.assertRaises(ValueError):
             get_instrument_and_callback(CALLBACK_AND_INST.format("test", ""))
@@ -62,6 +70,23 @@ class TestHandlerUtils_InstrumentandCallback(unittest.TestCase):
         inst, callback = get_instrument_and_callback(CALLBACK_AND_INST.format("test", exp_instrument))
         self.assertEqual(exp_instrument, inst)
 
+    def test_GIVEN_path_with_instrument_before_callback_WHEN_get_instrument_and_callback_called_THEN_both_returned(self):
+        inst, callback = get_instrument_and_callback("/?Instrument=larmor&callback=test")
+        assert_that((inst, callback), is_(("LARMOR", "test")))
+
+    def test_GIVEN_path_from_jquery_WHEN_get_instrument_and_callback_called_THEN_extra_parameters_ignored(self):
+        inst, callback = get_instrument_and_callback(
+            "/?callback=jQuery1113_1508400000000&Instrument=LARMOR&_=1508400000001")
+        assert_that((inst, callback), is_(("LARMOR", "jQuery1113_1508400000000")))
+
+    def test_GIVEN_path_with_url_encoded_instrument_WHEN_get_instrument_and_callback_called_THEN_instrument_decoded(self):
+        inst, callback = get_instrument_and_callback(CALLBACK_AND_INST.format("test", "emma%2Da"))
+        assert_that(inst, is_("EMMA-A"))
+
+    def test_GIVEN_path_with_callback_containing_script_WHEN_get_instrument_and_callback_called_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_instrument_and_callback(CALLBACK_AND_INST.format("alert(1);test", "test"))
+
 
 class TestHandlerUtils_IbexRunning(unittest.TestCase):
 
@@ -139,6 +164,54 @@ class TestHandlerUtils_IbexRunning(unittest.TestCase):
         assert_that(result, is_(expected_instrument_names))
 
 
+class TestHandlerUtils_InstrumentSummaries(unittest.TestCase):
+
+    def setUp(self):
+        self.summaries = InstrumentSummaries()
+
+    def test_GIVEN_instruments_updated_WHEN_as_ordered_dict_THEN_same_as_summary_of_all_instruments(self):
+        data = {"larmor": "", "IMAT": {"inst_pvs": {"RUNSTATE": {"value": "RUNNING"}}}, "Emma": "some_data"}
+        for instrument, instrument_data in data.items():
+            self.summaries.update(instrument, instrument_data)
+
+        result = self.summaries.as_ordered_dict()
+
+        assert_that(result, is_(get_summary_details_of_all_instruments(data)))
+        assert_that(list(result.keys()), is_(["Emma", "IMAT", "larmor"]))
+
+    def test_GIVEN_instrument_updated_again_WHEN_as_ordered_dict_THEN_latest_summary_returned_once(self):
+        self.summaries.update("TEST", "some_data")
+        self.summaries.update("TEST", "")
+
+        result = self.summaries.as_ordered_dict()
+
+        assert_that(list(result.keys()), is_(["TEST"]))
+        assert_that(result["TEST"], has_entry("is_up", False))
+
+    def test_GIVEN_summary_unchanged_WHEN_as_json_THEN_same_json_returned_without_encoding_again(self):
+        self.summaries.update("TEST", "some_data")
+        first_json = self.summaries.as_json()
+
+        self.summaries.update("TEST", "other_data")
+
+        assert_that(self.summaries.as_json(), is_(same_instance(first_json)))
+
+    def test_GIVEN_summary_changed_WHEN_as_json_THEN_new_summary_returned(self):
+        self.summaries.update("TEST", "some_data")
+        self.summaries.as_json()
+
+        self.summaries.update("TEST", "")
+
+        assert_that(json.loads(self.summaries.as_json())["TEST"], has_entry("is_up", False))
+
+    def test_GIVEN_error_and_summaries_WHEN_get_all_instruments_as_json_THEN_both_in_json(self):
+        self.summaries.update("TEST", "some_data")
+
+        result = json.loads(get_all_instruments_as_json("error", self.summaries.as_json()))
+
+        assert_that(result, is_({"error": "error", "instruments": {"TEST": {"is_up": True, "run_state": "UNKNOWN"}}}))
+
+
 class TestHandlerUtils_DetailedInstrumentState(unittest.TestCase):
 
     def test_GIVEN_instrument_not_in_data_WHEN_get_details_called_THEN_raises_error(self):
@@ -161,3 +234,153 @@ class TestHandlerUtils_DetailedInstrumentState(unittest.TestCase):
         out = get_detailed_state_of_specific_instrument(inst, data_dict)
 
         self.assertEqual(out, inst_data)
+
+
+class TestHandlerUtils_BatchOfInstruments(unittest.TestCase):
+
+    def test_GIVEN_single_instrument_WHEN_get_instruments_in_batch_THEN_none(self):
+        assert_that(get_instruments_in_batch("LARMOR"), is_(None))
+
+    def test_GIVEN_list_of_instruments_WHEN_get_instruments_in_batch_THEN_instruments_in_order_without_repeats(self):
+        assert_that(get_instruments_in_batch("LARMOR,IMAT,,LARMOR,EMMA-A"), is_(["LARMOR", "IMAT", "EMMA-A"]))
+
+    def test_GIVEN_instruments_with_data_WHEN_get_detailed_state_of_instruments_THEN_data_of_each_returned(self):
+        data = {"LARMOR": {"config_name": "larmor"}, "IMAT": {"config_name": "imat"}, "EMMA": {}}
+
+        result = get_detailed_state_of_instruments(["IMAT", "LARMOR"], data)
+
+        assert_that(list(result["instruments"].items()),
+                    is_([("IMAT", {"config_name": "imat"}), ("LARMOR", {"config_name": "larmor"})]))
+        assert_that(result["errors"], is_({}))
+
+    def test_GIVEN_unknown_and_unavailable_instruments_WHEN_get_detailed_state_of_instruments_THEN_errors_for_those(self):
+        data = {"LARMOR": {"config_name": "larmor"}, "IMAT": ""}
+
+        result = get_detailed_state_of_instruments(["LARMOR", "IMAT", "UNKNOWN"], data)
+
+        assert_that(result["instruments"], has_entries({"LARMOR": {"config_name": "larmor"}, "IMAT": None,
+                                                        "UNKNOWN": None}))
+        assert_that(result["errors"], has_entries({"IMAT": "Instrument has become unavailable",
+                                                   "UNKNOWN": "UNKNOWN not known"}))
+
+
+STATE = {"config_name": "config",
+         "groups": {"Temperatures": {"T1": {"value": "1"}}, "Other": {"B1": {"value": "2"}}},
+         "inst_pvs": {"RUNSTATE": {"value": "RUNNING"}}}
+
+
+class TestHandlerUtils_Projection(unittest.TestCase):
+
+    def test_GIVEN_path_without_projection_WHEN_get_projection_THEN_everything(self):
+        assert_that(get_projection("/?callback=a&Instrument=b"), is_((None, None)))
+
+    def test_GIVEN_path_with_fields_and_group_WHEN_get_projection_THEN_fields_sorted_and_group_decoded(self):
+        result = get_projection("/?callback=a&fields=inst_pvs,groups&Instrument=b&group=My%20Group")
+
+        assert_that(result, is_((("groups", "inst_pvs"), "My Group")))
+
+    def test_GIVEN_path_with_unknown_field_WHEN_get_projection_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_projection("/?callback=a&Instrument=b&fields=password")
+
+    def test_GIVEN_path_with_two_groups_WHEN_get_projection_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_projection("/?callback=a&Instrument=b&group=a&group=b")
+
+    def test_GIVEN_group_and_fields_without_groups_WHEN_get_projection_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_projection("/?callback=a&Instrument=b&fields=inst_pvs&group=Temperatures")
+
+    def test_GIVEN_group_and_fields_without_groups_WHEN_project_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            project_instrument_state(STATE, ("inst_pvs",), "Temperatures")
+
+    def test_GIVEN_fields_WHEN_project_THEN_only_those_fields_returned(self):
+        result = project_instrument_state(STATE, ("inst_pvs",), None)
+
+        assert_that(result, is_({"inst_pvs": {"RUNSTATE": {"value": "RUNNING"}}}))
+
+    def test_GIVEN_group_WHEN_project_THEN_only_that_group_returned_with_other_fields(self):
+        result = project_instrument_state(STATE, None, "Temperatures")
+
+        assert_that(result["groups"], is_({"Temperatures": {"T1": {"value": "1"}}}))
+        assert_that(result, has_entries({"config_name": "config", "inst_pvs": STATE["inst_pvs"]}))
+
+    def test_GIVEN_unknown_group_WHEN_project_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            project_instrument_state(STATE, None, "Unknown")
+
+    def test_GIVEN_projection_cached_WHEN_same_version_requested_THEN_cached_json_returned(self):
+        cache = ProjectionCache()
+        first = cache.get_json("INST", 1, STATE, ("inst_pvs",), None)
+
+        second = cache.get_json("INST", 1, {"inst_pvs": "changed"}, ("inst_pvs",), None)
+
+        assert_that(second, is_(same_instance(first)))
+
+    def test_GIVEN_projection_cached_WHEN_new_version_requested_THEN_projection_of_new_state_returned(self):
+        cache = ProjectionCache()
+        cache.get_json("INST", 1, STATE, ("inst_pvs",), None)
+
+        result = cache.get_json("INST", 2, {"inst_pvs": "changed"}, ("inst_pvs",), None)
+
+        assert_that(json.loads(result), is_({"inst_pvs": "changed"}))
+
+
+class TestHandlerUtils_Format(unittest.TestCase):
+
+    def test_GIVEN_path_without_format_WHEN_get_format_THEN_json(self):
+        assert_that(get_format("/?callback=a&Instrument=b"), is_("json"))
+
+    def test_GIVEN_path_with_compact_format_WHEN_get_format_THEN_compact(self):
+        assert_that(get_format("/?callback=a&format=compact&Instrument=b"), is_("compact"))
+
+    def test_GIVEN_path_with_unknown_format_WHEN_get_format_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_format("/?callback=a&Instrument=b&format=xml")
+
+    def test_GIVEN_path_with_two_formats_WHEN_get_format_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_format("/?callback=a&Instrument=b&format=json&format=compact")
+
+    def test_GIVEN_accept_header_with_msgpack_WHEN_get_format_THEN_msgpack_if_available(self):
+        result = get_format("/?callback=a&Instrument=b", "text/html, application/msgpack;q=0.9")
+
+        assert_that(result, is_("msgpack" if "msgpack" in FORMATS else "json"))
+
+    def test_GIVEN_accept_header_refusing_msgpack_WHEN_get_format_THEN_json(self):
+        assert_that(get_format("/?callback=a&Instrument=b", "application/msgpack; q=0"), is_("json"))
+
+    def test_GIVEN_accept_header_and_format_parameter_WHEN_get_format_THEN_parameter_used(self):
+        assert_that(get_format("/?callback=a&Instrument=b&format=compact", "application/msgpack"), is_("compact"))
+
+
+class TestHandlerUtils_HistoryQuery(unittest.TestCase):
+
+    def test_GIVEN_path_with_block_WHEN_get_history_query_THEN_block_decoded_and_no_limits(self):
+        assert_that(get_history_query("/history?callback=a&Instrument=b&block=My%20Block"),
+                    is_(("block", "My Block", None, None, "mean")))
+
+    def test_GIVEN_path_with_seconds_points_and_aggregate_WHEN_get_history_query_THEN_returned(self):
+        assert_that(get_history_query("/history?block=T&seconds=600&points=100&aggregate=lttb"),
+                    is_(("block", "T", 600.0, 100, "lttb")))
+
+    def test_GIVEN_path_with_inst_pv_WHEN_get_history_query_THEN_inst_pv_returned(self):
+        assert_that(get_history_query("/history?inst_pv=BEAMCURRENT"),
+                    is_(("inst_pv", "BEAMCURRENT", None, None, "mean")))
+
+    def test_GIVEN_path_with_block_and_inst_pv_WHEN_get_history_query_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_history_query("/history?block=T&inst_pv=BEAMCURRENT")
+
+    def test_GIVEN_path_with_unknown_aggregate_WHEN_get_history_query_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_history_query("/history?block=T&aggregate=median")
+
+    def test_GIVEN_path_without_block_WHEN_get_history_query_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_history_query("/history?callback=a&Instrument=b")
+
+    def test_GIVEN_path_with_invalid_points_WHEN_get_history_query_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_history_query("/history?block=T&points=0")
@@ -0,0 +1,115 @@
+import os
+import sys
+from hamcrest import *
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.history_aggregation import bucket_statistics, min_max_decimate, lttb, aggregate_history
+
+
+def python_lttb(times, values, points):
+    """
+    Largest triangle three buckets as a loop over every sample, to compare with.
+    """
+    count = len(times)
+    every = float(count - 2) / (points - 2)
+    kept = [0]
+    previous = 0
+    for bucket in range(points - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, count - 1) if bucket < points - 3 else count
+        next_start = end if bucket < points - 3 else count - 1
+        next_time = sum(times[next_start:next_end]) / (next_end - next_start)
+        next_value = sum(values[next_start:next_end]) / (next_end - next_start)
+        areas = [abs((times[previous] - next_time) * (values[index] - values[previous]) -
+                     (times[previous] - times[index]) * (next_value - values[previous])) for index in range(start, end)]
+        previous = start + areas.index(max(areas))
+        kept.append(previous)
+    kept.append(count - 1)
+    return kept
+
+
+class TestBucketStatistics(unittest.TestCase):
+
+    def test_GIVEN_samples_WHEN_bucket_statistics_THEN_mean_min_and_max_of_each_bucket(self):
+        result = bucket_statistics(np.arange(6.0), np.array([1.0, 5.0, 3.0, 2.0, 8.0, 4.0]), 2)
+
+        assert_that(result["times"].tolist(), is_([1.0, 4.0]))
+        assert_that(result["mean"].tolist(), is_([3.0, 14.0 / 3]))
+        assert_that(result["min"].tolist(), is_([1.0, 2.0]))
+        assert_that(result["max"].tolist(), is_([5.0, 8.0]))
+
+    def test_GIVEN_disconnected_samples_WHEN_bucket_statistics_THEN_ignored_and_empty_buckets_nan(self):
+        result = bucket_statistics(np.arange(4.0), np.array([np.nan, 2.0, np.nan, np.nan]), 2)
+
+        assert_that(result["mean"][0], is_(2.0))
+        assert_that(np.isnan([result["mean"][1], result["min"][1], result["max"][1]]).all(), is_(True))
+
+    def test_GIVEN_several_blocks_WHEN_bucket_statistics_THEN_each_block_aggregated_as_on_its_own(self):
+        times = np.arange(10.0)
+        values = np.random.RandomState(0).normal(size=(3, 10))
+
+        result = bucket_statistics(times, values, 4)
+
+        for row in range(3):
+            single = bucket_statistics(times, values[row], 4)
+            assert_that(np.allclose(result["mean"][row], single["mean"]), is_(True))
+            assert_that(np.array_equal(result["max"][row], single["max"]), is_(True))
+
+
+class TestMinMaxDecimate(unittest.TestCase):
+
+    def test_GIVEN_samples_WHEN_min_max_decimate_THEN_smallest_and_largest_of_each_bucket_in_time_order(self):
+        values = np.array([1.0, 5.0, 3.0, 9.0, 2.0, 4.0, 7.0, 6.0])
+
+        times, result = min_max_decimate(np.arange(8.0), values, 2)
+
+        assert_that(times.tolist(), is_([0.0, 3.0, 4.0, 6.0]))
+        assert_that(result.tolist(), is_([1.0, 9.0, 2.0, 7.0]))
+
+    def test_GIVEN_disconnected_samples_WHEN_min_max_decimate_THEN_not_kept(self):
+        times, result = min_max_decimate(np.arange(4.0), np.array([1.0, np.nan, 3.0, np.nan]), 1)
+
+        assert_that(result.tolist(), is_([1.0, 3.0]))
+
+
+class TestLttb(unittest.TestCase):
+
+    def test_GIVEN_samples_WHEN_lttb_THEN_same_samples_kept_as_loop_over_samples(self):
+        times = np.arange(1000.0)
+        values = np.cumsum(np.random.RandomState(1).normal(size=1000))
+
+        result_times, result_values = lttb(times, values, 50)
+
+        expected = python_lttb(times.tolist(), values.tolist(), 50)
+        assert_that(result_times.tolist(), is_([float(index) for index in expected]))
+        assert_that(result_values.tolist(), is_(values[expected].tolist()))
+
+    def test_GIVEN_peak_WHEN_lttb_THEN_peak_kept(self):
+        values = np.zeros(100)
+        values[37] = 10.0
+
+        _, result = lttb(np.arange(100.0), values, 10)
+
+        assert_that(result.max(), is_(10.0))
+
+    def test_GIVEN_fewer_than_three_points_WHEN_lttb_THEN_raises_error(self):
+        with self.assertRaises(ValueError):
+            lttb(np.arange(10.0), np.arange(10.0), 2)
+
+
+class TestAggregateHistory(unittest.TestCase):
+
+    def test_GIVEN_fewer_samples_than_points_WHEN_aggregate_mean_THEN_unchanged(self):
+        times, values = aggregate_history(np.arange(3.0), np.array([1.0, np.nan, 2.0]), 5)
+
+        assert_that(times.tolist(), is_([0.0, 1.0, 2.0]))
+        assert_that(len(values), is_(3))
+
+    def test_GIVEN_samples_WHEN_aggregate_min_max_THEN_at_most_points_returned(self):
+        times, values = aggregate_history(np.arange(100.0), np.sin(np.arange(100.0)), 10, "minmax")
+
+        assert_that(len(values), less_than_or_equal_to(10))
@@ -0,0 +1,131 @@
+import os
+import socket
+import sys
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from hamcrest import *
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.http_server_pool import PoolingMixIn
+from external_webpage.metrics import CONNECTIONS_REJECTED
+
+
+class PooledServer(PoolingMixIn, HTTPServer):
+    pass
+
+
+class BlockingHandler(BaseHTTPRequestHandler):
+    """
+    Handler which responds once the server's release event is set.
+    """
+    def do_GET(self):
+        self.server.handling.release()
+        self.server.release.wait(5)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write("ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def get(port):
+    connection = socket.create_connection(("127.0.0.1", port), timeout=5)
+    connection.sendall("GET / HTTP/1.0\r\n\r\n")
+    return connection
+
+
+def read_response(connection):
+    response = ""
+    while True:
+        data = connection.recv(4096)
+        if not data:
+            return response
+        response += data
+
+
+class TestPoolingMixIn(unittest.TestCase):
+
+    def setUp(self):
+        self.server = PooledServer(("127.0.0.1", 0), BlockingHandler)
+        self.server.pool_size = 1
+        self.server.queue_size = 1
+        self.server.release = threading.Event()
+        self.server.handling = threading.Semaphore(0)
+        self.port = self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        def stop():
+            self.server.release.set()
+            self.server.shutdown()
+            self.server.server_close()
+            self.server.stop_workers()
+        self.addCleanup(stop)
+        # keep the connections open until the server has stopped
+        self.connections = []
+
+    def get(self):
+        connection = get(self.port)
+        self.connections.append(connection)
+        return connection
+
+    def test_GIVEN_free_worker_WHEN_request_THEN_request_handled(self):
+        self.server.release.set()
+
+        response = read_response(self.get())
+
+        assert_that(response, starts_with("HTTP/1.0 200"))
+
+    def test_GIVEN_worker_busy_and_queue_not_full_WHEN_request_THEN_request_waits_then_handled(self):
+        busy = self.get()
+        self.server.handling.acquire()
+
+        waiting = self.get()
+        self.server.release.set()
+
+        assert_that(read_response(busy), starts_with("HTTP/1.0 200"))
+        assert_that(read_response(waiting), starts_with("HTTP/1.0 200"))
+
+    def test_GIVEN_worker_busy_and_queue_full_WHEN_request_THEN_rejected_with_service_unavailable(self):
+        rejections = CONNECTIONS_REJECTED.get(reason="queue_full")
+        busy = self.get()
+        self.server.handling.acquire()
+        waiting = self.get()
+
+        rejected = read_response(self.get())
+        self.server.release.set()
+
+        assert_that(rejected, starts_with("HTTP/1.1 503"))
+        assert_that(CONNECTIONS_REJECTED.get(reason="queue_full"), is_(rejections + 1))
+        assert_that(read_response(busy), starts_with("HTTP/1.0 200"))
+        assert_that(read_response(waiting), starts_with("HTTP/1.0 200"))
+
+    def test_GIVEN_not_keep_alive_WHEN_should_close_connections_THEN_true(self):
+        assert_that(self.server.should_close_connections(), is_(True))
+
+    def test_GIVEN_keep_alive_and_no_connections_waiting_WHEN_should_close_connections_THEN_false(self):
+        self.server.keep_alive = True
+
+        assert_that(self.server.should_close_connections(), is_(False))
+
+    def test_GIVEN_keep_alive_and_connection_waiting_WHEN_should_close_connections_THEN_true(self):
+        self.server.keep_alive = True
+        self.get()
+        self.server.handling.acquire()
+
+        self.get()
+        wait_for_waiting = threading.Event()
+        for _ in range(100):
+            if self.server.should_close_connections():
+                break
+            wait_for_waiting.wait(0.01)
+
+        assert_that(self.server.should_close_connections(), is_(True))
+
+
+if __name__ == '__main__':
+    unittest.main()
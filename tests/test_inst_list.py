@@ -8,10 +8,10 @@ from CaChannel import CaChannelException
 from hamcrest import *
 import unittest
 
-from mock import Mock
+from mock import Mock, patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from external_webpage.web_scrapper_manager import WebScrapperManager, InstList
+from external_webpage.web_scrapper_manager import WebScrapperManager, InstList, InstListChanges
 
 caget_error = None
 caget_value = ""
@@ -119,5 +119,59 @@ class TestInstList(unittest.TestCase):
         assert_that(list, is_({instrument: host_name}))
         assert_that(self.inst_list.error_on_retrieve, is_(InstList.INSTRUMENT_LIST_CAN_NOT_BE_READ))
 
+    def test_GIVEN_caget_value_unchanged_WHEN_retrive_THEN_cached_list_returned_without_decoding(self):
+        global caget_value, caget_error
+
+        instrument = "INST"
+        host_name = "NDXINST"
+        caget_value = self.compress_and_hex(json.dumps([{"pvPrefix": "IN:INST:", "hostName": host_name, "name": instrument}]))
+        first_list = self.inst_list.retrieve()
+
+        with patch.object(self.inst_list, "_dehex_and_decompress") as dehex:
+            list = self.inst_list.retrieve()
+
+        assert_that(list, is_(first_list))
+        assert_that(dehex.called, is_(False), "value decoded")
+        assert_that(self.inst_list.error_on_retrieve, is_(""))
+
+    def test_GIVEN_caget_value_changed_WHEN_retrive_THEN_new_list_returned(self):
+        global caget_value, caget_error
+
+        caget_value = self.compress_and_hex(json.dumps([{"pvPrefix": "IN:INST:", "hostName": "NDXINST", "name": "INST"}]))
+        self.inst_list.retrieve()
+        caget_value = self.compress_and_hex(json.dumps([{"pvPrefix": "IN:NEW:", "hostName": "NDXNEW", "name": "NEW"}]))
+
+        list = self.inst_list.retrieve()
+
+        assert_that(list, is_({"NEW": "NDXNEW"}))
+
+    def test_GIVEN_monitor_on_inst_list_WHEN_pv_changes_THEN_callback_called(self):
+        ca_layer = Mock()
+        callback = Mock()
+        inst_list = InstList(caget, ca_layer=ca_layer)
+        inst_list.monitor(callback)
+        pv_name, on_change = ca_layer.subscribe.call_args[0]
+
+        on_change(True, "value")
+
+        assert_that(pv_name, is_("CS:INSTLIST"))
+        callback.assert_called_once_with()
+
+
+class TestInstListChanges(unittest.TestCase):
+
+    def test_GIVEN_same_lists_WHEN_compared_THEN_no_changes(self):
+        changes = InstListChanges({"INST": "host"}, {"INST": "host"})
+
+        assert_that(bool(changes), is_(False))
+
+    def test_GIVEN_instrument_added_removed_and_rehosted_WHEN_compared_THEN_changes_listed(self):
+        changes = InstListChanges({"OLD": "old_host", "MOVED": "host1"}, {"NEW": "new_host", "MOVED": "host2"})
+
+        assert_that(bool(changes), is_(True))
+        assert_that(changes.added, is_({"NEW": "new_host"}))
+        assert_that(changes.removed, is_({"OLD": "old_host"}))
+        assert_that(changes.rehosted, is_({"MOVED": ("host1", "host2")}))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import threading
+from hamcrest import *
+import unittest
+from timeit import default_timer
+
+from mock import Mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.instrument_scapper import InstrumentScrape, InstrumentScrapper, WAIT_AFTER_CHANGE
+
+
+class TestInstrumentScrape(unittest.TestCase):
+
+    def test_GIVEN_on_change_WHEN_created_THEN_reader_told_to_call_it_on_changes(self):
+        reader_class = Mock()
+        on_change = Mock()
+
+        InstrumentScrape("inst", "host", reader_class, on_change=on_change)
+
+        reader_class.return_value.set_change_listener.assert_called_once_with(on_change)
+
+
+class TestInstrumentScrapper(unittest.TestCase):
+
+    def setUp(self):
+        self.scrapper = InstrumentScrapper("inst", "host", Mock())
+
+    def wait_timed(self, seconds):
+        start_time = default_timer()
+        self.scrapper.wait(seconds)
+        return default_timer() - start_time
+
+    def test_GIVEN_information_changes_WHEN_waiting_THEN_wait_ends_after_wait_after_change(self):
+        timer = threading.Timer(0.05, self.scrapper._wake_event.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        waited = self.wait_timed(10)
+
+        assert_that(waited, close_to(0.05 + WAIT_AFTER_CHANGE, 0.25))
+
+    def test_GIVEN_changed_while_scraping_WHEN_wait_THEN_wait_ends_without_full_wait_and_next_wait_is_full(self):
+        self.scrapper._wake_event.set()
+
+        first_wait = self.wait_timed(10)
+        second_wait = self.wait_timed(0.1)
+
+        assert_that(first_wait, less_than(WAIT_AFTER_CHANGE + 0.25))
+        assert_that(second_wait, greater_than_or_equal_to(0.09))
+
+    def test_GIVEN_stopped_WHEN_waiting_THEN_wait_ends_at_once(self):
+        timer = threading.Timer(0.05, self.scrapper.stop)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        waited = self.wait_timed(10)
+
+        assert_that(waited, less_than(WAIT_AFTER_CHANGE))
+
+
+if __name__ == '__main__':
+    unittest.main()
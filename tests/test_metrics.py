@@ -0,0 +1,127 @@
+import os
+import sys
+from threading import Lock
+from hamcrest import *
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.metrics import Counter, Gauge, Histogram, MetricsRegistry, StageTimer, acquire_timed
+
+
+class TestCounter(unittest.TestCase):
+
+    def test_GIVEN_counter_incremented_WHEN_rendered_THEN_count_for_labels_returned(self):
+        counter = Counter("requests_total", "Requests.", ["instrument"])
+        counter.inc(instrument="LARMOR")
+        counter.inc(2, instrument="LARMOR")
+
+        result = counter.render()
+
+        assert_that(result, is_(["# HELP requests_total Requests.",
+                                 "# TYPE requests_total counter",
+                                 'requests_total{instrument="LARMOR"} 3']))
+
+    def test_GIVEN_label_value_with_quote_WHEN_rendered_THEN_quote_escaped(self):
+        counter = Counter("requests_total", "Requests.", ["instrument"])
+        counter.inc(instrument='a"b')
+
+        result = counter.render()
+
+        assert_that(result[2], is_('requests_total{instrument="a\\"b"} 1'))
+
+    def test_GIVEN_wrong_labels_WHEN_incremented_THEN_error(self):
+        counter = Counter("requests_total", "Requests.", ["instrument"])
+
+        with self.assertRaises(ValueError):
+            counter.inc(host="host")
+
+
+class TestGauge(unittest.TestCase):
+
+    def test_GIVEN_gauge_set_WHEN_rendered_THEN_last_value_for_labels_returned(self):
+        gauge = Gauge("throttled", "Throttled.", ["client"])
+        gauge.set(3, client="a")
+        gauge.set(2, client="a")
+
+        result = gauge.render()
+
+        assert_that(result, is_(["# HELP throttled Throttled.",
+                                 "# TYPE throttled gauge",
+                                 'throttled{client="a"} 2']))
+
+    def test_GIVEN_gauge_values_replaced_WHEN_rendered_THEN_only_new_values_returned(self):
+        gauge = Gauge("throttled", "Throttled.", ["client"])
+        gauge.set(3, client="a")
+
+        gauge.replace([({"client": "b"}, 5)])
+
+        assert_that(gauge.render()[2:], is_(['throttled{client="b"} 5']))
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_GIVEN_observations_WHEN_rendered_THEN_cumulative_buckets_sum_and_count_returned(self):
+        histogram = Histogram("collate_seconds", "Collate time.", buckets=[0.1, 1])
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        result = histogram.render()
+
+        assert_that(result[2:], is_(['collate_seconds_bucket{le="0.1"} 1',
+                                     'collate_seconds_bucket{le="1.0"} 2',
+                                     'collate_seconds_bucket{le="+Inf"} 3',
+                                     'collate_seconds_sum 5.55',
+                                     'collate_seconds_count 3']))
+
+    def test_GIVEN_timed_block_WHEN_run_THEN_observation_made(self):
+        histogram = Histogram("collate_seconds", "Collate time.", ["instrument"])
+
+        with histogram.time(instrument="LARMOR"):
+            pass
+
+        assert_that(histogram.get_count(instrument="LARMOR"), is_(1))
+
+    def test_GIVEN_timed_lock_WHEN_acquired_THEN_wait_observed_and_lock_released_after(self):
+        histogram = Histogram("lock_wait_seconds", "Lock wait.", ["user"])
+        lock = Lock()
+
+        with acquire_timed(lock, histogram, user="handler"):
+            assert_that(lock.locked(), is_(True))
+
+        assert_that(lock.locked(), is_(False))
+        assert_that(histogram.get_count(user="handler"), is_(1))
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_GIVEN_registered_metrics_WHEN_rendered_THEN_all_metrics_in_text(self):
+        registry = MetricsRegistry()
+        registry.register(Counter("a_total", "A.")).inc()
+        registry.register(Counter("b_total", "B.")).inc()
+
+        result = registry.render()
+
+        assert_that(result, contains_string("a_total 1\n"))
+        assert_that(result, contains_string("b_total 1\n"))
+
+
+class TestStageTimer(unittest.TestCase):
+
+    def test_GIVEN_stages_WHEN_as_dict_THEN_stages_in_order_with_repeated_stages_added(self):
+        timer = StageTimer()
+
+        with timer.stage("fetch"):
+            pass
+        with timer.stage("parse"):
+            pass
+        with timer.stage("fetch"):
+            pass
+        result = timer.as_dict()
+
+        assert_that(result["stages"].keys(), is_(["fetch", "parse"]))
+        assert_that(result["total"], greater_than_or_equal_to(sum(result["stages"].values())))
+
+
+if __name__ == '__main__':
+    unittest.main()
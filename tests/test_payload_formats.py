@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+from hamcrest import *
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.payload_formats import to_compact, to_compact_block_row, encode_instrument_data, \
+    FORMAT_COMPACT, FORMAT_JSON, FORMAT_MSGPACK, COMPACT_SCHEMA_VERSION
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def block(value, status="Connected", alarm="", visibility=True):
+    return {"value": value, "status": status, "alarm": alarm, "visibility": visibility}
+
+
+def decode_compact(compact):
+    """
+    Decode the compact format as the web page does.
+    """
+    def decode_rows(rows):
+        blocks = {}
+        for row in rows:
+            description = {}
+            for index, field in enumerate(compact["fields"]):
+                value = row[index + 1] if index + 1 < len(row) else None
+                if value is None:
+                    if field not in compact["defaults"]:
+                        continue
+                    value = compact["defaults"][field]
+                description[field] = value
+            blocks[row[0]] = description
+        return blocks
+
+    return {"config_name": compact["config_name"],
+            "groups": {name: decode_rows(rows) for name, rows in compact["groups"]},
+            "inst_pvs": decode_rows(compact["inst_pvs"])}
+
+
+class TestPayloadFormats(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {
+            "config_name": "config",
+            "groups": {
+                "Temperatures": {"TEMP1": block("1.5"), "TEMP2": block("null", "Disconnected", "INVALID", False)},
+                "NONE": {}},
+            "inst_pvs": {"RUNSTATE": block("SETUP"), "TITLE": block("title", alarm="MINOR")}}
+
+    def test_GIVEN_block_with_default_values_WHEN_to_compact_block_row_THEN_only_name_and_value(self):
+        result = to_compact_block_row("TEMP1", block("1.5"))
+
+        assert_that(result, is_(["TEMP1", "1.5"]))
+
+    def test_GIVEN_block_with_non_default_alarm_WHEN_to_compact_block_row_THEN_earlier_defaults_are_null(self):
+        result = to_compact_block_row("TEMP1", block("1.5", alarm="MAJOR"))
+
+        assert_that(result, is_(["TEMP1", "1.5", None, "MAJOR"]))
+
+    def test_GIVEN_block_with_run_control_values_WHEN_to_compact_block_row_THEN_run_control_values_included(self):
+        description = block("1.5")
+        description.update({"rc_low": 0, "rc_high": 2, "rc_inrange": True, "rc_enabled": "YES"})
+
+        result = to_compact_block_row("TEMP1", description)
+
+        assert_that(result, is_(["TEMP1", "1.5", None, None, None, 0, 2, True, "YES"]))
+
+    def test_GIVEN_instrument_data_WHEN_to_compact_THEN_schema_version_set(self):
+        result = to_compact(self.data)
+
+        assert_that(result["schema"], is_(COMPACT_SCHEMA_VERSION))
+
+    def test_GIVEN_instrument_data_WHEN_to_compact_and_decoded_THEN_same_as_data(self):
+        result = decode_compact(json.loads(json.dumps(to_compact(self.data))))
+
+        assert_that(result, is_(self.data))
+
+    def test_GIVEN_stale_instrument_data_WHEN_to_compact_THEN_flagged_as_stale(self):
+        self.data["stale"] = True
+
+        result = to_compact(self.data)
+
+        assert_that(result["stale"], is_(True))
+
+    def test_GIVEN_instrument_data_WHEN_encoded_THEN_json_format_is_the_data(self):
+        result = encode_instrument_data(self.data)
+
+        assert_that(json.loads(result[FORMAT_JSON]), is_(self.data))
+
+    def test_GIVEN_instrument_data_WHEN_encoded_THEN_compact_format_is_smaller(self):
+        self.data["groups"]["Many"] = {"BLOCK{}".format(index): block(str(index)) for index in range(100)}
+
+        result = encode_instrument_data(self.data)
+
+        assert_that(len(result[FORMAT_COMPACT]), less_than(len(result[FORMAT_JSON]) / 2))
+
+    @unittest.skipUnless(msgpack, "msgpack is not installed")
+    def test_GIVEN_instrument_data_WHEN_encoded_THEN_msgpack_format_decodes_to_the_data(self):
+        result = encode_instrument_data(self.data)
+
+        assert_that(msgpack.unpackb(result[FORMAT_MSGPACK], raw=False), is_(self.data))
+
+    @unittest.skipIf(msgpack, "msgpack is installed")
+    def test_GIVEN_msgpack_not_installed_WHEN_encoded_THEN_no_msgpack_format(self):
+        result = encode_instrument_data(self.data)
+
+        assert_that(result, is_not(has_key(FORMAT_MSGPACK)))
+
+    def test_GIVEN_unavailable_instrument_WHEN_encoded_THEN_nothing_encoded(self):
+        result = encode_instrument_data("")
+
+        assert_that(result, is_({}))
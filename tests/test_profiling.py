@@ -0,0 +1,56 @@
+import os
+import shutil
+import sys
+import tempfile
+from hamcrest import *
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.profiling import ThreadProfiler
+
+
+def work():
+    return sum(range(1000))
+
+
+class TestThreadProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.output_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_directory)
+        self.profiler = ThreadProfiler(self.output_directory)
+
+    def test_GIVEN_profiler_not_started_WHEN_profile_THEN_nothing_recorded(self):
+        with self.profiler.profile():
+            work()
+
+        assert_that(self.profiler.is_active(), is_(False))
+        assert_that(self.profiler.finish(), is_(None))
+
+    def test_GIVEN_profiler_started_WHEN_work_profiled_and_finished_THEN_stats_and_summary_written(self):
+        self.profiler.start(60)
+
+        with self.profiler.profile():
+            work()
+        output_path = self.profiler.finish()
+
+        assert_that(os.path.exists(output_path + ".pstats"), is_(True))
+        with open(output_path + ".txt") as summary_file:
+            assert_that(summary_file.read(), contains_string("work"))
+        assert_that(self.profiler.is_active(), is_(False))
+
+    def test_GIVEN_profiler_started_WHEN_started_again_THEN_not_started(self):
+        self.profiler.start(60)
+
+        result = self.profiler.start(60)
+
+        assert_that(result, is_(None))
+        self.profiler.finish()
+
+    def test_GIVEN_too_long_a_time_WHEN_started_THEN_error(self):
+        with self.assertRaises(ValueError):
+            self.profiler.start(100000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import os
+import sys
+import threading
+import time
+from hamcrest import *
+import unittest
+
+from mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage.scrapper_pool import ScrapperPool
+
+
+class FakeInstrumentScrape(object):
+    """
+    Instrument scrape which records when it was scraped.
+    """
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+    scrapes = []
+
+    def __init__(self, name, host, reader_class, on_change=None):
+        self.name = name
+        self.on_change = on_change
+        self.closed = False
+        self.wait_time = 0
+
+    def scrape(self):
+        with FakeInstrumentScrape.lock:
+            FakeInstrumentScrape.running += 1
+            FakeInstrumentScrape.max_running = max(FakeInstrumentScrape.max_running, FakeInstrumentScrape.running)
+            FakeInstrumentScrape.scrapes.append(self.name)
+        time.sleep(0.01)
+        with FakeInstrumentScrape.lock:
+            FakeInstrumentScrape.running -= 1
+        return self.wait_time
+
+    def close(self):
+        self.closed = True
+
+
+def wait_for(condition, timeout=5):
+    end_time = time.time() + timeout
+    while not condition() and time.time() < end_time:
+        time.sleep(0.01)
+
+
+class TestScrapperPool(unittest.TestCase):
+
+    def setUp(self):
+        FakeInstrumentScrape.running = 0
+        FakeInstrumentScrape.max_running = 0
+        FakeInstrumentScrape.scrapes = []
+        patcher = patch("external_webpage.scrapper_pool.InstrumentScrape", FakeInstrumentScrape)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_pool(self, size):
+        pool = ScrapperPool(size)
+        pool.start()
+
+        def stop_pool():
+            pool.stop()
+            pool.join()
+        self.addCleanup(stop_pool)
+        return pool
+
+    def test_GIVEN_pool_with_scrappers_WHEN_running_THEN_all_instruments_scraped_repeatedly(self):
+        pool = self.create_pool(2)
+        for name in ["inst1", "inst2", "inst3"]:
+            pool.create_scrapper(name, "host").start()
+
+        wait_for(lambda: len(FakeInstrumentScrape.scrapes) >= 9)
+
+        for name in ["inst1", "inst2", "inst3"]:
+            assert_that(FakeInstrumentScrape.scrapes.count(name), greater_than(1))
+
+    def test_GIVEN_pool_with_more_instruments_than_workers_WHEN_running_THEN_scrapes_limited_to_pool_size(self):
+        pool = self.create_pool(2)
+        for index in range(6):
+            pool.create_scrapper("inst{}".format(index), "host").start()
+
+        wait_for(lambda: len(FakeInstrumentScrape.scrapes) >= 20)
+
+        assert_that(FakeInstrumentScrape.max_running, less_than_or_equal_to(2))
+
+    def test_GIVEN_scrapper_stopped_WHEN_running_THEN_instrument_no_longer_scraped_and_scrape_closed(self):
+        pool = self.create_pool(1)
+        scrapper = pool.create_scrapper("inst", "host")
+        scrapper.start()
+        wait_for(lambda: len(FakeInstrumentScrape.scrapes) > 0)
+
+        scrapper.stop()
+        wait_for(lambda: scrapper.instrument_scrape.closed)
+        scrapes_after_stop = len(FakeInstrumentScrape.scrapes)
+        time.sleep(0.05)
+
+        assert_that(scrapper.is_alive(), is_(False))
+        assert_that(scrapper.instrument_scrape.closed, is_(True))
+        assert_that(len(FakeInstrumentScrape.scrapes), is_(scrapes_after_stop))
+
+    def test_GIVEN_scrapper_due_later_WHEN_running_THEN_earlier_due_instrument_scraped_first(self):
+        pool = ScrapperPool(1)
+        later = pool.create_scrapper("later", "host")
+        later.instrument_scrape = FakeInstrumentScrape("later", "host", None)
+        pool.schedule(later, 0.2)
+        sooner = pool.create_scrapper("sooner", "host")
+        sooner.instrument_scrape = FakeInstrumentScrape("sooner", "host", None)
+        sooner.instrument_scrape.wait_time = 10
+        pool.schedule(sooner, 0)
+        pool.start()
+        self.addCleanup(pool.join)
+        self.addCleanup(pool.stop)
+
+        wait_for(lambda: len(FakeInstrumentScrape.scrapes) >= 2)
+
+        assert_that(FakeInstrumentScrape.scrapes[:2], is_(["sooner", "later"]))
+
+    def create_scheduled_scrapper(self, pool, wait_time, delay):
+        scrapper = pool.create_scrapper("inst", "host")
+        scrapper.instrument_scrape = FakeInstrumentScrape("inst", "host", None)
+        scrapper.instrument_scrape.wait_time = wait_time
+        pool.schedule(scrapper, delay)
+        return scrapper
+
+    def test_GIVEN_scrapper_due_later_WHEN_instrument_changes_THEN_scraped_soon(self):
+        pool = ScrapperPool(1)
+        scrapper = self.create_scheduled_scrapper(pool, wait_time=60, delay=0)
+        pool.start()
+        self.addCleanup(pool.join)
+        self.addCleanup(pool.stop)
+        wait_for(lambda: len(FakeInstrumentScrape.scrapes) >= 1)
+
+        pool.scrape_soon(scrapper)
+        wait_for(lambda: len(FakeInstrumentScrape.scrapes) >= 2)
+
+        assert_that(FakeInstrumentScrape.scrapes, is_(["inst", "inst"]))
+
+    def test_GIVEN_scrapper_rescheduled_WHEN_running_THEN_out_of_date_entry_skipped(self):
+        pool = ScrapperPool(1)
+        scrapper = self.create_scheduled_scrapper(pool, wait_time=60, delay=0)
+        pool.schedule(scrapper, 0.05)
+        pool.start()
+        self.addCleanup(pool.join)
+        self.addCleanup(pool.stop)
+
+        time.sleep(0.2)
+
+        assert_that(FakeInstrumentScrape.scrapes, is_(["inst"]))
+
+    def test_GIVEN_queued_scrapper_WHEN_stopped_THEN_closed_at_once(self):
+        pool = ScrapperPool(1)
+        scrapper = self.create_scheduled_scrapper(pool, wait_time=60, delay=60)
+
+        scrapper.stop()
+
+        assert_that(scrapper.instrument_scrape.closed, is_(True))
+
+    def test_GIVEN_scrapper_replaced_by_scrapper_for_new_host_WHEN_running_THEN_only_new_scrapper_scraped(self):
+        pool = ScrapperPool(1)
+        old = self.create_scheduled_scrapper(pool, wait_time=60, delay=0.05)
+        old.stop()
+        new = pool.create_scrapper("inst", "new_host")
+        new.instrument_scrape = FakeInstrumentScrape("new", "new_host", None)
+        new.instrument_scrape.wait_time = 60
+        pool.schedule(new, 0.05)
+        pool.start()
+        self.addCleanup(pool.join)
+        self.addCleanup(pool.stop)
+
+        time.sleep(0.2)
+
+        assert_that(FakeInstrumentScrape.scrapes, is_(["new"]))
+
+    def test_GIVEN_queued_scrappers_WHEN_pool_stopped_THEN_scrappers_closed(self):
+        pool = ScrapperPool(1)
+        scrappers = [self.create_scheduled_scrapper(pool, wait_time=60, delay=60) for _ in range(2)]
+
+        pool.stop()
+
+        assert_that([scrapper.instrument_scrape.closed for scrapper in scrappers], is_([True, True]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import shutil
+import sys
+import tempfile
+from hamcrest import *
+from mock import patch
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from external_webpage import instrument_scapper
+from external_webpage.snapshot import save_snapshot, load_snapshot, SnapshotWriter, SNAPSHOT_VERSION
+
+INSTRUMENTS = {"LARMOR": {"config_name": "config", "groups": {}, "inst_pvs": {"RUNSTATE": {"value": "SETUP"}}}}
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "scraped_data.snapshot")
+
+    def test_GIVEN_saved_snapshot_WHEN_loaded_THEN_same_time_and_instruments(self):
+        save_snapshot(self.path, INSTRUMENTS, 1000.0)
+
+        result = load_snapshot(self.path)
+
+        assert_that(result, is_((1000.0, INSTRUMENTS)))
+
+    def test_GIVEN_existing_snapshot_WHEN_saved_THEN_replaced_and_no_temporary_file_left(self):
+        save_snapshot(self.path, {}, 1000.0)
+
+        save_snapshot(self.path, INSTRUMENTS, 2000.0)
+
+        assert_that(load_snapshot(self.path), is_((2000.0, INSTRUMENTS)))
+        assert_that(os.listdir(self.directory), is_(["scraped_data.snapshot"]))
+
+    def test_GIVEN_rename_over_existing_file_fails_as_on_windows_WHEN_saved_THEN_replaced(self):
+        save_snapshot(self.path, {}, 1000.0)
+        rename = os.rename
+        calls = []
+
+        def windows_rename(source, destination):
+            calls.append(source)
+            if os.path.exists(destination):
+                raise OSError("File exists")
+            rename(source, destination)
+
+        with patch("os.rename", side_effect=windows_rename):
+            save_snapshot(self.path, INSTRUMENTS, 2000.0)
+
+        assert_that(len(calls), is_(2))
+        assert_that(load_snapshot(self.path), is_((2000.0, INSTRUMENTS)))
+
+    def test_GIVEN_no_snapshot_WHEN_loaded_THEN_none(self):
+        assert_that(load_snapshot(self.path), is_(None))
+
+    def test_GIVEN_corrupt_snapshot_WHEN_loaded_THEN_none(self):
+        with open(self.path, "wb") as snapshot_file:
+            snapshot_file.write("not a snapshot")
+
+        assert_that(load_snapshot(self.path), is_(None))
+
+    def test_GIVEN_snapshot_of_other_version_WHEN_loaded_THEN_none(self):
+        with patch("external_webpage.snapshot.SNAPSHOT_VERSION", SNAPSHOT_VERSION + 1):
+            save_snapshot(self.path, INSTRUMENTS)
+
+        assert_that(load_snapshot(self.path), is_(None))
+
+    def test_GIVEN_data_unchanged_WHEN_writer_saves_again_THEN_snapshot_not_rewritten(self):
+        writer = SnapshotWriter(self.path, lambda: (INSTRUMENTS, 1))
+        writer.save()
+        os.remove(self.path)
+
+        writer.save()
+
+        assert_that(os.path.exists(self.path), is_(False))
+
+    def test_GIVEN_data_changed_WHEN_writer_saves_again_THEN_snapshot_rewritten(self):
+        changes = [1]
+        writer = SnapshotWriter(self.path, lambda: (INSTRUMENTS, changes[0]))
+        writer.save()
+        os.remove(self.path)
+        changes[0] = 2
+
+        writer.save()
+
+        assert_that(load_snapshot(self.path)[1], is_(INSTRUMENTS))
+
+
+class TestPublishSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(self.clear)
+
+    def clear(self):
+        for name in ("LARMOR", "IMAT"):
+            instrument_scapper.scraped_data.pop(name, None)
+            instrument_scapper.encoded_data.pop(name, None)
+            instrument_scapper.scraped_data_versions.pop(name, None)
+            instrument_scapper.instrument_summaries.remove(name)
+
+    def test_GIVEN_snapshot_WHEN_published_THEN_data_served_flagged_as_stale(self):
+        instrument_scapper.publish_snapshot(INSTRUMENTS)
+
+        assert_that(instrument_scapper.scraped_data["LARMOR"], has_entries(stale=True, config_name="config"))
+        assert_that(instrument_scapper.encoded_data["LARMOR"]["json"], contains_string('"stale": true'))
+
+    def test_GIVEN_instrument_already_scraped_WHEN_snapshot_published_THEN_scraped_data_kept(self):
+        instrument_scapper.scraped_data["LARMOR"] = "scraped"
+
+        instrument_scapper.publish_snapshot(INSTRUMENTS)
+
+        assert_that(instrument_scapper.scraped_data["LARMOR"], is_("scraped"))
+
+    def test_GIVEN_scraped_data_WHEN_get_snapshot_THEN_unavailable_instruments_left_out(self):
+        instrument_scapper.publish_snapshot(INSTRUMENTS)
+        instrument_scapper.scraped_data["IMAT"] = ""
+
+        instruments, _ = instrument_scapper.get_scraped_data_snapshot()
+
+        assert_that(instruments, has_key("LARMOR"))
+        assert_that(instruments, is_not(has_key("IMAT")))
+
+    def test_GIVEN_snapshot_of_instrument_not_on_list_WHEN_discard_stale_THEN_instrument_no_longer_served(self):
+        instrument_scapper.publish_snapshot(INSTRUMENTS)
+
+        instrument_scapper.discard_stale_instruments({"IMAT": "NDXIMAT"})
+
+        assert_that(instrument_scapper.scraped_data, is_not(has_key("LARMOR")))
+        assert_that(instrument_scapper.encoded_data, is_not(has_key("LARMOR")))
+        assert_that(instrument_scapper.instrument_summaries.as_ordered_dict(), is_not(has_key("LARMOR")))
+
+    def test_GIVEN_snapshot_of_instrument_not_on_list_WHEN_discard_stale_THEN_block_histories_removed(self):
+        instrument_scapper.publish_snapshot(INSTRUMENTS)
+
+        with patch.object(instrument_scapper.block_histories, "remove") as remove:
+            instrument_scapper.discard_stale_instruments({})
+
+        remove.assert_called_once_with("LARMOR")
+
+    def test_GIVEN_snapshot_of_instrument_on_list_WHEN_discard_stale_THEN_snapshot_kept(self):
+        instrument_scapper.publish_snapshot(INSTRUMENTS)
+
+        instrument_scapper.discard_stale_instruments({"LARMOR": "NDXLARMOR"})
+
+        assert_that(instrument_scapper.scraped_data["LARMOR"], has_entries(stale=True))
+
+    def test_GIVEN_scraped_instrument_not_on_list_WHEN_discard_stale_THEN_scraped_data_kept(self):
+        instrument_scapper.scraped_data["LARMOR"] = INSTRUMENTS["LARMOR"]
+
+        instrument_scapper.discard_stale_instruments({})
+
+        assert_that(instrument_scapper.scraped_data["LARMOR"], is_(INSTRUMENTS["LARMOR"]))
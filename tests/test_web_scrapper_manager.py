@@ -3,7 +3,7 @@ import sys
 from hamcrest import *
 import unittest
 
-from mock import Mock
+from mock import Mock, patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from external_webpage.web_scrapper_manager import WebScrapperManager
@@ -36,23 +36,12 @@ class MockWebScrapper(object):
     def is_alive(self):
         return self.is_alive_flag
 
-    def is_instrument(self, name, host):
-        """
-        Is this scrapper for this name and _host
-        Args:
-            name: name of the instrument
-            host: _host of the instrument
-
-        Returns: True is _host and name match; False otherwise
-
-        """
-        return self.name == name and self.host == host
-
 
 class MockInstList(object):
 
     def __init__(self, instrument_host_dict):
         self.instrument_host_dict = instrument_host_dict
+        self.error_on_retrieve = ""
 
     def retrieve(self):
         return self.instrument_host_dict
@@ -171,6 +160,74 @@ class TestWebScrapperManager(unittest.TestCase):
         assert_that(web_scrapper_manager.scrappers[0].host, is_(expected_host))
         assert_that(web_scrapper_manager.scrappers[0].started, is_(True), "scrapper started")
 
+    def test_GIVEN_instrument_list_unchanged_and_scrappers_alive_WHEN_run_THEN_no_changes_and_scrappers_kept(self):
+        web_scrapper_manager = WebScrapperManager(MockWebScrapper, MockInstList({"inst": "_host"}))
+        web_scrapper_manager.maintain_scrapper_list()
+        original_scrappers = web_scrapper_manager.scrappers
+
+        changes = web_scrapper_manager.maintain_scrapper_list()
+
+        assert_that(bool(changes), is_(False))
+        assert_that(web_scrapper_manager.scrappers,
+                    contains(*[same_instance(scrapper) for scrapper in original_scrappers]))
+
+    def test_GIVEN_snapshot_of_instrument_not_on_list_WHEN_run_THEN_snapshot_discarded(self):
+        web_scrapper_manager = WebScrapperManager(MockWebScrapper, MockInstList({"inst": "_host"}))
+
+        with patch("external_webpage.web_scrapper_manager.discard_stale_instruments") as discard_stale_instruments:
+            web_scrapper_manager.maintain_scrapper_list()
+
+        discard_stale_instruments.assert_called_once_with({"inst": "_host"})
+
+    def test_GIVEN_instrument_list_can_not_be_read_WHEN_run_THEN_snapshot_kept(self):
+        inst_list = MockInstList({})
+        inst_list.error_on_retrieve = "Instrument list can not be read"
+        web_scrapper_manager = WebScrapperManager(MockWebScrapper, inst_list)
+
+        with patch("external_webpage.web_scrapper_manager.discard_stale_instruments") as discard_stale_instruments:
+            web_scrapper_manager.maintain_scrapper_list()
+
+        discard_stale_instruments.assert_not_called()
+
+    def test_GIVEN_instrument_removed_from_list_WHEN_run_THEN_its_block_histories_removed(self):
+        inst_list = MockInstList({"inst": "_host", "old": "old_host"})
+        web_scrapper_manager = WebScrapperManager(MockWebScrapper, inst_list)
+        web_scrapper_manager.maintain_scrapper_list()
+        inst_list.instrument_host_dict = {"inst": "_host"}
+
+        with patch("external_webpage.web_scrapper_manager.block_histories") as block_histories:
+            web_scrapper_manager.maintain_scrapper_list()
+
+        block_histories.remove.assert_called_once_with("old")
+
+    def test_GIVEN_instrument_added_WHEN_run_THEN_changes_contain_added_instrument(self):
+        inst_list = MockInstList({"inst": "_host"})
+        web_scrapper_manager = WebScrapperManager(MockWebScrapper, inst_list)
+        web_scrapper_manager.maintain_scrapper_list()
+        inst_list.instrument_host_dict = {"inst": "_host", "new": "new_host"}
+
+        changes = web_scrapper_manager.maintain_scrapper_list()
+
+        assert_that(changes.added, is_({"new": "new_host"}))
+        assert_that(web_scrapper_manager.scrappers, has_length(2))
+
+    def test_GIVEN_scrappers_running_WHEN_reconcile_with_list_from_several_sites_THEN_scrappers_match_list(self):
+        web_scrapper_manager = WebScrapperManager(MockWebScrapper, MockInstList({}))
+        web_scrapper_manager.reconcile({"inst1": "host1", "inst2": "host2"})
+        kept_scrapper = [scrapper for scrapper in web_scrapper_manager.scrappers if scrapper.name == "inst1"][0]
+        site1 = {"inst1": "host1"}
+        site2 = {"inst{}".format(index): "site2_host{}".format(index) for index in range(3, 1000)}
+        expected_insts = dict(site1)
+        expected_insts.update(site2)
+
+        web_scrapper_manager.reconcile(expected_insts)
+
+        result = {}
+        for scrapper in web_scrapper_manager.scrappers:
+            result[scrapper.name] = scrapper.host
+        assert_that(result, is_(expected_insts))
+        assert_that(web_scrapper_manager.scrappers, has_item(kept_scrapper))
+
 
 if __name__ == '__main__':
     unittest.main()
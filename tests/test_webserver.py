@@ -0,0 +1,237 @@
+import json
+import os
+import socket
+import sys
+import threading
+from hamcrest import *
+import unittest
+
+from mock import Mock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import webserver
+from external_webpage.admission_control import ClientRateLimiter, InFlightLimiter
+from tests.test_event_loop_http_server import read_responses
+
+INSTRUMENT_DATA = {
+    "config_name": "CONFIG",
+    "groups": {"GROUP": {"BLOCK": {"value": "1.0", "status": "Connected", "alarm": "", "visibility": True}}},
+    "inst_pvs": {}}
+
+CLIENT = ("127.0.0.1", 1234)
+
+
+def get_request(path, headers=""):
+    return "GET {} HTTP/1.1\r\nHost: localhost\r\n{}\r\n".format(path, headers)
+
+
+def is_closed(connection):
+    """
+    Returns: True if the server has closed the connection; False if it is still open after a second
+    """
+    connection.settimeout(1)
+    try:
+        return connection.recv(1) == ""
+    except socket.timeout:
+        return False
+    except socket.error:
+        return True
+
+
+class TestGetResponse(unittest.TestCase):
+
+    def setUp(self):
+        for name, value in [("scraped_data", {"INST": INSTRUMENT_DATA}),
+                            ("scraped_data_versions", {"INST": 1}),
+                            ("encoded_data", {}),
+                            ("client_rate_limiter", ClientRateLimiter(1000, 1000)),
+                            ("in_flight_limiter", InFlightLimiter(10))]:
+            patcher = patch("webserver." + name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_GIVEN_known_instrument_WHEN_get_response_THEN_data_returned_as_jsonp(self):
+        code, body, content_type = webserver.get_response("/?Instrument=inst&callback=cb", CLIENT)
+
+        assert_that(code, is_(200))
+        assert_that(content_type, is_("text/html"))
+        assert_that(json.loads(body[len("cb("):-1]), is_(INSTRUMENT_DATA))
+
+    def test_GIVEN_unknown_instrument_WHEN_get_response_THEN_bad_request(self):
+        code, _, _ = webserver.get_response("/?Instrument=unknown&callback=cb", CLIENT)
+
+        assert_that(code, is_(400))
+
+    def test_GIVEN_unknown_instrument_WHEN_get_response_THEN_access_not_recorded(self):
+        with patch("webserver.access_log") as access_log:
+            webserver.get_response("/?Instrument=made_up&callback=cb", CLIENT)
+
+        access_log.record.assert_not_called()
+
+    def test_GIVEN_batch_with_unknown_instrument_WHEN_get_response_THEN_only_known_instrument_recorded(self):
+        with patch("webserver.access_log") as access_log:
+            webserver.get_response("/?Instrument=inst,made_up&callback=cb", CLIENT)
+
+        access_log.record.assert_called_once_with(CLIENT, "INST")
+
+    def test_GIVEN_fields_WHEN_get_response_THEN_only_fields_returned(self):
+        code, body, _ = webserver.get_response("/?Instrument=inst&callback=cb&fields=config_name", CLIENT)
+
+        assert_that(code, is_(200))
+        assert_that(json.loads(body[len("cb("):-1]), is_({"config_name": "CONFIG"}))
+
+    def test_GIVEN_batch_with_fields_WHEN_get_response_THEN_bad_request(self):
+        code, _, _ = webserver.get_response("/?Instrument=inst,other&callback=cb&fields=config_name", CLIENT)
+
+        assert_that(code, is_(400))
+
+    def test_GIVEN_all_instruments_with_group_WHEN_get_response_THEN_bad_request(self):
+        with patch("webserver.web_manager", create=True):
+            code, _, _ = webserver.get_response("/?Instrument=all&callback=cb&group=GROUP", CLIENT)
+
+        assert_that(code, is_(400))
+
+    def test_GIVEN_metrics_path_WHEN_get_response_THEN_metrics_returned(self):
+        code, _, content_type = webserver.get_response(webserver.METRICS_PATH, CLIENT)
+
+        assert_that(code, is_(200))
+        assert_that(content_type, is_(webserver.METRICS_CONTENT_TYPE))
+
+    def test_GIVEN_diagnostics_path_WHEN_get_response_THEN_diagnostics_returned_as_json(self):
+        with patch("webserver.scrape_diagnostics", {"INST": {"duration": 1.0}}):
+            code, body, content_type = webserver.get_response(webserver.DIAGNOSTICS_PATH, CLIENT)
+
+        assert_that(code, is_(200))
+        assert_that(content_type, is_("application/json"))
+        assert_that(json.loads(body), is_({"INST": {"duration": 1.0}}))
+
+    def test_GIVEN_history_without_block_WHEN_get_response_THEN_bad_request(self):
+        code, _, _ = webserver.get_response(webserver.HISTORY_PATH + "?Instrument=inst&callback=cb", CLIENT)
+
+        assert_that(code, is_(400))
+
+    def test_GIVEN_client_over_rate_WHEN_get_response_THEN_too_many_requests(self):
+        with patch("webserver.client_rate_limiter", ClientRateLimiter(0, 0)):
+            code, _, _ = webserver.get_response("/?Instrument=inst&callback=cb", CLIENT)
+
+        assert_that(code, is_(429))
+
+    def test_GIVEN_client_over_rate_WHEN_get_metrics_THEN_throttled_client_in_metrics(self):
+        with patch("webserver.client_rate_limiter", ClientRateLimiter(0, 0)):
+            webserver.get_response("/?Instrument=inst&callback=cb", ("10.0.0.1", 1234))
+            _, body, _ = webserver.get_response(webserver.METRICS_PATH, CLIENT)
+
+        assert_that(body, contains_string('json_bourne_client_requests_throttled{client="10.0.0.1"} 1'))
+
+    def test_GIVEN_too_many_requests_in_flight_WHEN_get_response_THEN_service_unavailable(self):
+        with patch("webserver.in_flight_limiter", InFlightLimiter(0)):
+            code, _, _ = webserver.get_response("/?Instrument=inst&callback=cb", CLIENT)
+
+        assert_that(code, is_(503))
+
+    def test_GIVEN_client_over_rate_WHEN_get_metrics_THEN_metrics_still_returned(self):
+        with patch("webserver.client_rate_limiter", ClientRateLimiter(0, 0)):
+            code, _, _ = webserver.get_response(webserver.METRICS_PATH, CLIENT)
+
+        assert_that(code, is_(200))
+
+
+class TestMyHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.get_response = Mock(return_value=(200, "cb({})", "text/html"))
+        patcher = patch("webserver.get_response", self.get_response)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.server = webserver.ThreadedHTTPServer(("127.0.0.1", 0), webserver.MyHandler)
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+
+        def stop():
+            self.server.shutdown()
+            thread.join()
+            self.server.server_close()
+        self.addCleanup(stop)
+
+    def connect(self):
+        connection = socket.create_connection(self.server.server_address, timeout=5)
+        self.addCleanup(connection.close)
+        return connection
+
+    def test_GIVEN_request_WHEN_served_THEN_response_has_body_content_type_and_content_length(self):
+        connection = self.connect()
+
+        connection.sendall(get_request("/?Instrument=inst&callback=cb"))
+        [(header, body)] = read_responses(connection, 1)
+
+        assert_that(header, starts_with("HTTP/1.1 200"))
+        assert_that(header, contains_string("Content-type: text/html"))
+        assert_that(header, contains_string("Content-Length: 6"))
+        assert_that(body, is_("cb({})"))
+
+    def test_GIVEN_request_with_headers_WHEN_served_THEN_path_client_and_headers_passed_to_get_response(self):
+        connection = self.connect()
+
+        connection.sendall(get_request("/path", "Accept: application/msgpack\r\n"))
+        read_responses(connection, 1)
+
+        path, client_address, headers = self.get_response.call_args[0]
+        assert_that(path, is_("/path"))
+        assert_that(client_address[0], is_("127.0.0.1"))
+        assert_that(headers.get("accept"), is_("application/msgpack"))
+
+    def test_GIVEN_persistent_connection_WHEN_several_requests_THEN_all_answered_on_same_connection(self):
+        connection = self.connect()
+
+        for _ in range(3):
+            connection.sendall(get_request("/"))
+        responses = read_responses(connection, 3)
+
+        assert_that(responses, has_length(3))
+
+    def test_GIVEN_bad_request_or_not_found_WHEN_served_THEN_connection_kept_open(self):
+        self.get_response.side_effect = [(400, "", "text/plain"), (404, "", "text/plain"),
+                                         (200, "cb({})", "text/html")]
+        connection = self.connect()
+
+        for _ in range(3):
+            connection.sendall(get_request("/"))
+        responses = read_responses(connection, 3)
+
+        assert_that([header.split("\r\n")[0] for header, _ in responses],
+                    contains(starts_with("HTTP/1.1 400"), starts_with("HTTP/1.1 404"), starts_with("HTTP/1.1 200")))
+        assert_that(responses[0][0], contains_string("Content-Length: 0"))
+
+    def test_GIVEN_server_closing_connections_WHEN_served_THEN_connection_close_sent_and_connection_closed(self):
+        self.server.should_close_connections = lambda: True
+        connection = self.connect()
+
+        connection.sendall(get_request("/"))
+        [(header, _)] = read_responses(connection, 1)
+
+        assert_that(header, contains_string("Connection: close"))
+        assert_that(is_closed(connection), is_(True))
+
+    def test_GIVEN_server_keeping_connections_WHEN_served_THEN_no_connection_close_sent(self):
+        connection = self.connect()
+
+        connection.sendall(get_request("/"))
+        [(header, _)] = read_responses(connection, 1)
+
+        assert_that(header, is_not(contains_string("Connection: close")))
+        assert_that(is_closed(connection), is_(False))
+
+    def test_GIVEN_client_asks_to_close_WHEN_served_THEN_connection_closed(self):
+        connection = self.connect()
+
+        connection.sendall(get_request("/", "Connection: close\r\n"))
+        read_responses(connection, 1)
+
+        assert_that(is_closed(connection), is_(True))
+
+
+if __name__ == '__main__':
+    unittest.main()
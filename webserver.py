@@ -1,67 +1,330 @@
+import atexit
 import json
 import logging
 import os
+import re
+from functools import partial
 from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 from SocketServer import ThreadingMixIn
+from time import time
+from timeit import default_timer
 from logging.handlers import TimedRotatingFileHandler
 
+from external_webpage.access_log import AccessLog, start_background_logging
+from external_webpage.admission_control import ClientRateLimiter, InFlightLimiter
+from external_webpage.data_source_reader import DataSourceReader, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from external_webpage.event_loop_http_server import EventLoopHTTPServer
+from external_webpage.http_server_pool import PoolingMixIn
+from external_webpage.metrics import registry as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE, \
+    JSON_ENCODE_SECONDS, REQUESTS, REQUESTS_SHED, REQUEST_SECONDS, SCRAPED_DATA_LOCK_WAIT_SECONDS, \
+    THROTTLED_CLIENTS, acquire_timed
 from external_webpage.request_handler_utils import get_detailed_state_of_specific_instrument, \
-    get_summary_details_of_all_instruments, get_instrument_and_callback
+    get_all_instruments_as_json, get_instrument_and_callback, get_instruments_in_batch, \
+    get_detailed_state_of_instruments, get_format, get_history_query, get_projection, ProjectionCache
 from external_webpage.web_scrapper_manager import WebScrapperManager
-from external_webpage.instrument_scapper import scraped_data, scraped_data_lock
+from external_webpage.instrument_scapper import InstrumentScrapper, scraped_data, scraped_data_lock, \
+    scrape_diagnostics, instrument_summaries, scraped_data_versions, encoded_data, block_histories, \
+    get_scraped_data_snapshot, publish_snapshot
+from external_webpage.payload_formats import FORMAT_JSON, BINARY_FORMAT_CONTENT_TYPES, encode_instrument_data
+from external_webpage.profiling import profiler
+from external_webpage.scrapper_pool import ScrapperPool
+from external_webpage.snapshot import SnapshotWriter, load_snapshot
 
 logger = logging.getLogger('JSON_bourne')
 log_filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'log', 'JSON_bourne.log')
 handler = TimedRotatingFileHandler(log_filepath, when='midnight', backupCount=30)
 handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
 logger.setLevel(logging.INFO)
-logger.addHandler(handler)
+# log file is written on a background thread so request handlers do not wait for it
+log_listener = start_background_logging(logger, handler)
+atexit.register(log_listener.stop)
+
+# Seconds between summaries of the requests made; 0 to log every request
+ACCESS_LOG_SUMMARY_SECONDS = 60
+access_log = AccessLog(logger, ACCESS_LOG_SUMMARY_SECONDS)
 
 HOST, PORT = '', 60000
 
+# File the scraped data is saved to so that it can be served as soon as the server restarts
+SNAPSHOT_FILEPATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'log', 'scraped_data.snapshot')
+
+# Seconds between saves of the scraped data
+SNAPSHOT_INTERVAL_SECONDS = 60
+
+# Path at which metrics are served
+METRICS_PATH = "/metrics"
+
+# Path at which the diagnostics of the last scrape of each instrument are served
+DIAGNOSTICS_PATH = "/diagnostics"
+
+# Path at which the recent history of a block's values is served
+HISTORY_PATH = "/history"
+
+# Path which starts profiling the scrapper and handler threads
+PROFILE_PATH = "/profile"
+
+# Default number of seconds to profile for
+DEFAULT_PROFILE_SECONDS = 60
+
+# Addresses of the local machine, only these are allowed to start profiling
+LOCAL_ADDRESSES = ("127.0.0.1", "::1", "localhost")
+
+# Instrument label for requests which are not for a known instrument
+UNKNOWN_INSTRUMENT_LABEL = "unknown"
+
+# Instrument label for requests for several instruments
+BATCH_INSTRUMENT_LABEL = "batch"
+
+# Seconds an idle persistent connection is kept open, longer than the time between polls from a page
+KEEP_ALIVE_TIMEOUT = 30
+
+# Sustained requests per second allowed from each client address, well above a few pages polling every 5 seconds
+# but allowing for several pages behind one address
+CLIENT_REQUEST_RATE = 20
+
+# Requests allowed at once from a client address which has been idle
+CLIENT_REQUEST_BURST = 100
+
+# Most requests handled at once, further requests are shed with a 503
+MAX_REQUESTS_IN_FLIGHT = 50
+
+# Number of the most throttled clients whose throttled requests are exported in the metrics
+THROTTLED_CLIENTS_IN_METRICS = 10
+
+projection_cache = ProjectionCache()
+
+client_rate_limiter = ClientRateLimiter(CLIENT_REQUEST_RATE, CLIENT_REQUEST_BURST)
+in_flight_limiter = InFlightLimiter(MAX_REQUESTS_IN_FLIGHT)
+
+
+def get_response(path, client_address, headers=None):
+    """
+    Get the response to a GET request; shared by all the servers so they serve the same responses.
+    Args:
+        path: the requested path
+        client_address: address of the client as (host, port)
+        headers: the request's headers, looked up by lower case name; None if there are none
+
+    Returns: tuple of the HTTP status code, the body and its content type
+
+    """
+    route = path.split("?")[0]
+    if route == METRICS_PATH:
+        # metrics are always served so that the server can be watched while it is shedding requests
+        THROTTLED_CLIENTS.replace([({"client": client}, throttled) for client, throttled
+                                   in client_rate_limiter.most_throttled(THROTTLED_CLIENTS_IN_METRICS)])
+        return 200, metrics_registry.render(), METRICS_CONTENT_TYPE
+
+    if not client_rate_limiter.allow(client_address[0]):
+        REQUESTS_SHED.inc(reason="client_rate")
+        return 429, "Too many requests from this address", 'text/plain'
+    if not in_flight_limiter.try_enter():
+        REQUESTS_SHED.inc(reason="overloaded")
+        return 503, "Server overloaded", 'text/plain'
+    try:
+        return _get_routed_response(route, path, client_address, headers or {})
+    finally:
+        in_flight_limiter.leave()
+
+
+def _get_routed_response(route, path, client_address, headers):
+    """
+    Get the response to a GET request which has been admitted.
+    Args:
+        route: the path without its parameters
+        path: the requested path
+        client_address: address of the client as (host, port)
+        headers: the request's headers, looked up by lower case name
+
+    Returns: tuple of the HTTP status code, the body and its content type
+
+    """
+    if route == DIAGNOSTICS_PATH:
+        return _get_diagnostics()
+    if route == PROFILE_PATH:
+        return _start_profile(path, client_address)
+    if route == HISTORY_PATH:
+        return _get_block_history(path)
+
+    with profiler.profile():
+        return _get_instrument_data(path, client_address, headers.get("accept"))
+
+
+def _get_instrument_data(path, client_address, accept=None):
+    """
+    Get the data for the instrument requested as JSONP, or in a binary format if one is requested.
+    Args:
+        path: the requested path
+        client_address: address of the client as (host, port)
+        accept: the Accept header of the request; None if there is none
+
+    Returns: tuple of the HTTP status code, the body and its content type
+
+    """
+    start_time = default_timer()
+    instrument_label = UNKNOWN_INSTRUMENT_LABEL
+    try:
+        payload_format = get_format(path, accept)
+        binary_content_type = BINARY_FORMAT_CONTENT_TYPES.get(payload_format)
+        instrument, callback = get_instrument_and_callback(path, callback_required=binary_content_type is None)
+        batch = get_instruments_in_batch(instrument)
+        fields, group = get_projection(path)
+        projected = fields is not None or group is not None
+        if projected and (instrument == "ALL" or batch is not None):
+            raise ValueError("Fields and group can only be selected for a single instrument: {}".format(path))
+        if payload_format != FORMAT_JSON and (instrument == "ALL" or batch is not None or projected):
+            raise ValueError("Format {} is only served for a whole instrument: {}".format(payload_format, path))
+
+        # all the instruments are read under one lock so that they are from the same snapshot
+        with acquire_timed(scraped_data_lock, SCRAPED_DATA_LOCK_WAIT_SECONDS, user="handler"):
+            if instrument == "ALL" or instrument in scraped_data:
+                # only known instruments are used as labels so clients can not create unlimited labels
+                instrument_label = instrument
+            if instrument == "ALL":
+                summaries_as_json = instrument_summaries.as_json()
+            elif batch is not None:
+                instrument_label = BATCH_INSTRUMENT_LABEL
+                ans = get_detailed_state_of_instruments(batch, scraped_data)
+            else:
+                ans = get_detailed_state_of_specific_instrument(instrument, scraped_data)
+                version = scraped_data_versions.get(instrument)
+                encoded = encoded_data.get(instrument)
+            # only known instruments are logged so clients can not fill the access counts with made up names
+            if batch is None:
+                accessed = [instrument]
+            else:
+                accessed = [name for name in batch if name in scraped_data]
+        for name in accessed:
+            access_log.record(client_address, name)
+
+        try:
+            with JSON_ENCODE_SECONDS.time(instrument=instrument_label):
+                if instrument == "ALL":
+                    ans_as_json = get_all_instruments_as_json(
+                        web_manager.instrument_list_retrieval_errors(), summaries_as_json)
+                elif projected:
+                    ans_as_json = projection_cache.get_json(instrument, version, ans, fields, group)
+                elif batch is None:
+                    if encoded is None:
+                        encoded = encode_instrument_data(ans)
+                    ans_as_json = encoded[payload_format]
+                else:
+                    ans_as_json = str(json.dumps(ans))
+        except Exception as err:
+            raise ValueError("Unable to convert answer data to JSON: %s" % err.message)
+
+        if binary_content_type is None:
+            response = (200, "{}({})".format(callback, ans_as_json), 'text/html')
+        else:
+            response = (200, ans_as_json, binary_content_type)
+    except ValueError as e:
+        logger.error(e)
+        response = (400, "", 'text/plain')
+    except Exception as e:
+        logger.error(e)
+        response = (404, "", 'text/plain')
+    REQUESTS.inc(instrument=instrument_label, code=response[0])
+    REQUEST_SECONDS.observe(default_timer() - start_time, instrument=instrument_label)
+    return response
+
+
+def _get_diagnostics():
+    """
+    Get the diagnostics of the last scrape of each instrument as JSON.
+
+    Returns: tuple of the HTTP status code, the body and its content type
+
+    """
+    with acquire_timed(scraped_data_lock, SCRAPED_DATA_LOCK_WAIT_SECONDS, user="handler"):
+        response = json.dumps(scrape_diagnostics)
+    return 200, response, 'application/json'
+
+
+def _get_block_history(path):
+    """
+    Get the recent history of a block's values as JSONP, optionally aggregated into a number of points.
+    Args:
+        path: the requested path
+
+    Returns: tuple of the HTTP status code, the body and its content type
+
+    """
+    try:
+        instrument, callback = get_instrument_and_callback(path)
+        kind, name, seconds, points, aggregate = get_history_query(path)
+        since = None if seconds is None else time() - seconds
+        times, values = block_histories.get(instrument, name, since, points, aggregate, kind)
+        history = {"instrument": instrument, kind: name, "times": times, "values": values}
+        return 200, "{}({})".format(callback, json.dumps(history)), 'text/html'
+    except ValueError as e:
+        logger.error(e)
+        return 400, "", 'text/plain'
+
+
+def _start_profile(path, client_address):
+    """
+    Start profiling the scrapper and handler threads for the number of seconds given in the seconds parameter
+    (default 60). Only allowed from the local machine.
+    Args:
+        path: the requested path
+        client_address: address of the client as (host, port)
+
+    Returns: tuple of the HTTP status code, the body and its content type
+
+    """
+    if client_address[0] not in LOCAL_ADDRESSES:
+        return 403, "", 'text/plain'
+    try:
+        seconds = int(re.findall(r"[?&]seconds=(\d+)", path)[0])
+    except IndexError:
+        seconds = DEFAULT_PROFILE_SECONDS
+    try:
+        output_path = profiler.start(seconds)
+    except ValueError as e:
+        return 400, str(e), 'text/plain'
+    if output_path is None:
+        return 409, "Already profiling", 'text/plain'
+    return 200, json.dumps({"seconds": seconds, "output": output_path}), 'application/json'
+
 
 class MyHandler(BaseHTTPRequestHandler):
     """
     Handle for web calls for Json Borne
     """
 
+    # HTTP/1.1 so that polling clients keep their connection open between requests
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        """
+        Close idle connections after the server's keep alive timeout.
+        """
+        self.timeout = self.server.keep_alive_timeout
+        BaseHTTPRequestHandler.setup(self)
+
     def do_GET(self):
         """
         This is called by BaseHTTPRequestHandler every time a client does a GET.
         The response is written to self.wfile
         """
-        try:
-            instrument, callback = get_instrument_and_callback(self.path)
-
-            # Warn level so as to avoid many log messages that come from other modules
-            logger.warn("Connected to from " + str(self.client_address) + " looking at " + str(instrument))
-
-            with scraped_data_lock:
-                if instrument == "ALL":
-                    ans = {
-                        "error": web_manager.instrument_list_retrieval_errors(),
-                        "instruments": get_summary_details_of_all_instruments(scraped_data)}
+        code, body, content_type = get_response(self.path, self.client_address, self.headers)
+        self._send_response(code, body, content_type)
 
-                else:
-                    ans = get_detailed_state_of_specific_instrument(instrument, scraped_data)
-
-            try:
-                ans_as_json = str(json.dumps(ans))
-            except Exception as err:
-                raise ValueError("Unable to convert answer data to JSON: %s" % err.message)
-
-            response = "{}({})".format(callback, ans_as_json)
-
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(response)
-        except ValueError as e:
-            logger.error(e)
-            self.send_response(400)
-        except Exception as e:
-            self.send_response(404)
-            logger.error(e)
+    def _send_response(self, code, body, content_type):
+        """
+        Write a complete response. The content length is always sent so that the connection can be kept open.
+        Args:
+            code: the HTTP status code
+            body: the body of the response
+            content_type: the content type of the body
+        """
+        self.send_response(code)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.should_close_connections():
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
 
     def log_message(self, format, *args):
         """ By overriding this method and doing nothing we disable writing to console
@@ -72,15 +335,98 @@ class MyHandler(BaseHTTPRequestHandler):
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     """Handle requests in a separate thread."""
 
+    keep_alive_timeout = KEEP_ALIVE_TIMEOUT
+
+    def should_close_connections(self):
+        """
+        Returns: False, every connection has its own thread so can be kept open
+        """
+        return False
+
+
+class PooledHTTPServer(PoolingMixIn, HTTPServer):
+    """Handle requests on a fixed size pool of threads, rejecting them with a 503 when too many are waiting."""
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self.stop_workers()
+
 
 if __name__ == '__main__':
     # It can sometime be useful to define a local instrument list to add/override the instrument list do this here
     # E.g. to add local instrument local_inst_list = {"localhost": "localhost"}
     local_inst_list = {}
-    web_manager = WebScrapperManager(local_inst_list=local_inst_list)
+
+    # Block and instrument values can be monitored over channel access instead of polling the archive engine, so that
+    # changes are published as they arrive and the configuration is only read when it changes; to do this set
+    # use_channel_access_monitors to True
+    use_channel_access_monitors = False
+    if use_channel_access_monitors:
+        from external_webpage.channel_access_data_source_reader import ChannelAccessDataSourceReader
+        reader_class = ChannelAccessDataSourceReader
+    else:
+        reader_class = DataSourceReader
+
+    # Requests to the data sources time out after data_source_timeout seconds to connect and to read;
+    # data_source_timeouts overrides this for a source, e.g. {SOURCE_CONFIG: (5, 60)}. Requests to the
+    # hedged_sources, e.g. (SOURCE_BLOCKS, SOURCE_DATAWEB, SOURCE_INST), are sent a second time from a small shared
+    # pool if they have not been answered by the 95th percentile of recent latencies, and the second answer is used if
+    # the first request fails.
+    data_source_timeout = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+    data_source_timeouts = {}
+    hedged_sources = ()
+    reader_class = partial(reader_class, timeout=data_source_timeout, source_timeouts=data_source_timeouts,
+                           hedged_sources=hedged_sources)
+
+    # Instruments can be scraped by a fixed size pool of workers instead of a thread per instrument; to do this set
+    # scrapper_pool_size to the number of workers. This limits the number of archivers accessed at once.
+    scrapper_pool_size = None
+    if scrapper_pool_size is None:
+        scrapper_pool = None
+    else:
+        scrapper_pool = ScrapperPool(scrapper_pool_size, reader_class=reader_class)
+
+    # The recent history of each block's numeric values is kept for its last block_history_samples scrapes, about an
+    # hour, for at most block_history_max_blocks blocks. Each sample takes 16 bytes, so about 96MB by default.
+    block_history_samples = 1200
+    block_history_max_blocks = 5000
+    block_histories.samples_per_block = block_history_samples
+    block_histories.max_blocks = block_history_max_blocks
+
+    # The last known data is served, flagged as stale, until each instrument is scraped again
+    snapshot = load_snapshot(SNAPSHOT_FILEPATH)
+    if snapshot is not None:
+        snapshot_time, snapshot_instruments = snapshot
+        publish_snapshot(snapshot_instruments)
+        logger.warn("Loaded {} instruments from snapshot saved {:.0f} seconds ago".format(
+            len(snapshot_instruments), time() - snapshot_time))
+    snapshot_writer = SnapshotWriter(SNAPSHOT_FILEPATH, get_scraped_data_snapshot, SNAPSHOT_INTERVAL_SECONDS)
+
+    web_manager = WebScrapperManager(scrapper_class=partial(InstrumentScrapper, reader_class=reader_class),
+                                     local_inst_list=local_inst_list, scrapper_pool=scrapper_pool)
     web_manager.start()
+    access_log.start()
+    snapshot_writer.start()
+
+    # Requests can be handled on a single event loop thread, which holds persistent connections open cheaply; to do
+    # this set use_event_loop_server to True. Otherwise each connection is handled on a thread.
+    use_event_loop_server = False
 
-    server = ThreadedHTTPServer(('', PORT), MyHandler)
+    # Requests can be handled by a fixed size pool of threads instead of a thread per connection; to do this set
+    # handler_pool_size to the number of threads. Connections which can not be queued for a thread get a 503.
+    # Persistent connections hold a thread while idle so are only kept open if handler_pool_keep_alive is True.
+    handler_pool_size = None
+    handler_queue_size = 100
+    handler_pool_keep_alive = False
+    if use_event_loop_server:
+        server = EventLoopHTTPServer(('', PORT), get_response, keep_alive_timeout=KEEP_ALIVE_TIMEOUT)
+    elif handler_pool_size is None:
+        server = ThreadedHTTPServer(('', PORT), MyHandler)
+    else:
+        server = PooledHTTPServer(('', PORT), MyHandler)
+        server.pool_size = handler_pool_size
+        server.queue_size = handler_queue_size
+        server.keep_alive = handler_pool_keep_alive
 
     try:
         while True:
@@ -89,3 +435,5 @@ if __name__ == '__main__':
         print("Shutting down")
         web_manager.stop()
         web_manager.join()
+        access_log.stop()
+        snapshot_writer.stop()